@@ -8,6 +8,7 @@ OpenLCB AliasMapEquiry frame
 
 import connection as connection
 import canolcbutils
+import quiescence
 
 '''
 Make an Alias Map Enquery (AME) frame.
@@ -100,8 +101,8 @@ def test(alias, dest, nodeID, connection, verbose) :
 
     # test non-matching NodeID using a reserved one
     connection.network.send(makeframe(alias, [0,0,0,0,0,1]))
-    reply = connection.network.receive()
-    if (connection.network.expect(exact=expect) != None) :
+    reply = quiescence.receive(connection.network)
+    if (quiescence.expect(connection.network, exact=expect) != None) :
         print "Unexpected reply received when node ID didnt match ", reply
         return 2
         
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+'''
+Aliases of the nodes on the network, learned from the traffic
+
+An AliasCache maps alias to Node ID through a 4096-entry list, and
+Node ID to alias through a dictionary.  It learns passively from
+the Alias Map Definition and Verified Node ID frames that go by, and
+forgets an alias when its node sends Alias Map Reset.  It can be kept
+in a file between runs.
+
+With aliases set in defaults.py, the links' received frames go
+through the shared cache, so tools that address a node by its Node
+ID (getUnderTestAlias.py -n) can skip the discovery round trip when
+the cache is warm:
+
+    alias = aliascache.cache.alias([2,3,4,5,6,1])   # None if not known
+
+'''
+
+import canolcbutils
+
+class AliasCache :
+    def __init__(self) :
+        self.clear()
+        return
+
+    def clear(self) :
+        self.nodes = [None]*4096   # alias -> node ID tuple
+        self.aliases = {}          # node ID tuple -> alias
+        self.changed = False
+        return
+
+    '''
+    @return alias of a node ID, or None if not known
+    '''
+    def alias(self, nodeID) :
+        return self.aliases.get(tuple(nodeID))
+
+    '''
+    @return node ID of an alias as a list, or None if not known
+    '''
+    def nodeID(self, alias) :
+        node = self.nodes[alias & 0xFFF]
+        if node == None : return None
+        return list(node)
+
+    def define(self, alias, nodeID) :
+        nodeID = tuple(nodeID)
+        if self.nodes[alias] == nodeID and self.aliases.get(nodeID) == alias : return
+        self.forget(alias)
+        old = self.aliases.get(nodeID)
+        if old != None : self.nodes[old] = None
+        self.nodes[alias] = nodeID
+        self.aliases[nodeID] = alias
+        self.changed = True
+        return
+
+    def forget(self, alias) :
+        node = self.nodes[alias]
+        if node == None : return
+        self.nodes[alias] = None
+        if self.aliases.get(node) == alias : del self.aliases[node]
+        self.changed = True
+        return
+
+    '''
+    Learn from one GridConnect frame string
+    '''
+    def observe(self, string) :
+        # AMD, AMR, Verified Node ID; the rest aren't parsed
+        if not (string.startswith(":X1070") or string.startswith(":X1917")) : return
+        try :
+            header = canolcbutils.headerValue(string)
+            data = canolcbutils.bodyArray(string)
+        except (ValueError, TypeError) :
+            return
+        if (header >> 12) in (0x10701, 0x19170, 0x19171) :
+            if len(data) == 6 : self.define(header & 0xFFF, bytearray(data))
+        elif (header >> 12) == 0x10703 :
+            self.forget(header & 0xFFF)
+        return
+
+    '''
+    Have every frame a link receives go through observe()
+    '''
+    def watch(self, network) :
+        receive = network.receive
+        def observed() :
+            frame = receive()
+            if frame != None : self.observe(frame)
+            return frame
+        network.receive = observed
+        return
+
+    '''
+    Read a file of "alias nodeID" lines, e.g. "DDD 02.03.04.05.06.01",
+    as written by save(); a missing file is just an empty cache
+    '''
+    def load(self, filename) :
+        try :
+            lines = open(filename).readlines()
+        except IOError :
+            return
+        for line in lines :
+            fields = line.split()
+            if len(fields) != 2 : continue
+            try :
+                alias = int(fields[0], 16)
+                nodeID = [int(b, 16) for b in fields[1].split('.')]
+            except ValueError :
+                continue   # not a cache line
+            if not 0 < alias <= 0xFFF or len(nodeID) != 6 : continue
+            self.define(alias, nodeID)
+        self.changed = False
+        return
+
+    def save(self, filename) :
+        if not self.changed : return
+        try :
+            out = open(filename, "w")
+            for alias in range(4096) :
+                if self.nodes[alias] != None :
+                    out.write("%03X %s\n" % (alias, canolcbutils.dotted(self.nodes[alias])))
+            out.close()
+        except IOError :
+            return   # e.g. read-only directory; just don't keep it
+        self.changed = False
+        return
+
+cache = AliasCache()
+
+def main():
+    cache.observe(":X10701DDDN020304050601;")
+    cache.observe(":X19170ABCN050101011800;")
+    print cache.alias([2,3,4,5,6,1]), cache.nodeID(0xABC)
+    cache.observe(":X10703DDDN020304050601;")
+    print cache.alias([2,3,4,5,6,1])
+
+if __name__ == '__main__':
+    main()
@@ -77,6 +77,12 @@ def main():
     retval = test(alias, dest, nodeID, event, connection, verbose, complete, repeat, identifynode, bufnum)
     done(retval)    
 
+# report time spent waiting for the bus to be quiet in the last test
+def idle(connection) :
+    if hasattr(connection.network, "quiescence") :
+        print connection.network.quiescence.report()
+    return
+
 def done(retval) :
     connection.network.close()
     exit(retval)
@@ -94,6 +100,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import aliasMapEnquiry
         if verbose : print "aliasMapEnquiry"
         retval = aliasMapEnquiry.test(alias, dest, nodeID, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in aliasMapEnquiry"
             if not complete : done(retval)
@@ -108,6 +115,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         #    result |= retval
         if verbose : print "verifyNodeGlobal"
         retval = verifyNodeGlobal.test(alias, nodeID, connection)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in verifyNodeGlobal"
             if not complete : done(retval)
@@ -116,6 +124,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import verifyNodeAddressed
         if verbose : print "verifyNodeAddressed"
         retval = verifyNodeAddressed.test(alias, dest, nodeID, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in verifyNodeAddressed"
             if not complete : done(retval)
@@ -124,6 +133,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import protocolIdentProtocol
         if verbose : print "protocolIdentProtocol"
         retval = protocolIdentProtocol.test(alias, dest, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in protocolIdentProtocol"
             if not complete : done(retval)
@@ -132,6 +142,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import identifyEventsGlobal
         if verbose : print "identifyEventsGlobal"
         retval = identifyEventsGlobal.test(alias, dest, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in identifyEventsGlobal"
             if not complete : done(retval)
@@ -140,6 +151,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import identifyEventsAddressed
         if verbose : print "identifyEventsAddressed"
         retval = identifyEventsAddressed.test(alias, dest, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in identifyEventsAddressed"
             if not complete : done(retval)
@@ -148,6 +160,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import identifyConsumers
         if verbose : print "identifyConsumers"
         retval = identifyConsumers.test(alias, event, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in identifyConsumers"
             if not complete : done(retval)
@@ -156,6 +169,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import identifyProducers
         if verbose : print "identifyProducers"
         retval = identifyProducers.test(alias, event, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in identifyProducers"
             if not complete : done(retval)
@@ -164,6 +178,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import testProducerConsumerNotification
         if verbose : print "testProducerConsumerNotification"
         retval = testProducerConsumerNotification.test(alias, dest, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in testProducerConsumerNotification"
             if not complete : done(retval)
@@ -172,6 +187,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import testConfigurationProtocol
         if verbose : print "testConfigurationProtocol"
         retval = testConfigurationProtocol.test(alias, dest, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in testConfigurationProtocol", retval
             if not complete : done(retval)
@@ -180,6 +196,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import testDatagram
         if verbose : print "testDatagram"
         retval = testDatagram.test(alias, dest, connection, bufnum, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in testDatagram", retval
             if not complete : done(retval)
@@ -188,6 +205,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import testOverlappingDatagrams
         if verbose : print "testOverlappingDatagrams"
         retval = testOverlappingDatagrams.test(alias, dest, bufnum, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in testOverlappingDatagrams", retval
             if not complete : done(retval)
@@ -196,6 +214,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import simpleNodeIdentificationInformation
         if verbose : print "simpleNodeIdentificationInformation"
         retval = simpleNodeIdentificationInformation.test(alias, dest, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in simpleNodeIdentificationInformation"
             if not complete : done(retval)
@@ -204,6 +223,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import testCDI
         if verbose : print "testCDI"
         retval = testCDI.test(alias, dest, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in testCDI"
             if not complete : done(retval)
@@ -212,6 +232,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import testReservedBits
         if verbose : print "testReservedBits"
         retval = testReservedBits.test(alias, nodeID, dest, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in testReservedBits"
             if not complete : done(retval)
@@ -220,6 +241,7 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import unknownDatagramType
         if verbose : print "unknownDatagramType"
         retval = unknownDatagramType.test(alias, dest, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in unknownDatagramType"
             if not complete : done(retval)
@@ -228,25 +250,27 @@ def test(alias, dest, nodeID, event, connection, verbose, complete, repeat, iden
         import unknownMtiAddressed
         if verbose : print "unknownMtiAddressed"
         retval = unknownMtiAddressed.test(alias, dest, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in unknownMtiAddressed"
             if not complete : done(retval)
             result |= retval
         
         import testStandardFrame
-        import time
         if verbose : print "testStandardFrame"
         retval = testStandardFrame.test(connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in testStandardFrame"
             if not complete : done(retval)
             result |= retval
-        time.sleep(3)
+        connection.network.clock.sleep(3)
  
         # done last, as changes alias in use
         import testAliasConflict
         if verbose : print "testAliasConflict"
         retval = testAliasConflict.test(alias, dest, connection, verbose)
+        if verbose : idle(connection)
         if retval != 0 :
             print "Error in testAliasConflict"
             if not complete : done(retval)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+'''
+Drive an OpenLCB link shared through linkbroker.py
+
+Connects to a running link broker over its Unix socket, which
+takes milliseconds instead of the adapter's startdelay, and can
+be done by several scripts at once.  Set filters to a list of frame
+prefixes to receive only those frames.
+
+@see linkbroker.py
+'''
+import socket
+
+import linkbroker
+import tcpolcblink
+
+'''
+Receiving, expect() and the background reader are those of
+TcpToOlcbLink; only the connection and the framing of sends differ.
+'''
+class BrokerOlcbLink(tcpolcblink.TcpToOlcbLink) :
+    '''
+    @param link the real link, for linkbroker.py to open
+    '''
+    def __init__(self, link=None) :
+        tcpolcblink.TcpToOlcbLink.__init__(self)
+        # defaults (generally overridden by system-wide defaults elsewhere)
+        self.link = link
+        self.path = linkbroker.path
+        self.filters = []      # frame prefixes to receive; empty for all
+        self.verbose = False
+        return
+
+    def connect(self) :
+        # if verbose, print
+        if (self.verbose) : print "   connect to broker at ",self.path
+
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(self.path)
+        # not set by the reader thread; receive() updates it when unthreaded
+        self.socket.settimeout(self.timeout)
+        for prefix in self.filters :
+            self.socket.sendall('F'+prefix+'\n')
+        return
+
+    def send(self, frame) :
+        if (self.socket == None) : self.connect()
+
+        # if verbose, print
+        if (self.verbose) : print "   send    ",frame
+
+        self.socket.sendall(frame+'\n')
+        self.quiescence.sent(self.clock.time(), frame)
+        return
+
+    def close(self) :
+        tcpolcblink.TcpToOlcbLink.close(self)
+        if (self.socket != None) :
+            self.socket.close()
+            self.socket = None
+        return
+
+import getopt, sys
+
+def main():
+    # create connection object
+    network = BrokerOlcbLink()
+    network.verbose = True
+
+    frame = ':X19490AAAN;'
+    if (len(sys.argv) > 1) :
+        frame = sys.argv[1]
+
+    # send the frame and show the replies
+    network.send(frame)
+    while network.receive() != None :
+        continue
+
+    return  # done with example
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+'''
+Bus statistics over captured traffic
+
+Loads a trace file (see tracefile.py) into a NumPy structured array
+of time, header, alias, MTI, data length and bits on the wire, and
+reports frame rates, bus utilization, message type counts, the
+busiest nodes and the gaps between frames, all with array operations.
+
+The bits on the wire of each frame are counted exactly: the CRC is
+computed and the stuff bits inserted by looping over the bit
+positions, each step handling every frame at once.
+
+    python monitor.py -c bus.trc      capture
+    python busstats.py bus.trc        report
+
+NumPy is required.
+
+'''
+
+try :
+    import numpy
+except ImportError :
+    numpy = None
+
+import canolcbutils
+import tracefile
+
+BITRATE = 125000   # OpenLCB CAN bit rate
+
+NONE = 4096        # mti of frames that aren't messages
+
+# bits after the CRC: CRC delimiter, ACK slot and delimiter, end of frame, intermission
+TRAILER = 1+1+1+7+3
+
+def frametype() :
+    return numpy.dtype([("time", "<f8"), ("header", "<u4"), ("alias", "<u2"),
+                        ("mti", "<u2"), ("length", "u1"), ("extended", "?"), ("bits", "u1")])
+
+'''
+Header bits, first bit first, of the part of each frame before the data
+@return (width, n) array of 0/1, a row per bit position
+'''
+def arbitration(header, extended) :
+    # header bit number, or 0 or 1 for a fixed bit
+    if extended :
+        # start of frame, identifier A, SRR, IDE, identifier B, RTR, r1, r0
+        fields = ["0"]+range(28, 17, -1)+["1", "1"]+range(17, -1, -1)+["0", "0", "0"]
+    else :
+        # start of frame, identifier, RTR, IDE, r0
+        fields = ["0"]+range(10, -1, -1)+["0", "0", "0"]
+    rows = numpy.zeros((len(fields), len(header)), dtype=numpy.uint8)
+    for i, k in enumerate(fields) :
+        if k == "1" :
+            rows[i] = 1
+        elif k != "0" :
+            rows[i] = (header >> k) & 1
+    return rows
+
+# CRC-15 of each byte value, for the data bytes
+crctable = None
+
+def crcbytes() :
+    global crctable
+    if crctable is None :
+        table = numpy.zeros(256, dtype=numpy.int32)
+        for i in range(256) :
+            crc = i << 7
+            for k in range(8) :
+                crc = crc << 1
+                if crc & 0x8000 : crc = crc ^ 0x4599
+            table[i] = crc & 0x7FFF
+        crctable = table
+    return crctable
+
+'''
+Count the bits each frame takes on the wire, including stuff bits
+@param header header values
+@param data (n, 8) data bytes
+@param length data lengths
+@param extended True for 29-bit headers, False for 11-bit
+@return array of bit counts
+'''
+def wirebits(header, data, length, extended) :
+    n = len(header)
+    if n == 0 : return numpy.zeros(0, dtype=numpy.int64)
+    length = length.astype(numpy.int64)
+    data = data.astype(numpy.uint8)
+    head = arbitration(header.astype(numpy.int64), extended)
+    width = len(head)+4
+    # all the bits, a row per bit position
+    columns = numpy.zeros((width+64+15, n), dtype=numpy.uint8)
+    columns[:len(head)] = head
+    for k in range(4) :
+        columns[len(head)+k] = (length >> (3-k)) & 1
+    columns[width:width+64] = numpy.unpackbits(data, axis=1).T
+    # CRC-15: the header a bit at a time, the data a byte at a time
+    crc = numpy.zeros(n, dtype=numpy.int32)
+    for c in range(width) :
+        feedback = (columns[c] ^ (crc >> 14)) & 1
+        crc = ((crc << 1) & 0x7FFF) ^ (feedback*0x4599)
+    table = crcbytes()
+    for k in range(8) :
+        updated = ((crc << 8) & 0x7FFF) ^ table[((crc >> 7) ^ data[:, k]) & 0xFF]
+        crc = numpy.where(k < length, updated, crc)
+    covered = width+8*length                  # bits covered by the CRC
+    frames = numpy.arange(n)
+    for k in range(15) :
+        columns[covered+k, frames] = (crc >> (14-k)) & 1
+    stuffed = covered+15                      # start of frame through CRC
+    # after five equal bits, a stuff bit of the other value goes in;
+    # past the end of a frame the runs don't matter, just aren't counted
+    stuffs = numpy.zeros(n, dtype=numpy.int16)
+    last = numpy.full(n, 2, dtype=numpy.uint8)
+    run = numpy.zeros(n, dtype=numpy.uint8)
+    for c in range(len(columns)) :
+        bit = columns[c]
+        run *= (bit == last)
+        run += 1
+        stuff = run == 5
+        stuffs += stuff & (c < stuffed)
+        # the stuff bit starts a new run
+        last = bit ^ stuff
+        run -= numpy.uint8(4)*stuff
+    return stuffed+stuffs+TRAILER
+
+'''
+Load a trace file into a structured array
+'''
+def load(filename) :
+    if numpy == None :
+        raise ImportError("NumPy is needed for busstats")
+    import tracequery
+    q = tracequery.TraceQuery(filename, index=False)
+    result = numpy.empty(q.count, dtype=frametype())
+    i = 0
+    for records in q.chunks() :
+        part = result[i:i+len(records)]
+        header = records["header"]
+        flags = records["flags"]
+        part["time"] = records["time"]
+        part["header"] = header
+        part["length"] = flags & 0x0F
+        extended = (flags & tracefile.EXTENDED) != 0
+        part["extended"] = extended
+        part["alias"] = numpy.where(extended, header & 0xFFF, NONE)
+        message = extended & ((header & 0x0F000000) == 0x09000000)
+        part["mti"] = numpy.where(message, (header >> 12) & 0xFFF, NONE)
+        for ext in (True, False) :
+            which = numpy.flatnonzero(extended == ext)
+            part["bits"][which] = wirebits(header[which], records["data"][which],
+                                           part["length"][which], ext)
+        i = i+len(records)
+    q.close()
+    return result
+
+'''
+Compute the statistics of loaded frames
+@param frames as from load()
+@param bitrate bus bit rate
+@param top how many of the busiest nodes to list
+@return dictionary of results
+'''
+def statistics(frames, bitrate=BITRATE, top=10) :
+    result = {}
+    n = len(frames)
+    result["frames"] = n
+    if n == 0 : return result
+    times = frames["time"]
+    duration = max(times[-1]-times[0], 1e-6)
+    result["duration"] = duration
+    result["rate"] = n/duration
+    seconds = (times-times[0]).astype(numpy.int64)
+    persecond = numpy.bincount(seconds)
+    result["peakrate"] = persecond.max()
+    bits = frames["bits"].astype(numpy.int64)
+    result["bits"] = bits.sum()
+    result["utilization"] = bits.sum()/(bitrate*duration)
+    result["peakutilization"] = numpy.bincount(seconds, weights=bits).max()/float(bitrate)
+    # message types
+    mti = frames["mti"].astype(numpy.int64)
+    counts = numpy.bincount(mti, minlength=NONE+1)
+    types = [(counts[m], canolcbutils.mtinames.get(m, "MTI 0x%03X" % m)) for m in numpy.flatnonzero(counts[:NONE])]
+    kinds = numpy.where(mti == NONE, (frames["header"].astype(numpy.int64) >> 24) & 0xF, 16)
+    kinds = numpy.where(frames["extended"], kinds, 17)
+    kindcounts = numpy.bincount(kinds, minlength=18)
+    for k in range(8) :
+        if kindcounts[k] > 0 : types.append((kindcounts[k], "Control / Check ID"))
+    for k in range(10, 16) :
+        if kindcounts[k] > 0 : types.append((kindcounts[k], canolcbutils.typenames[k-8]))
+    if kindcounts[17] > 0 : types.append((kindcounts[17], "Standard"))
+    merged = {}
+    for count, name in types : merged[name] = merged.get(name, 0)+count
+    result["types"] = sorted([(c, name) for name, c in merged.items()], reverse=True)
+    # busiest nodes
+    aliases = numpy.bincount(frames["alias"].astype(numpy.int64), minlength=NONE+1)[:NONE]
+    nodebits = numpy.bincount(frames["alias"].astype(numpy.int64), weights=bits, minlength=NONE+1)[:NONE]
+    busiest = numpy.argsort(-aliases, kind="mergesort")[:top]
+    result["talkers"] = [(a, aliases[a], aliases[a]/duration, nodebits[a]/(bitrate*duration))
+                            for a in busiest if aliases[a] > 0]
+    # gaps between frames
+    gaps = numpy.diff(times)
+    if len(gaps) > 0 :
+        result["gaps"] = numpy.percentile(gaps, [0, 50, 90, 99, 100])
+        edges = numpy.concatenate(([0], 10.0**numpy.arange(-6, 2)))
+        result["gaphistogram"] = (edges, numpy.histogram(gaps, numpy.concatenate((edges, [numpy.inf])))[0])
+    return result
+
+def report(stats, top=10) :
+    print "%d frames" % stats["frames"]
+    if stats["frames"] == 0 : return
+    print "  %.1f sec, %.1f frames/sec average, %d in the busiest second" % (
+        stats["duration"], stats["rate"], stats["peakrate"])
+    print "  bus utilization %.2f%% average, %.2f%% in the busiest second (%d bits)" % (
+        100*stats["utilization"], 100*stats["peakutilization"], stats["bits"])
+    print "message types:"
+    for count, name in stats["types"][:top] :
+        print "  %10d  %s" % (count, name)
+    rest = stats["types"][top:]
+    if len(rest) > 0 :
+        print "  %10d  in %d other types" % (sum([c for c, name in rest]), len(rest))
+    print "busiest nodes:"
+    for alias, count, rate, utilization in stats["talkers"] :
+        print "  0x%03X  %10d frames  %8.1f/sec  %6.2f%% of the bus" % (alias, count, rate, 100*utilization)
+    if "gaps" in stats :
+        print "gaps between frames (sec): min %.6f  median %.6f  90%% %.6f  99%% %.6f  max %.3f" % tuple(stats["gaps"])
+        edges, counts = stats["gaphistogram"]
+        for i in range(len(counts)) :
+            upper = "%g" % edges[i+1] if i+1 < len(edges) else "more"
+            print "  %9s to %-5s %10d" % ("%g" % edges[i], upper, counts[i])
+    return
+
+def usage() :
+    print ""
+    print "Called standalone, reports the bus statistics of a trace file."
+    print ""
+    print "valid usages (default values):"
+    print "  python busstats.py bus.trc"
+    print "  python busstats.py -r 125000 -n 10 bus.trc"
+    print ""
+    print "-r --rate bus bit rate (default 125000)"
+    print "-n --top how many message types and nodes to list (default 10)"
+
+import getopt, sys, time
+
+def main():
+    bitrate = BITRATE
+    top = 10
+    try:
+        opts, remainder = getopt.getopt(sys.argv[1:], "r:n:", ["rate=", "top="])
+    except getopt.GetoptError, err:
+        # print help information and exit:
+        print str(err) # will print something like "option -a not recognized"
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-r", "--rate"):
+            bitrate = int(arg)
+        elif opt in ("-n", "--top"):
+            top = int(arg)
+        else:
+            assert False, "unhandled option"
+    if len(remainder) != 1 :
+        usage()
+        sys.exit(2)
+
+    start = time.time()
+    frames = load(remainder[0])
+    loaded = time.time()
+    report(statistics(frames, bitrate, top), top)
+    print "(loaded in %.2f sec, computed in %.2f sec)" % (loaded-start, time.time()-loaded)
+
+if __name__ == '__main__':
+    main()
@@ -2,46 +2,72 @@
 '''
 Utilities for communicating with CAN OpenLCB implementations
 
+makeframestrings and decodeframestrings convert many frames at once.
+If NumPy is available, encodeframes and decodeframes convert whole
+arrays of headers and data to and from GridConnect text.
+describe and decode give readable names for frames, e.g. for
+monitor.py.
+
 @author: Bob Jacobsen
 '''
 
+import binascii
+
+try :
+    import numpy
+except ImportError :
+    numpy = None
+
+# two upper-case hex digits for each byte value
+hexbyte = ["%02X" % i for i in range(256)]
+
 '''
 Turn frame values into a string for sending to the interface.
 header is the int value of the CAN frame header.
 body is an array of 0 to 8 bytes of data for the frame body.
 '''
 def makeframestring(header, body) :
-    retval = ":X"
-    retval += hex(header).upper()[2:]
-    retval += "N"
-    if (body != None) :
-        for a in body :
-            retval += ("00"+(hex(a).upper()[2:]))[-2:]
-    retval += ";"
-    return retval
+    if (body == None) :
+        return ":X%XN;" % header
+    return ":X%XN%s;" % (header, "".join([hexbyte[a & 0xFF] for a in body]))
+
+'''
+Turn many (header, body) pairs into frame strings
+@return list of strings
+'''
+def makeframestrings(frames) :
+    table = hexbyte
+    return [":X%XN%s;" % (header, "".join([table[a & 0xFF] for a in body]) if body != None else "")
+                for header, body in frames]
 
 '''
 Take a hex-byte-sequence string like 1.2.3.a3.4 and return
 an array of ints, used for e.g. input of node and event IDs
 '''
 def splitSequence(seq) :
-    strings = seq.split('.')
-    result = []
-    for a in strings : 
-        result = result+[int(a, 16)]
-    return result
- 
+    return [int(a, 16) for a in seq.split('.')]
+
 '''
 Pull body bytes from frame as array
 '''
 def bodyArray(frame) :
-    string = frame[11:];
+    n = frame.find('N')+1
+    if n == 0 : n = 11
+    return list(bytearray(binascii.unhexlify(frame[n:frame.find(';', n)])))
+
+'''
+Turn many frame strings into (header, body) pairs,
+the reverse of makeframestrings
+@return list of (int, array of ints)
+'''
+def decodeframestrings(frames) :
+    unhex = binascii.unhexlify
     result = []
-    while (string[0] != ';') :
-        result = result+[int(string[:2],16)]
-        string = string[2:]
+    for frame in frames :
+        n = frame.find('N')
+        result.append((int(frame[2:n], 16), list(bytearray(unhex(frame[n+1:frame.find(';', n)])))))
     return result
-           
+
 '''
 Return (header, body) of a P/C Event Report frame
 alias: the source alias of this node
@@ -50,14 +76,228 @@ id: array containing 8 bytes of event ID
 def eventframe(alias, event) :
     return (0x182DF000+alias, event)
 
+'''
+Pull the header from frame as an int
+'''
+def headerValue(frame) :
+    return int(frame[2:frame.find('N')], 16)
+
+# names of the message types, by MTI
+mtinames = {
+    0x100 : "Initialization Complete",
+    0x068 : "Optional Interaction Rejected",
+    0x0A8 : "Terminate Due To Error",
+    0x488 : "Verify Node ID Addressed",
+    0x490 : "Verify Node ID Global",
+    0x170 : "Verified Node ID",
+    0x828 : "Protocol Support Inquiry",
+    0x668 : "Protocol Support Reply",
+    0x968 : "Identify Events Addressed",
+    0x970 : "Identify Events Global",
+    0x8F4 : "Identify Consumer",
+    0x4A4 : "Consumer Range Identified",
+    0x4C4 : "Consumer Identified Valid",
+    0x4C5 : "Consumer Identified Invalid",
+    0x4C7 : "Consumer Identified Unknown",
+    0x914 : "Identify Producer",
+    0x524 : "Producer Range Identified",
+    0x544 : "Producer Identified Valid",
+    0x545 : "Producer Identified Invalid",
+    0x547 : "Producer Identified Unknown",
+    0x5B4 : "Producer/Consumer Event Report",
+    0xA28 : "Datagram Received OK",
+    0xA48 : "Datagram Rejected",
+    0xDE8 : "Simple Node Ident Info Request",
+    0xA08 : "Simple Node Ident Info Reply",
+}
+
+# names of the control frames, by the 12-bit field
+controlnames = {
+    0x700 : "Reserve ID",
+    0x701 : "Alias Map Definition",
+    0x702 : "Alias Map Enquiry",
+    0x703 : "Alias Map Reset",
+}
+
+# names of the frame types
+typenames = ["Control", "Message", "Datagram Only", "Datagram First",
+             "Datagram Middle", "Datagram Final", "Reserved", "Stream"]
+
+'''
+Return the frame type of an extended header:
+1 for messages, 2-5 for datagram frames, 0 for control frames
+'''
+def frameType(header) :
+    if (header & 0x08000000) == 0 : return 0
+    return (header >> 24) & 0x7
+
+'''
+Return the name of the kind of frame a header is, e.g.
+"Verified Node ID" or "Datagram First"
+'''
+def describe(header, extended=True) :
+    if not extended : return "Standard"
+    if (header & 0x08000000) == 0 :
+        if (header & 0x07000000) != 0 : return "Check ID"
+        return controlnames.get((header >> 12) & 0xFFF, "Control")
+    frametype = frameType(header)
+    if frametype == 1 :
+        mti = (header >> 12) & 0xFFF
+        return mtinames.get(mti, "MTI 0x%03X" % mti)
+    return typenames[frametype]
+
+# message types carrying an event ID, and those carrying a node ID
+eventmtis = set([0x8F4, 0x4A4, 0x4C4, 0x4C5, 0x4C7, 0x914, 0x524, 0x544, 0x545, 0x547, 0x5B4])
+nodemtis = set([0x100, 0x170, 0x488, 0x490])
+
+'''
+Return bytes as a dotted hex string, e.g. for node and event IDs
+'''
+def dotted(data) :
+    return ".".join(["%02X" % b for b in bytearray(data)])
+
+'''
+Return a readable description of a frame string, e.g.
+"DDD Verified Node ID node 02.03.04.05.06.01"
+'''
+def decode(frame) :
+    header = headerValue(frame)
+    extended = frame[1] != 'S'
+    data = bodyArray(frame)
+    text = "%03X %s" % (header & 0xFFF, describe(header, extended))
+    frametype = frameType(header) if extended else 0
+    if frametype >= 2 and frametype <= 5 :
+        return text+" to %03X  %s" % ((header >> 12) & 0xFFF, dotted(data))
+    if frametype == 1 :
+        mti = (header >> 12) & 0xFFF
+        if (mti & 0x008) != 0 and len(data) >= 2 :
+            # addressed
+            text = text+" to %03X" % (((data[0] & 0x0F) << 8) | data[1])
+            data = data[2:]
+        if mti in eventmtis and len(data) == 8 :
+            return text+" event "+dotted(data)
+        if mti in nodemtis and len(data) == 6 :
+            return text+" node "+dotted(data)
+    elif len(data) == 6 :
+        return text+" node "+dotted(data)   # AMD, AME, AMR
+    if len(data) == 0 : return text
+    return text+"  "+dotted(data)
+
+def neednumpy() :
+    if numpy == None :
+        raise ImportError("NumPy is needed for encodeframes and decodeframes")
+    return
+
+'''
+Convert arrays of frames to GridConnect text, one frame per line.
+Unlike makeframestring, headers are always 8 hex digits.
+@param headers n header values
+@param data n by 8 array of data bytes
+@param lengths n data lengths, 0 to 8
+@return string
+'''
+def encodeframes(headers, data, lengths) :
+    neednumpy()
+    headers = numpy.asarray(headers, dtype=numpy.uint32)
+    data = numpy.asarray(data, dtype=numpy.uint8).reshape(-1, 8)
+    lengths = numpy.asarray(lengths, dtype=numpy.intp)
+    n = len(headers)
+    digits = numpy.frombuffer("0123456789ABCDEF", dtype=numpy.uint8)
+    # every frame laid out at full length, then the unused data dropped
+    out = numpy.empty((n, 30), dtype=numpy.uint8)
+    out[:, 0] = ord(':')
+    out[:, 1] = ord('X')
+    for k in range(8) :
+        out[:, 2+k] = digits[(headers >> (28-4*k)) & 0xF]
+    out[:, 10] = ord('N')
+    out[:, 11:27:2] = digits[data >> 4]
+    out[:, 12:28:2] = digits[data & 0xF]
+    rows = numpy.arange(n)
+    out[rows, 11+2*lengths] = ord(';')
+    out[rows, 12+2*lengths] = ord('\n')
+    keep = numpy.arange(30)[numpy.newaxis, :] < (13+2*lengths)[:, numpy.newaxis]
+    return out[keep].tostring()
+
+'''
+Convert GridConnect text, such as from encodeframes, to arrays.
+Characters between frames (e.g. line ends) are ignored.
+@param text string of :X...N...; frames
+@return (headers, data, lengths) as from encodeframes
+'''
+def decodeframes(text) :
+    neednumpy()
+    chars = numpy.frombuffer(text, dtype=numpy.uint8)
+    values = numpy.zeros(256, dtype=numpy.uint32)
+    for i, c in enumerate("0123456789ABCDEF") :
+        values[ord(c)] = i
+        values[ord(c.lower())] = i
+    nibbles = values[chars]
+    starts = numpy.flatnonzero(chars == ord(':'))
+    ns = numpy.flatnonzero(chars == ord('N'))
+    ends = numpy.flatnonzero(chars == ord(';'))
+    headers = numpy.zeros(len(starts), dtype=numpy.uint32)
+    for k in range(8) :
+        # header digits, last first; there may be fewer than 8
+        pos = ns-1-k
+        headers |= numpy.where(pos >= starts+2, nibbles[pos] << (4*k), 0).astype(numpy.uint32)
+    lengths = (ends-ns-1)//2
+    data = numpy.zeros((len(starts), 8), dtype=numpy.uint8)
+    last = len(chars)-1
+    for k in range(8) :
+        hi = numpy.minimum(ns+1+2*k, last)
+        byte = (nibbles[hi] << 4) | nibbles[numpy.minimum(hi+1, last)]
+        data[:, k] = numpy.where(k < lengths, byte, 0)
+    return (headers, data, lengths)
+
+'''
+Time encoding and decoding count random frames.
+@return list of (name, frames per second)
+'''
+def benchmark(count) :
+    import random, time
+    frames = []
+    for i in range(count) :
+        frames.append((random.randint(0x10000000, 0x1FFFFFFF),
+                       [random.randint(0, 255) for j in range(random.randint(0, 8))]))
+    result = []
+    start = time.time()
+    strings = makeframestrings(frames)
+    result.append(("makeframestrings", count/(time.time()-start)))
+    start = time.time()
+    decoded = decodeframestrings(strings)
+    result.append(("decodeframestrings", count/(time.time()-start)))
+    if decoded != frames : print "decodeframestrings mismatch"
+    if numpy != None :
+        headers = numpy.array([h for h, b in frames], dtype=numpy.uint32)
+        lengths = numpy.array([len(b) for h, b in frames])
+        data = numpy.zeros((count, 8), dtype=numpy.uint8)
+        for i in range(count) :
+            data[i, :lengths[i]] = frames[i][1]
+        start = time.time()
+        text = encodeframes(headers, data, lengths)
+        result.append(("encodeframes", count/(time.time()-start)))
+        start = time.time()
+        h, d, l = decodeframes(text)
+        result.append(("decodeframes", count/(time.time()-start)))
+        if text != "\n".join(strings)+"\n" : print "encodeframes mismatch"
+        if not ((h == headers).all() and (d == data).all() and (l == lengths).all()) :
+            print "decodeframes mismatch"
+    return result
+
+import sys
 
 def main():
+    if len(sys.argv) > 1 :
+        # python canolcbutils.py count : time the bulk conversions
+        for name, rate in benchmark(int(sys.argv[1])) :
+            print "  %-20s %10.0f frames/sec" % (name, rate)
+        return
     (header, body) = eventframe(0x123, [11,255,240,4,5,6,7,8]);
     print makeframestring(header, body)
     print splitSequence("1.2.3.a.0a.10.4")
     print bodyArray(":X1E000000F010203040506;")
-    
+    print decode(":X19170DDDN020304050601;")
+
 
 if __name__ == '__main__':
     main()
-    
\ No newline at end of file
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+'''
+CDIs already read, by the node type they came from
+
+Every node with the same SNIP manufacturer, model and software
+version has the same CDI, so once one has been read over the bus
+the others can come from a CdiCache.  Each CDI is kept once, by the
+SHA-1 hash of its content, with the node types that map to it; when
+the CDIs kept are more than the size limit, the least recently used
+node types are dropped.  It can be kept in a directory between runs:
+an "index" file of node types and hashes, least recently used first,
+and a "<hash>.cdi" file of each CDI.  A CDI whose content no longer
+matches its hash is read again.
+
+defaults.py has the shared cache kept in cdidir, if set.
+
+    content = cdicache.cache.read(alias, dest, connection, verbose)
+
+'''
+
+import hashlib
+import os
+from collections import OrderedDict
+
+# SNIP strings that identify a node type
+fields = ["manufacturer", "model", "softwareVersion"]
+
+class CdiCache :
+    '''
+    @param limit most bytes of CDI to keep
+    '''
+    def __init__(self, limit=4*1024*1024) :
+        self.limit = limit
+        self.clear()
+        return
+
+    def clear(self) :
+        self.types = OrderedDict()   # (manufacturer, model, softwareVersion) -> hash, least recently used first
+        self.contents = {}           # hash -> CDI, or None if it's only on disk
+        self.sizes = {}              # hash -> length of the CDI
+        self.directory = None
+        self.changed = False
+        self.hits = 0
+        self.misses = 0
+        return
+
+    '''
+    @param strings dictionary of SNIP strings, as from simpleNodeIdentificationInformation.strings()
+    @return the node type key, or None if they don't identify one
+    '''
+    def key(self, strings) :
+        key = []
+        for k in fields :
+            value = strings.get(k)
+            if isinstance(value, unicode) : value = value.encode("utf-8")
+            if value == None or "\t" in value or "\n" in value : return None
+            key.append(value)
+        if key[0:2] == ["", ""] : return None
+        return tuple(key)
+
+    def size(self) :
+        return sum(self.sizes.values())
+
+    def path(self, hash) :
+        return os.path.join(self.directory, hash+".cdi")
+
+    '''
+    @return CDI of a node type, or None if not known
+    '''
+    def get(self, strings) :
+        key = self.key(strings)
+        hash = self.types.get(key)
+        if hash == None :
+            self.misses = self.misses+1
+            return None
+        content = self.contents.get(hash)
+        if content == None and self.directory != None :
+            try :
+                content = open(self.path(hash), "rb").read()
+            except IOError :
+                content = None
+            if content != None and hashlib.sha1(content).hexdigest() != hash :
+                content = None
+                os.remove(self.path(hash))
+        if content == None :
+            # lost or damaged; read it again
+            self.drop(key)
+            self.misses = self.misses+1
+            return None
+        self.contents[hash] = content
+        self.types[key] = self.types.pop(key)   # now the most recently used
+        self.changed = True
+        self.hits = self.hits+1
+        return content
+
+    def put(self, strings, content) :
+        key = self.key(strings)
+        if key == None : return
+        hash = hashlib.sha1(content).hexdigest()
+        if key in self.types : self.drop(key)
+        self.types[key] = hash
+        self.contents[hash] = content
+        self.sizes[hash] = len(content)
+        self.changed = True
+        while self.size() > self.limit and len(self.types) > 1 :
+            self.drop(self.types.keys()[0])
+        return
+
+    # forget a node type, and its CDI if no other type has it
+    def drop(self, key) :
+        hash = self.types.pop(key)
+        if hash not in self.types.values() :
+            self.contents.pop(hash, None)
+            self.sizes.pop(hash, None)
+        self.changed = True
+        return
+
+    '''
+    Get the CDI of a node from the cache, or over the bus if it's not there.
+    One read over the bus is kept only if it ends with its null, and
+    passes the validator if there is one.
+    @param strings SNIP strings of the node, or None to ask it for them
+    @param validator cdischema.Validator fed each piece read over the bus,
+    and closed once it's all read; a CDI from the cache isn't fed to it
+    @return the CDI as a string, or an error code if it couldn't be read
+    '''
+    def read(self, alias, dest, connection, verbose, strings=None, validator=None) :
+        import testCDI
+        check = None if validator == None else validator.feed
+        if strings == None and self.directory == None :
+            # nothing from an earlier run to find
+            return testCDI.read(alias, dest, connection, verbose, check)
+        if strings == None :
+            import harvest
+            strings = harvest.Harvester(alias, connection.network).run([dest], (harvest.SNIP,))[dest]
+        content = self.get(strings)
+        if content != None :
+            if verbose : print "   CDI of %03X from cache" % dest
+            return content
+        content = testCDI.read(alias, dest, connection, verbose, check)
+        if type(content) is not str or not content.endswith("\0") : return content
+        if validator == None or validator.close() == None : self.put(strings, content)
+        return content
+
+    '''
+    Use a directory, reading the index kept there; a missing
+    directory is just an empty cache, made when saved
+    '''
+    def load(self, directory) :
+        self.clear()
+        self.directory = directory
+        try :
+            lines = open(os.path.join(directory, "index")).readlines()
+        except IOError :
+            return
+        for line in lines :
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) != 1+len(fields) or len(parts[0]) != 40 : continue
+            hash = parts[0]
+            try :
+                self.sizes[hash] = os.path.getsize(self.path(hash))
+            except OSError :
+                continue   # file is gone
+            self.types[tuple(parts[1:])] = hash
+            self.contents.setdefault(hash, None)
+        self.changed = False
+        return
+
+    def save(self) :
+        if not self.changed or self.directory == None : return
+        try :
+            if not os.path.isdir(self.directory) : os.makedirs(self.directory)
+            for hash, content in self.contents.items() :
+                if content != None and not os.path.exists(self.path(hash)) :
+                    out = open(self.path(hash), "wb")
+                    out.write(content)
+                    out.close()
+            out = open(os.path.join(self.directory, "index"), "w")
+            for key, hash in self.types.items() :
+                out.write("\t".join((hash,)+key)+"\n")
+            out.close()
+            for name in os.listdir(self.directory) :
+                if name.endswith(".cdi") and name[:-4] not in self.sizes :
+                    os.remove(os.path.join(self.directory, name))
+        except (IOError, OSError) :
+            return   # e.g. read-only directory; just don't keep it
+        self.changed = False
+        return
+
+cache = CdiCache()
+
+def main():
+    strings = {"manufacturer" : "OpenLCB", "model" : "Simulated Node", "softwareVersion" : "1.0"}
+    print cache.get(strings)
+    cache.put(strings, "<cdi/>\0")
+    print repr(cache.get(strings)), cache.hits, cache.misses, cache.size()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+'''
+Check a CDI against the rules of the CDI schema, as it arrives
+
+testCDI.py used to hand the whole CDI to xmllint once it had all
+been read.  A Validator instead feeds each piece into an expat parser
+as the reads return it, checking each element as it opens against
+the schema's rules: which elements may appear inside which, the
+attributes they need, and the values those may take.  The first
+problem stops the check, so a read can stop there too:
+
+    validator = cdischema.Validator()
+    for data in pieces :
+        if not validator.feed(data) : break
+    validator.close()
+    if validator.error != None : print validator.error
+
+This covers the structure the schema gives, not all of XML Schema;
+see testCDI.py -x to also run xmllint on it.
+
+@see http://openlcb.org/schema/cdi/1/1/cdi.xsd
+'''
+
+import xml.parsers.expat
+
+# elements that hold only text
+TEXT = None
+
+# content of a variable of each type, before any other
+variable = ["name", "description", "map"]
+numeric = variable+["min", "max", "default", "hints"]
+data = ["group", "string", "int", "eventid", "float", "action", "blob"]
+
+# element -> (elements that may be in it, attributes it needs, attributes with integer values)
+rules = {
+    "cdi" : (["identification", "acdi", "segment"], [], []),
+    "identification" : (["manufacturer", "model", "hardwareVersion", "softwareVersion", "map"], [], []),
+    "acdi" : ([], [], ["fixed", "var"]),
+    "segment" : (["name", "description"]+data, ["space"], ["space", "origin"]),
+    "group" : (["name", "description", "repname", "hints"]+data, [], ["offset", "replication"]),
+    "string" : (variable, ["size"], ["size", "offset"]),
+    "int" : (numeric, [], ["size", "offset"]),
+    "eventid" : (variable, [], ["offset"]),
+    "float" : (numeric+["formatting"], [], ["size", "offset"]),
+    "action" : (["name", "description", "buttonText", "dialogText", "value"], [], ["size", "offset"]),
+    "blob" : (variable, ["size"], ["size", "offset"]),
+    "map" : (["relation"], [], []),
+    "relation" : (["property", "value"], [], []),
+    "hints" : (["slider", "radiobutton", "visibility", "readOnly"], [], []),
+    "slider" : ([], [], ["ticks"]),
+    "radiobutton" : ([], [], []),
+    "visibility" : ([], [], []),
+    "readOnly" : ([], [], []),
+}
+for name in ["name", "description", "repname", "manufacturer", "model", "hardwareVersion", "softwareVersion",
+             "property", "value", "min", "max", "default", "formatting", "buttonText", "dialogText"] :
+    rules[name] = TEXT
+
+# allowed sizes of variables, by type
+sizes = {
+    "int" : [1, 2, 4, 8],
+    "float" : [2, 4, 8],
+}
+
+# elements that may appear only once in their parent, and must come before its data elements
+once = ["identification", "acdi", "name", "description", "map", "min", "max", "default", "hints", "formatting"]
+
+class Validator :
+    def __init__(self) :
+        self.parser = xml.parsers.expat.ParserCreate()
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+        self.parser.CharacterDataHandler = self.text
+        self.stack = []     # [element, names of its children so far] of the open elements
+        self.error = None   # description of the first problem, with its line
+        self.count = 0      # bytes checked
+        self.elements = 0
+        self.root = False
+        self.done = False   # the null at the end has been seen
+        return
+
+    def fail(self, message) :
+        if self.error == None :
+            self.error = "line %d: %s" % (self.parser.CurrentLineNumber, message)
+        return
+
+    def start(self, name, attributes) :
+        self.stack.append([name, []])
+        if self.error != None : return
+        self.elements = self.elements+1
+        if len(self.stack) == 1 :
+            if self.root or name != "cdi" :
+                self.fail("document element is <%s>, not <cdi>" % name)
+            self.root = True
+        else :
+            parent, children = self.stack[-2]
+            rule = rules.get(parent)
+            if rule == TEXT :
+                self.fail("<%s> in <%s>, which holds only text" % (name, parent))
+            elif rule != None and name not in rule[0] :
+                self.fail("<%s> is not allowed in <%s>" % (name, parent))
+            elif name in once and name in children :
+                self.fail("more than one <%s> in <%s>" % (name, parent))
+            elif name in once and len([c for c in children if c in data or c == "segment"]) > 0 :
+                self.fail("<%s> after the content of <%s>" % (name, parent))
+            children.append(name)
+        rule = rules.get(name, TEXT)
+        if name not in rules :
+            self.fail("unknown element <%s>" % name)
+        elif rule != TEXT :
+            for attribute in rule[1] :
+                if attribute not in attributes : self.fail("<%s> needs a %s attribute" % (name, attribute))
+            for attribute in rule[2] :
+                value = attributes.get(attribute)
+                if value == None : continue
+                try :
+                    number = int(value)
+                except ValueError :
+                    self.fail("<%s> %s=\"%s\" is not an integer" % (name, attribute, value))
+                    continue
+                if attribute == "size" and name in sizes and number not in sizes[name] :
+                    self.fail("<%s> size %d is not one of %s" % (name, number, sizes[name]))
+                elif attribute in ("size", "replication", "space") and number < (1 if attribute != "space" else 0) :
+                    self.fail("<%s> %s=%d is out of range" % (name, attribute, number))
+        return
+
+    def end(self, name) :
+        self.stack.pop()
+        return
+
+    def text(self, data) :
+        if self.error != None or len(self.stack) == 0 : return
+        parent = self.stack[-1][0]
+        if rules.get(parent) != TEXT and data.strip() != "" :
+            self.fail("text in <%s>" % parent)
+        return
+
+    '''
+    Check the next piece of the CDI
+    @param data string or list of bytes; a null ends the CDI
+    @return False once a problem has been found, True to go on
+    '''
+    def feed(self, data) :
+        if self.error != None or self.done or self.parser == None : return self.error == None
+        data = str(bytearray(data))
+        end = data.find("\0")
+        if end >= 0 :
+            data = data[:end]
+            self.done = True
+        self.count = self.count+len(data)
+        try :
+            self.parser.Parse(data, False)
+        except xml.parsers.expat.ExpatError, e :
+            self.fail(xml.parsers.expat.ErrorString(e.code))
+        if self.done : self.close()
+        return self.error == None
+
+    '''
+    Finish the check, once all of the CDI has been fed
+    @return the problem found, or None if it's valid
+    '''
+    def close(self) :
+        if self.error != None or self.parser == None : return self.error
+        try :
+            self.parser.Parse("", True)
+        except xml.parsers.expat.ExpatError, e :
+            self.fail(xml.parsers.expat.ErrorString(e.code))
+        if not self.root : self.fail("no <cdi> element")
+        self.parser = None
+        return self.error
+
+'''
+@return the problem found in a CDI, or None if it's valid
+'''
+def check(content) :
+    validator = Validator()
+    validator.feed(content)
+    return validator.close()
+
+'''
+Time checking a CDI of many groups, fed in 64-byte pieces
+@return (bytes, seconds)
+'''
+def benchmark(groups=2000) :
+    import time
+    entry = '<group><name>Input</name><eventid><name>On</name></eventid><eventid><name>Off</name></eventid>' + \
+            '<int size="1"><name>Delay</name><min>0</min><max>255</max></int></group>\n'
+    content = '<?xml version="1.0"?>\n<cdi><identification><manufacturer>OpenLCB</manufacturer></identification>\n' + \
+            '<segment space="253">\n'+entry*groups+'</segment>\n</cdi>\n\0'
+    start = time.time()
+    validator = Validator()
+    for i in range(0, len(content), 64) :
+        if not validator.feed(content[i:i+64]) : break
+    validator.close()
+    return len(content), time.time()-start
+
+def main():
+    import sys
+    if len(sys.argv) < 2 :
+        length, elapsed = benchmark()
+        print "checked %d bytes in %.3f sec, %.1f usec per 64-byte piece" % (length, elapsed, 1e6*elapsed*64/length)
+        return
+    error = check(open(sys.argv[1]).read())
+    if error != None : print error
+    sys.exit(0 if error == None else 1)
+
+if __name__ == '__main__':
+    main()
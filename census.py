@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+'''
+Find every node on the network: alias and Node ID
+
+Sends one Verify Node ID Global and collects all the Verified
+Node ID replies until none has arrived for a while, building the
+alias <-> Node ID table and finding duplicate aliases and Node IDs.
+
+The link is put in threaded mode during the census where it can be
+(see linkreader.py), so the burst of replies from a large layout is
+queued as it arrives instead of overflowing the transport's buffers.
+
+    found = census.take(connection.thisNodeAlias, None, connection.network)
+    for alias, nodeID in found.nodes() : ...
+
+'''
+
+import connection as connection
+import canolcbutils
+import linkreader
+import verifyNodeGlobal
+
+# Verified Node ID, full and simple protocol subset forms
+verified = (":X19170", ":X19171")
+
+class Census :
+    def __init__(self) :
+        self.byalias = {}    # alias -> list of node IDs (as tuples)
+        self.bynode = {}     # node ID -> list of aliases
+        self.replies = 0
+        self.elapsed = 0.0
+        self.dropped = 0     # frames the link's reader had to drop
+        return
+
+    def add(self, alias, nodeID) :
+        nodeID = tuple(nodeID)
+        self.replies = self.replies+1
+        ids = self.byalias.setdefault(alias, [])
+        if nodeID not in ids : ids.append(nodeID)
+        aliases = self.bynode.setdefault(nodeID, [])
+        if alias not in aliases : aliases.append(alias)
+        return
+
+    '''
+    @return sorted list of (alias, nodeID), one per
+    pair seen, so a duplicated alias appears more than once
+    '''
+    def nodes(self) :
+        return sorted([(alias, list(n)) for alias, ids in self.byalias.items() for n in ids])
+
+    def alias(self, nodeID) :
+        aliases = self.bynode.get(tuple(nodeID))
+        if aliases == None : return None
+        return aliases[0]
+
+    def nodeID(self, alias) :
+        ids = self.byalias.get(alias)
+        if ids == None : return None
+        return list(ids[0])
+
+    # aliases used by more than one node ID
+    def duplicateAliases(self) :
+        return sorted([(alias, [list(n) for n in ids]) for alias, ids in self.byalias.items() if len(ids) > 1])
+
+    # node IDs seen with more than one alias
+    def duplicateNodes(self) :
+        return sorted([(list(n), aliases) for n, aliases in self.bynode.items() if len(aliases) > 1])
+
+    def report(self) :
+        print len(self.byalias), "aliases,", len(self.bynode), "node IDs from", self.replies, \
+            "replies in %.3f sec" % self.elapsed
+        for alias, ids in self.duplicateAliases() :
+            print "  duplicate alias %03X used by" % alias, ", ".join([canolcbutils.dotted(n) for n in ids])
+        for nodeID, aliases in self.duplicateNodes() :
+            print "  duplicate node ID", canolcbutils.dotted(nodeID), "on aliases", \
+                ", ".join(["%03X" % a for a in aliases])
+        if self.dropped > 0 :
+            print "  link reader dropped", self.dropped, "frames; increase its queuesize"
+        return
+
+'''
+Take a census of the network
+@param alias alias of self
+@param nodeID if not None, only that node should answer
+@param network link to use
+@param quiet seconds without a reply that end the census
+@param limit seconds the census may take at most
+@return Census
+'''
+def take(alias, nodeID, network, verbose=False, quiet=0.5, limit=30.0) :
+    saved = linkreader.hold(network, quiet)
+    reader = getattr(network, "reader", None)
+    before = reader.dropped if reader != None else 0
+    result = Census()
+    try :
+        network.send(verifyNodeGlobal.makeframe(alias, nodeID))
+        start = network.clock.time()
+        last = start
+        while (True) :
+            reply = network.receive()
+            now = network.clock.time()
+            if reply == None or now-last > quiet or now-start > limit : break
+            if not reply.startswith(verified) : continue
+            last = now
+            source = int(reply[7:10],16)
+            node = canolcbutils.bodyArray(reply)
+            result.add(source, node)
+            if verbose : print "Found alias %03X for node ID" % source, canolcbutils.dotted(node)
+    finally :
+        linkreader.release(network, saved)
+    result.elapsed = last-start
+    reader = getattr(network, "reader", None)
+    if reader != None : result.dropped = reader.dropped-before
+    return result
+
+def usage() :
+    print ""
+    print "Called standalone, finds the alias and Node ID of every node"
+    print "with one CAN VerifyNode (Global) message"
+    print ""
+    print "Default connection detail taken from connection.py"
+    print ""
+    print "-a --alias source alias (default 0x%03X)" % connection.thisNodeAlias
+    print "-n --node only this nodeID (default None)"
+    print "-q --quiet seconds without a reply that end the census (default 0.5)"
+    print "-l --list list every alias and Node ID"
+    print "-v verbose"
+
+import getopt, sys
+
+def main():
+    # argument processing
+    nodeID = None
+    alias = connection.thisNodeAlias
+    verbose = False
+    quiet = 0.5
+    listall = False
+    try:
+        opts, remainder = getopt.getopt(sys.argv[1:], "n:a:q:lvV", ["alias=", "node=", "quiet=", "list"])
+    except getopt.GetoptError, err:
+        # print help information and exit:
+        print str(err) # will print something like "option -a not recognized"
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == "-v" or opt == "-V":
+            verbose = True
+            if opt == "-V" : connection.network.verbose = True
+        elif opt in ("-a", "--alias"):
+            alias = int(arg, 0)
+        elif opt in ("-n", "--node"):
+            nodeID = canolcbutils.splitSequence(arg)
+        elif opt in ("-q", "--quiet"):
+            quiet = float(arg)
+        elif opt in ("-l", "--list"):
+            listall = True
+        else:
+            assert False, "unhandled option"
+
+    # now execute
+    found = take(alias, nodeID, connection.network, verbose, quiet)
+    if listall :
+        for a, n in found.nodes() :
+            print "  %03X  %s" % (a, canolcbutils.dotted(n))
+    found.report()
+    connection.network.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+'''
+Protocol conformance of captured traffic
+
+Checks a trace file (see tracefile.py) passively, in one pass,
+for what testStartup.py, testAliasConflict.py and testReservedBits.py
+check by stimulus and response:
+
+    reuse      an alias used while checking it, before defining it,
+               or after releasing it, i.e. without CID/RID/AMD
+    early      RID less than 200 msec after the last CID
+    ack        a datagram not answered by Datagram Received OK
+               or Rejected
+    duplicate  one alias for two Node IDs, or one Node ID on two
+               aliases
+    reserved   reserved header bits clear, reserved frame types
+               or control frames, reserved addressing bits set
+
+The records are read a chunk at a time as NumPy arrays.  Array
+operations pick out the few frames that change the state of an
+alias (CID, RID, AMD, AMR, Verified Node ID), which go through a
+state machine per alias; every other frame is checked against
+those states, and the datagrams against their acks, with array
+operations too.
+
+    python monitor.py -c bus.trc        capture
+    python conformance.py bus.trc       check
+
+NumPy is required.
+
+'''
+
+try :
+    import numpy
+except ImportError :
+    numpy = None
+
+import canolcbutils
+import tracefile
+
+# states of an alias
+UNKNOWN = 0     # not seen allocated or released
+CHECKING = 1    # CID frames sent
+RESERVED = 2    # RID sent
+PERMITTED = 3   # AMD sent
+RELEASED = 4    # AMR sent
+
+WAIT = 0.200    # minimum time from the last CID to RID
+
+checks = ["reuse", "early", "ack", "duplicate", "reserved"]
+
+# known control frames besides CID, by the 12-bit field
+controls = [0x700, 0x701, 0x702, 0x703, 0x710, 0x711, 0x712, 0x713]
+
+def nodeid(data) :
+    return canolcbutils.dotted(bytearray(data[:6]))
+
+class Analyzer :
+    '''
+    @param wait minimum time from CID to RID
+    @param acktimeout time within which a datagram has to be answered
+    @param limit how many findings of each check to keep; all are counted
+    '''
+    def __init__(self, wait=WAIT, acktimeout=3.0, limit=100) :
+        if numpy == None :
+            raise ImportError("NumPy is needed for conformance")
+        self.wait = wait
+        self.acktimeout = acktimeout
+        self.limit = limit
+        self.findings = []              # (time, record, alias, check, text)
+        self.counts = dict([(c, 0) for c in checks])
+        self.frames = 0
+        self.first = None
+        self.last = None
+        self.state = numpy.zeros(4096, dtype=numpy.uint8)
+        self.owner = {}                 # alias -> node ID of a permitted alias
+        self.aliases = {}               # node ID -> alias
+        self.cids = {}                  # alias -> [CID frames seen, time of the last]
+        self.datagrams = []             # arrays of (record, time, pair, is ack) not matched yet
+        return
+
+    def flag(self, check, when, record, alias, text) :
+        self.counts[check] = self.counts[check]+1
+        if self.counts[check] <= self.limit :
+            self.findings.append((when, record, alias, check, text))
+        return
+
+    '''
+    Flag many frames at once
+    @param which positions in the chunk
+    '''
+    def flagall(self, check, records, base, which, text) :
+        if len(which) == 0 : return
+        keep = max(0, min(len(which), self.limit-self.counts[check]))
+        for i in which[:keep] :
+            self.findings.append((float(records["time"][i]), base+int(i),
+                                  int(records["header"][i]) & 0xFFF, check, text))
+        self.counts[check] = self.counts[check]+len(which)
+        return
+
+    '''
+    Check a chunk of records, a structured array as from
+    tracequery.TraceQuery.chunks()
+    @param base record number of the first
+    '''
+    def feed(self, records, base) :
+        n = len(records)
+        if n == 0 : return
+        if self.first == None : self.first = float(records["time"][0])
+        self.last = float(records["time"][-1])
+        self.frames = self.frames+n
+        header = records["header"].astype(numpy.int64)
+        flags = records["flags"]
+        data = records["data"]
+        extended = (flags & tracefile.EXTENDED) != 0
+        openlcb = extended & ((header & 0x08000000) != 0)
+        control = extended & ~openlcb
+        frametype = (header >> 24) & 0x7
+        field = (header >> 12) & 0xFFF
+        alias = header & 0xFFF
+        message = openlcb & (frametype == 1)
+        addressed = message & ((header & 0x8000) != 0) & ((flags & 0x0F) >= 2)
+
+        # reserved bits and values
+        self.flagall("reserved", records, base, numpy.flatnonzero(extended & ((header & 0x10000000) == 0)),
+                     "reserved header bit 28 not set")
+        self.flagall("reserved", records, base, numpy.flatnonzero(openlcb & (frametype == 6)),
+                     "reserved frame type 6")
+        self.flagall("reserved", records, base,
+                     numpy.flatnonzero(control & (frametype < 4) & ~numpy.in1d(field, controls)),
+                     "reserved control frame")
+        self.flagall("reserved", records, base, numpy.flatnonzero(addressed & ((data[:, 0] & 0xC0) != 0)),
+                     "reserved addressing bits set")
+
+        # frames that change alias states, through the state machines
+        start = self.state.copy()
+        changes = numpy.flatnonzero(control | (message & (field == 0x170)))
+        if len(changes) > 0 :
+            # a Verified Node ID repeating the frame before it from the same alias changes nothing
+            verified = openlcb[changes]
+            node = numpy.zeros(len(changes), dtype=numpy.int64)
+            for k in range(6) :
+                node = node << 8 | data[changes, k]
+            order = numpy.argsort(alias[changes], kind="mergesort")
+            same = numpy.zeros(len(changes), dtype=bool)
+            same[order[1:]] = (alias[changes][order[1:]] == alias[changes][order[:-1]]) \
+                & verified[order[1:]] & verified[order[:-1]] & (node[order[1:]] == node[order[:-1]])
+            changes = changes[~same]
+        events = []
+        for i in changes :
+            when = float(records["time"][i])
+            new = self.change(when, base+int(i), int(header[i]), data[i, :flags[i] & 0x0F].tostring())
+            if new != None :
+                self.state[int(header[i]) & 0xFFF] = new
+                events.append((int(i), int(header[i]) & 0xFFF, new))
+
+        # messages and datagrams from aliases in the wrong state
+        used = numpy.flatnonzero(openlcb)
+        if len(events) > 0 :
+            positions, changed, states = [numpy.array(c, dtype=numpy.int64) for c in zip(*events)]
+            order = numpy.lexsort((positions, changed))
+            keys = (changed << 32 | positions)[order]
+            states = states[order]
+            wanted = alias[used] << 32 | used
+            before = numpy.searchsorted(keys, wanted)-1
+            inside = (before >= 0) & ((keys[numpy.maximum(before, 0)] >> 32) == alias[used])
+            state = numpy.where(inside, states[numpy.maximum(before, 0)], start[alias[used]])
+        else :
+            state = start[alias[used]]
+        for value, text in ((CHECKING, "used while checking the alias"),
+                            (RESERVED, "used before Alias Map Definition"),
+                            (RELEASED, "used after Alias Map Reset, without CID/RID")) :
+            self.flagall("reuse", records, base, used[state == value], text)
+
+        # datagrams and their acks; those older than the ack timeout are matched now
+        complete = numpy.flatnonzero(openlcb & ((frametype == 2) | (frametype == 5)))
+        acks = numpy.flatnonzero(addressed & ((field == 0xA28) | (field == 0xA48)))
+        dest = ((data[acks, 0].astype(numpy.int64) & 0x0F) << 8) | data[acks, 1]
+        self.datagrams.append((numpy.concatenate((base+complete, base+acks)),
+                               numpy.concatenate((records["time"][complete], records["time"][acks])),
+                               numpy.concatenate((alias[complete] << 12 | field[complete], dest << 12 | alias[acks])),
+                               numpy.concatenate((numpy.zeros(len(complete), bool), numpy.ones(len(acks), bool)))))
+        self.match(self.last-self.acktimeout, False)
+        return
+
+    '''
+    Run the state machine of an alias for one control
+    or Verified Node ID frame
+    @return new state of the alias, or None if unchanged
+    '''
+    def change(self, when, record, header, data) :
+        alias = header & 0xFFF
+        state = self.state[alias]
+        if (header & 0x08000000) != 0 :
+            # Verified Node ID
+            if len(data) < 6 : return None
+            node = nodeid(data)
+            self.define(when, record, alias, node, "Verified Node ID")
+            return None
+        frametype = (header >> 24) & 0x7
+        if frametype >= 4 :
+            # CID
+            if state == PERMITTED : return None   # another node checking it; owner answers RID
+            if frametype == 7 :
+                self.cids[alias] = [1, when]
+            elif alias in self.cids :
+                self.cids[alias][0] = self.cids[alias][0]+1
+                self.cids[alias][1] = when
+            return CHECKING
+        field = (header >> 12) & 0xFFF
+        if field == 0x700 :
+            # RID
+            if state == PERMITTED : return None   # answering a conflicting CID
+            cid = self.cids.pop(alias, None)
+            if cid == None or cid[0] < 4 :
+                if cid != None or when-self.first > self.wait :
+                    self.flag("reuse", when, record, alias, "Reserve ID without the four CID frames")
+            elif when-cid[1] < self.wait :
+                self.flag("early", when, record, alias,
+                          "Reserve ID %.1f msec after the last CID" % (1000*(when-cid[1])))
+            return RESERVED
+        elif field == 0x701 :
+            # AMD
+            if len(data) < 6 : return None
+            if state == CHECKING or state == RELEASED :
+                self.flag("reuse", when, record, alias, "Alias Map Definition without CID/RID")
+            self.define(when, record, alias, nodeid(data), "Alias Map Definition")
+            return PERMITTED
+        elif field == 0x703 :
+            # AMR
+            node = self.owner.pop(alias, None)
+            if node != None and self.aliases.get(node) == alias : del self.aliases[node]
+            return RELEASED
+        return None
+
+    '''
+    Note the node ID of an alias, flagging any duplicate
+    '''
+    def define(self, when, record, alias, node, what) :
+        owner = self.owner.get(alias)
+        if owner != None and owner != node :
+            self.flag("duplicate", when, record, alias,
+                      "%s: alias %03X used by %s and %s" % (what, alias, owner, node))
+        other = self.aliases.get(node)
+        if other != None and other != alias and self.owner.get(other) == node :
+            self.flag("duplicate", when, record, alias,
+                      "%s: node %s on aliases %03X and %03X" % (what, node, other, alias))
+            del self.owner[other]
+        self.owner[alias] = node
+        self.aliases[node] = alias
+        return
+
+    '''
+    Match the datagrams with their acks.  Each datagram from one node
+    to another has to be answered before the next, within acktimeout.
+    @param cutoff time up to which they can be decided; the later ones
+    are kept to be matched with the records still to come
+    @param final True if no more records are coming, when the later
+    ones are cut off by the end of the capture and dropped
+    '''
+    def match(self, cutoff, final) :
+        if len(self.datagrams) == 0 : return
+        records, times, pairs, isack = [numpy.concatenate(c) for c in zip(*self.datagrams)]
+        order = numpy.lexsort((records, pairs))
+        records, times, pairs, isack = records[order], times[order], pairs[order], isack[order]
+        following = numpy.append(isack[1:] & (pairs[1:] == pairs[:-1]), False)
+        answered = numpy.append(times[1:]-times[:-1] <= self.acktimeout, False)
+        # an ack can still come for a datagram up to acktimeout after it
+        decided = times <= cutoff if final else times < cutoff
+        missing = ~isack & ~(following & answered) & decided
+        which = numpy.flatnonzero(missing)
+        which = which[numpy.argsort(records[which], kind="mergesort")]
+        keep = max(0, min(len(which), self.limit-self.counts["ack"]))
+        self.counts["ack"] = self.counts["ack"]+len(which)
+        for i in which[:keep] :
+            self.findings.append((float(times[i]), int(records[i]), int(pairs[i] >> 12), "ack",
+                                  "datagram to %03X not acknowledged" % (pairs[i] & 0xFFF)))
+        later = ~decided
+        self.datagrams = [] if final else [(records[later], times[later], pairs[later], isack[later])]
+        return
+
+    '''
+    Match the last datagrams, after all the records have been fed
+    '''
+    def finish(self) :
+        if self.last != None : self.match(self.last-self.acktimeout, True)
+        return
+
+'''
+Check a trace file
+@return the finished Analyzer
+'''
+def analyze(filename, wait=WAIT, acktimeout=3.0, limit=100) :
+    import tracequery
+    analyzer = Analyzer(wait, acktimeout, limit)
+    q = tracequery.TraceQuery(filename, index=False)
+    base = 0
+    for records in q.chunks() :
+        analyzer.feed(records, base)
+        base = base+len(records)
+    q.close()
+    analyzer.finish()
+    return analyzer
+
+def report(analyzer) :
+    print "%d frames, %.1f sec" % (analyzer.frames, (analyzer.last or 0)-(analyzer.first or 0))
+    for when, record, alias, check, text in sorted(analyzer.findings) :
+        print "%12.6f %9d  %03X  %-9s  %s" % (when, record, alias, check, text)
+    for check in checks :
+        shown = min(analyzer.counts[check], analyzer.limit)
+        print "  %-9s %10d%s" % (check, analyzer.counts[check],
+            "" if shown == analyzer.counts[check] else " (%d shown)" % shown)
+    return
+
+def usage() :
+    print ""
+    print "Called standalone, checks the protocol conformance of a trace file."
+    print ""
+    print "valid usages (default values):"
+    print "  python conformance.py bus.trc"
+    print "  python conformance.py -w 0.2 -t 3 -n 100 bus.trc"
+    print ""
+    print "-w --wait minimum seconds from the last CID to RID (default 0.2)"
+    print "-t --timeout seconds for a datagram to be acknowledged (default 3)"
+    print "-n --limit how many findings of each kind to list (default 100)"
+
+import getopt, sys, time
+
+def main():
+    wait = WAIT
+    acktimeout = 3.0
+    limit = 100
+    try:
+        opts, remainder = getopt.getopt(sys.argv[1:], "w:t:n:", ["wait=", "timeout=", "limit="])
+    except getopt.GetoptError, err:
+        # print help information and exit:
+        print str(err) # will print something like "option -a not recognized"
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-w", "--wait"):
+            wait = float(arg)
+        elif opt in ("-t", "--timeout"):
+            acktimeout = float(arg)
+        elif opt in ("-n", "--limit"):
+            limit = int(arg)
+        else:
+            assert False, "unhandled option"
+    if len(remainder) != 1 :
+        usage()
+        sys.exit(2)
+
+    start = time.time()
+    analyzer = analyze(remainder[0], wait, acktimeout, limit)
+    elapsed = time.time()-start
+    report(analyzer)
+    print "(%.2f sec, %.0f frames/sec)" % (elapsed, analyzer.frames/max(elapsed, 1e-6))
+
+if __name__ == '__main__':
+    main()
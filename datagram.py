@@ -2,11 +2,26 @@
 '''
 Send and receive single datagrams
 
+sendOneDatagram() waits for each datagram to be acknowledged before
+anything else goes out.  An Engine instead keeps datagrams to many
+destinations in flight at once, one per (source, dest) pair as the
+protocol requires, so sending to many nodes isn't limited to one
+round trip at a time:
+
+    engine = datagram.Engine(connection.thisNodeAlias, connection.network)
+    for dest in aliases : engine.send(dest, [0x20, 0x80])
+    engine.run()
+
+Datagrams received are put back together by a Reassembler, which
+keeps the frames of each (source, dest) pair apart, so replies from
+many nodes can arrive at once.
+
 @author: Bob Jacobsen
 '''
 
 import connection as connection
 import canolcbutils
+import linkreader
 
 def makeonlyframe(alias, dest, content) :
     return canolcbutils.makeframestring(0x1A000000+alias+(dest<<12),content)
@@ -30,6 +45,9 @@ def isNakReply(frame) :
 def isOkReply(frame) :
     return frame.startswith(":X19A28")
 
+# only, first, middle and final datagram frames
+datagramframes = (":X1A", ":X1B", ":X1C", ":X1D")
+
 def sendOneDatagram(alias, dest, content, connection, verbose) :
     if len(content) > 8 :
         first = True
@@ -64,20 +82,22 @@ def sendOneDatagram(alias, dest, content, connection, verbose) :
     return 0
 
 def receiveOneDatagram(alias, dest, conection, verbose) :
-    retval = []
+    # frames of other datagrams, and other traffic, are skipped
+    datagrams = Reassembler()
     while True :
         reply = connection.network.receive()
         if (reply == None ) : 
             print "No datagram segment received"
             return 4
-        elif reply.startswith(":X1B") or reply.startswith(":X1C") :
-            retval = retval + canolcbutils.bodyArray(reply)
-            continue
-        elif reply.startswith(":X1A") or reply.startswith(":X1D") :
-            retval = retval + canolcbutils.bodyArray(reply)
-            connection.network.send(makereply(alias, dest))
-            return retval
-        else :
+        if datagrams.add(reply, connection.network.clock.time()) :
+            retval = datagrams.take(dest, alias)
+            if retval == 5 :
+                print "Datagram longer than", LIMIT, "bytes"
+                return 5
+            if retval != None :
+                connection.network.send(makereply(alias, dest))
+                return retval
+        elif isAddressed(reply, dest, alias) :
             print "Unexpected message instead of datagram segment", reply
             return 3
 
@@ -102,32 +122,361 @@ def sendOneDatagramNoWait(alias, dest, content, connection, verbose) :
 def receiveDatagramReplyAndOneDatagram(alias, dest, conection, verbose) :
     # use after SendOneDatagramNoWait to get both the reply datagram and 
     # the response to the sent datagram, in either order.
-    retval = []
+    # frames of other datagrams, and other traffic, are skipped
+    datagrams = Reassembler()
+    retval = None
     haveReply = False
-    haveDatagram = False
     while True :
         reply = connection.network.receive()
         if (reply == None ) : 
             print "Missing response"
             return 4
-        elif isOkReply(reply) : 
+        if isOkReply(reply) and isAddressed(reply, dest, alias) :
             haveReply = True
-            if haveDatagram : 
-                return retval
-        elif reply.startswith(":X1B") or reply.startswith(":X1C") :
-            retval = retval + canolcbutils.bodyArray(reply)
-            continue
-        elif reply.startswith(":X1A") or reply.startswith(":X1D") :
-            retval = retval + canolcbutils.bodyArray(reply)
-            connection.network.send(makereply(alias, dest))
-            haveDatagram = True
-            if haveReply :
-                return retval
-        else :
+        elif datagrams.add(reply, connection.network.clock.time()) :
+            retval = datagrams.take(dest, alias)
+            if retval == 5 :
+                print "Datagram longer than", LIMIT, "bytes"
+                return 5
+            if retval != None :
+                connection.network.send(makereply(alias, dest))
+        elif isAddressed(frame, dest, alias) :
             print "Unexpected message", reply
             return 3
+        if haveReply and retval != None :
+            return retval
+
+# most bytes in a datagram
+LIMIT = 72
+
+'''
+@return True if frame is an addressed message from source to dest
+'''
+def isAddressed(frame, source, dest) :
+    if frame == None or not frame.startswith(":X19") or len(frame) < 16 : return False
+    if (int(frame[6],16) & 0x8) == 0 or int(frame[7:10],16) != source : return False
+    return (int(frame[11:15],16) & 0xFFF) == dest
+
+'''
+Puts datagrams back together from their frames
+
+Frames are kept by (source, dest) alias pair, so the frames of
+datagrams from many senders can interleave with each other and with
+other traffic.  Each complete datagram goes to the done function,
+or if there's none, is kept for take().  Problems go to the error
+function, or are kept for take():
+
+    "long"      more than LIMIT bytes
+    "order"     middle and final frames without a first one
+
+Both of those are reported once, at the datagram's final frame, and
+the frames up to it are dropped.  The others are reported as found:
+
+    "restart"   a first frame while a datagram was already in progress
+    "timeout"   no frame of a datagram in progress for the timeout
+'''
+class Reassembler :
+    '''
+    @param done function(source, dest, content) for each complete datagram, or None
+    @param error function(source, dest, reason), or None
+    @param timeout seconds between frames after which a partial datagram is dropped
+    '''
+    def __init__(self, done=None, error=None, timeout=3.0) :
+        self.done = done
+        self.error = error
+        self.timeout = timeout
+        self.partial = {}     # (source, dest) -> [content, time of last frame]
+        self.dropped = {}     # (source, dest) -> [reason, time of last frame] of datagrams dropped until their final frame
+        self.completed = {}   # (source, dest) -> list of contents not taken yet
+        self.errors = {}      # (source, dest) -> list of reasons not taken yet
+        return
+
+    def complete(self, key, content) :
+        if self.done != None :
+            self.done(key[0], key[1], content)
+        else :
+            self.completed.setdefault(key, []).append(content)
+        return
+
+    def fail(self, key, reason) :
+        if self.error != None :
+            self.error(key[0], key[1], reason)
+        else :
+            self.errors.setdefault(key, []).append(reason)
+        return
+
+    '''
+    Add one received frame
+    @param frame GridConnect frame string
+    @param now time it was received, for timing out partial datagrams
+    @return True if it was a datagram frame
+    '''
+    def add(self, frame, now=0.0) :
+        if frame == None or not frame.startswith(datagramframes) : return False
+        kind = int(frame[3],16)-8
+        key = (int(frame[7:10],16), int(frame[4:7],16))
+        body = canolcbutils.bodyArray(frame)
+        if kind == 2 or kind == 3 :
+            if key in self.partial :
+                del self.partial[key]
+                self.fail(key, "restart")
+            if key in self.dropped : del self.dropped[key]
+            if kind == 2 :
+                self.complete(key, body)
+            else :
+                self.partial[key] = [body, now]
+            return True
+        partial = self.partial.get(key)
+        if partial == None :
+            self.drop(key, kind, self.dropped.get(key, ["order"])[0], now)
+            return True
+        partial[0] = partial[0]+body
+        partial[1] = now
+        if len(partial[0]) > LIMIT :
+            del self.partial[key]
+            self.drop(key, kind, "long", now)
+        elif kind == 5 :
+            del self.partial[key]
+            self.complete(key, partial[0])
+        return True
+
+    # drop the frames of a datagram up to its final one, then report why
+    def drop(self, key, kind, reason, now) :
+        if kind == 5 :
+            if key in self.dropped : del self.dropped[key]
+            self.fail(key, reason)
+        else :
+            self.dropped[key] = [reason, now]
+        return
+
+    '''
+    Drop partial datagrams that have had no frame for the timeout
+    '''
+    def expire(self, now) :
+        for key, partial in self.partial.items() :
+            if now-partial[1] >= self.timeout :
+                del self.partial[key]
+                self.fail(key, "timeout")
+        for key, dropped in self.dropped.items() :
+            if now-dropped[1] >= self.timeout :
+                del self.dropped[key]   # its final frame isn't coming
+        return
+
+    '''
+    @return the oldest complete datagram kept from source to dest,
+    5 if one was too long, or None if there's neither
+    '''
+    def take(self, source, dest) :
+        key = (source, dest)
+        if "long" in self.errors.get(key, []) :
+            self.errors[key].remove("long")
+            return 5
+        contents = self.completed.get(key)
+        if not contents : return None
+        return contents.pop(0)
+
+# Datagram Rejected error codes, by their top bits
+PERMANENT = 0x1000
+TEMPORARY = 0x2000
+
+# Datagram Rejected error codes sent by an Engine
+INVALID_ARGUMENTS = 0x1080
+OUT_OF_ORDER = 0x2040
+
+'''
+One datagram sent by an Engine, and what became of it
+'''
+class Transfer :
+    def __init__(self, source, dest, content, done) :
+        self.source = source
+        self.dest = dest
+        self.content = content
+        self.done = done           # function(transfer) called when finished, or None
+        self.tries = 0
+        self.sent = None           # time last sent
+        self.after = 0.0           # time before which not to send again
+        self.status = None         # "ok", "rejected", "failed" or "timeout" when finished
+        self.code = None           # error code of the last Datagram Rejected
+        self.replypending = False  # Datagram Received OK said a reply will follow
+        return
+
+'''
+Sends datagrams, many at once
+'''
+class Engine :
+    '''
+    @param alias default source alias
+    @param network link to use
+    @param window most datagrams in flight at once
+    @param timeout seconds to wait for Datagram Received OK or Rejected
+    @param retries how many times to resend after a temporary error or timeout
+    @param backoff seconds before the first resend; doubled for each one after
+    @param received function(source, dest, content) for each datagram received, or None
+    '''
+    def __init__(self, alias, network, window=16, timeout=3.0, retries=3, backoff=0.05, received=None) :
+        self.alias = alias
+        self.network = network
+        self.window = window
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.queue = []       # Transfers not sent yet, in order
+        self.inflight = {}    # (source, dest) -> Transfer
+        self.finished = []    # Transfers done, in order
+        self.frames = 0       # frames sent
+        self.sources = set([alias])   # aliases datagrams are received for
+        self.received = received
+        self.datagrams = Reassembler(self.deliver, self.refuse, timeout)
+        return
+
+    # acknowledge a datagram received, then hand it on
+    def deliver(self, source, dest, content) :
+        self.network.send(makereply(dest, source))
+        if self.received != None : self.received(source, dest, content)
+        return
+
+    # reject a datagram that couldn't be put back together
+    def refuse(self, source, dest, reason) :
+        if reason == "order" :
+            code = OUT_OF_ORDER      # ask the sender to start over
+        elif reason == "long" :
+            code = INVALID_ARGUMENTS
+        else :
+            return
+        self.network.send(canolcbutils.makeframestring(0x19A48000+dest,
+            [(source>>8)&0xFF, source&0xFF, (code>>8)&0xFF, code&0xFF]))
+        return
+
+    '''
+    Queue a datagram; datagrams to the same dest go in order
+    @param done function(transfer) to call when it's acknowledged or given up on
+    @return the Transfer
+    '''
+    def send(self, dest, content, done=None, source=None) :
+        if source == None : source = self.alias
+        transfer = Transfer(source, dest, list(content), done)
+        self.sources.add(source)
+        self.queue.append(transfer)
+        return transfer
+
+    def transmit(self, transfer) :
+        source, dest, content = transfer.source, transfer.dest, transfer.content
+        if len(content) <= 8 :
+            frames = [makeonlyframe(source, dest, content)]
+        else :
+            frames = [makefirstframe(source, dest, content[0:8])]
+            for i in range(8, len(content)-8, 8) :
+                frames.append(makemiddleframe(source, dest, content[i:i+8]))
+            frames.append(makefinalframe(source, dest, content[(len(content)-1)/8*8:]))
+        for frame in frames : self.network.send(frame)
+        self.frames = self.frames+len(frames)
+        transfer.tries = transfer.tries+1
+        transfer.sent = self.network.clock.time()
+        return
+
+    def finish(self, transfer, status) :
+        del self.inflight[(transfer.source, transfer.dest)]
+        transfer.status = status
+        self.finished.append(transfer)
+        if transfer.done != None : transfer.done(transfer)
+        return
+
+    # resend later, or give up
+    def retry(self, transfer, status) :
+        if transfer.tries > self.retries :
+            self.finish(transfer, status)
+            return
+        transfer.after = self.network.clock.time()+self.backoff*(2**(transfer.tries-1))
+        transfer.sent = None
+        return
+
+    '''
+    Handle one received frame
+    @return True if it was an acknowledgement for a datagram in flight,
+    or a frame of a datagram to one of our aliases
+    '''
+    def handle(self, reply) :
+        if reply == None : return False
+        if reply.startswith(datagramframes) :
+            if int(reply[4:7],16) not in self.sources : return False
+            return self.datagrams.add(reply, self.network.clock.time())
+        if not (isOkReply(reply) or isNakReply(reply)) : return False
+        data = canolcbutils.bodyArray(reply)
+        if len(data) < 2 : return False
+        transfer = self.inflight.get((((data[0] & 0x0F) << 8) | data[1], int(reply[7:10],16)))
+        if transfer == None : return False
+        # an answer to an earlier try counts too, even while a resend waits
+        if isOkReply(reply) :
+            transfer.replypending = len(data) > 2 and (data[2] & 0x80) != 0
+            self.finish(transfer, "ok")
+            return True
+        transfer.code = (data[2] << 8) | data[3] if len(data) >= 4 else 0
+        if (transfer.code & TEMPORARY) != 0 :
+            if transfer.sent != None : self.retry(transfer, "failed")
+        else :
+            self.finish(transfer, "rejected")
+        return True
+
+    '''
+    Send what can be sent, resend what's due, time out what's overdue
+    '''
+    def service(self) :
+        now = self.network.clock.time()
+        for transfer in self.inflight.values() :
+            if transfer.sent == None :
+                if now >= transfer.after : self.transmit(transfer)
+            elif now-transfer.sent >= self.timeout :
+                self.retry(transfer, "timeout")
+        i = 0
+        while i < len(self.queue) and len(self.inflight) < self.window :
+            transfer = self.queue[i]
+            key = (transfer.source, transfer.dest)
+            if key in self.inflight :
+                i = i+1
+                continue
+            del self.queue[i]
+            self.inflight[key] = transfer
+            self.transmit(transfer)
+        return
+
+    def busy(self) :
+        return len(self.queue) > 0 or len(self.inflight) > 0
+
+    '''
+    Do what's due, then handle at most one received frame
+    @param other function(frame) for received frames the engine doesn't use, or None
+    '''
+    def step(self, other=None) :
+        self.service()
+        reply = self.network.receive()
+        if reply != None and not self.handle(reply) and other != None : other(reply)
+        self.datagrams.expire(self.network.clock.time())
+        return
+
+    '''
+    Send everything queued, waiting for the acknowledgements
+    @param other function(frame) for received frames the engine doesn't use, or None
+    @param until function() that's True once done waiting, or None to wait
+    only for the acknowledgements
+    @return list of the Transfers finished, in order
+    '''
+    def run(self, other=None, until=None) :
+        saved = linkreader.hold(self.network, min(self.network.timeout, self.backoff/2))
+        idle = self.network.clock.time()
+        try :
+            while self.busy() or (until != None and not until()) :
+                now = self.network.clock.time()
+                if self.busy() or len(self.datagrams.partial) > 0 :
+                    idle = now
+                elif now-idle > self.timeout :
+                    break   # nothing more is coming
+                self.step(other)
+        finally :
+            linkreader.release(self.network, saved)
+        finished = self.finished
+        self.finished = []
+        return finished
 
-    
 def usage() :
     print ""
     print "Called standalone, will send one CAN datagram message"
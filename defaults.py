@@ -3,28 +3,36 @@ tcp      = True
 ethernet = False
 windows  = False
 local    = False
+virtual  = False   # in-process simulated node, see simulatednode.py
+replay   = None    # trace file to play back, see replayolcblink.py
 
+threaded = False   # read the link in a background thread
+broker   = False   # share the link through linkbroker.py
+aliases  = False   # learn node aliases from the traffic for getUnderTestAlias -n, see aliascache.py
+aliasfile = None   # file to keep the learned aliases in between runs
+cdidir   = None    # directory to keep the CDIs read in between runs, see cdicache.py
 
-if tcp and not local:
+
+if tcp and not local and not virtual :
     import tcpolcblink
     network = tcpolcblink.TcpToOlcbLink()
     network.host = "174.18.137.234"
     network.host = "localhost"
     #network.host = "propername.local."
     network.port = 12021
-elif ethernet and not local:
+elif ethernet and not local and not virtual :
     import ethernetolcblink
     network = ethernetolcblink.EthernetToOlcbLink()
     network.host = "174.18.137.234"
     #network.host = "propername.local."
     network.port = 12021
-elif windows and not local :
+elif windows and not local and not virtual :
     import serialolcblink
     network = serialolcblink.SerialOlcbLink()
     network.port = "COM9"
     network.speed = 500000
     network.startdelay = 0
-elif serial and not local :
+elif serial and not local and not virtual :
     import serialolcblink
     network = serialolcblink.SerialOlcbLink()
     #network.port = "/dev/cu.usbserial-A900fLVC"
@@ -34,6 +42,13 @@ elif serial and not local :
     network.speed = 230400
     network.parallel = True
     network.startdelay = 2
+elif virtual :
+    import virtualolcblink
+    network = virtualolcblink.VirtualOlcbLink()
+elif replay :
+    import replayolcblink
+    network = replayolcblink.ReplayOlcbLink(replay)
+    network.speed = 1.0   # 0 for as fast as possible
 elif local :
     import pipeolcblink
     network = pipeolcblink.PipeOlcbLink()
@@ -41,11 +56,37 @@ elif local :
 else :
     print "Please set one of the options to True"
 
+if threaded :
+    network.threaded = True
+
 
 thisNodeID = [1,2,3,4,5,6]
 thisNodeAlias = 0xAAA
 testNodeID = [2,3,4,5,6,1]
 testNodeAlias = 0xDDD
 
+if virtual :
+    import simulatednode
+    network.bus.attach(simulatednode.SimulatedNode(testNodeID, testNodeAlias))
+
+if broker :
+    # scripts talk to the broker, which opens the link configured above
+    import brokerolcblink
+    network = brokerolcblink.BrokerOlcbLink(network)
+
+if aliases :
+    import aliascache
+    aliascache.cache.watch(network)
+    if aliasfile != None :
+        import atexit
+        aliascache.cache.load(aliasfile)
+        atexit.register(aliascache.cache.save, aliasfile)
+
+if cdidir != None :
+    import atexit
+    import cdicache
+    cdicache.cache.load(cdidir)
+    atexit.register(cdicache.cache.save)
+
 
 testEventID = [0x05, 0x02, 0x01, 0x02, 0x02, 0x00, 0x00, 0x00]
@@ -10,6 +10,10 @@ argparse is new in Jython 2.7, so dont use here
 import socket
 import time
 
+import linkreader
+import linkclock
+import quiescence
+
 class EthernetToOlcbLink :
     def __init__(self) :
         # prepare, but don't open
@@ -24,6 +28,11 @@ class EthernetToOlcbLink :
         self.startdelay = 0
         self.socket = None
         self.rcvData = ""
+        self.threaded = False  # if True, read in a background thread
+        self.queuesize = 10000 # frames held when threaded
+        self.reader = None
+        self.clock = linkclock.realclock
+        self.quiescence = quiescence.Quiescence() # round trips to the node
         return
     
     def connect(self) :
@@ -32,12 +41,14 @@ class EthernetToOlcbLink :
         
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.connect((self.host, self.port))
+        # not set by the reader thread; receive() updates it when unthreaded
+        self.socket.settimeout(self.timeout)
         
         # wait for link startup
         # after (possible) reset due to serial startup
         if self.startdelay > 0 :
             if self.verbose : print "   waiting", self.startdelay, "seconds for adapter restart"
-            time.sleep(self.startdelay)
+            self.clock.sleep(self.startdelay)
 
         return
         
@@ -49,28 +60,62 @@ class EthernetToOlcbLink :
     
         # send
         self.socket.send(frame+'\n')
+        self.quiescence.sent(self.clock.time(), frame)
         
         return
         
     def receive(self) : # returns frame
+        if (self.reader != None and not self.reader.follow(self.threaded)) : self.reader = None
+        if (self.threaded or self.reader != None) :
+            if (self.reader == None) : self.startreader()
+            r = self.reader.receive(self.timeout, self.verbose)
+            if (r == None) :
+                self.quiescence.expired()
+            else :
+                self.quiescence.received(self.reader.lasttime, r)
+            return r
+
         if (self.socket == None) : self.connect()
         
         # if verbose, print
         if (self.verbose) : print "   receive ",
             
         self.socket.settimeout(self.timeout)
+        try:
+            r = self.readframe()
+        except EOFError, err:
+            r = None
+        if (r == None) :
+            self.quiescence.expired()
+            if (self.verbose) : print "<none>" # blank line to show delay?
+            return None
+        self.quiescence.received(self.clock.time(), r)
+        if (self.verbose) : print r
+        return r
+
+    def readframe(self) : # returns frame without printing, None on timeout
         while (self.rcvData.find('\n') < 0) :
             try:
-                self.rcvData = self.rcvData+self.socket.recv(1024)
+                data = self.socket.recv(1024)
             except socket.timeout, err:
-                if (self.verbose) : print "<none>" # blank line to show delay?
                 return None
+            if (len(data) == 0) :
+                raise EOFError("connection closed")
+            self.rcvData = self.rcvData+data
         r = self.rcvData[0:self.rcvData.find('\n')]
         self.rcvData = self.rcvData[self.rcvData.find('\n')+1:]
-        if (self.verbose) : print r
         return r
 
+    def startreader(self) : # start a thread to continuously read into a queue
+        if (self.socket == None) : self.connect()
+        self.reader = linkreader.LinkReader(self.readframe, self.queuesize)
+        self.reader.start()
+        return
+
     def close(self) :
+        if (self.reader != None) :
+            self.reader.stop()
+            self.reader = None
         return
 
 
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+'''
+Index of the events produced and consumed across the network
+
+One global Identify Events sweep gets every node to reply with
+the events it produces and consumes, and the ranges of them.  An
+EventIndex keeps the event IDs as 64-bit integers in sorted lists,
+with the aliases of their producers and consumers, and the ranges in
+interval trees (see eventrange.py), so that
+
+    index.producers(event)    aliases producing an event
+    index.consumers(event)    aliases consuming an event
+    index.unconsumed()        events produced but not consumed
+
+are binary searches or tree lookups.
+
+    index = eventindex.sweep(connection.thisNodeAlias, connection.network)
+
+'''
+
+import bisect
+import struct
+
+import connection as connection
+import canolcbutils
+import linkreader
+import eventrange
+import identifyEventsGlobal
+
+PRODUCER = 0
+CONSUMER = 1
+
+# MTIs of the replies: (kind, is a range)
+replies = {
+    0x544 : (PRODUCER, False), 0x545 : (PRODUCER, False), 0x547 : (PRODUCER, False),
+    0x524 : (PRODUCER, True),
+    0x4C4 : (CONSUMER, False), 0x4C5 : (CONSUMER, False), 0x4C7 : (CONSUMER, False),
+    0x4A4 : (CONSUMER, True),
+}
+
+EVENT = struct.Struct(">Q")
+
+def eventid(data) :
+    return EVENT.unpack(str(data))[0]
+
+'''
+Events of one kind, producer or consumer
+'''
+class Events :
+    def __init__(self) :
+        self.found = {}       # event -> set of aliases, as collected
+        self.ranges = []      # (first, last, alias), as collected
+        self.build()
+        return
+
+    def build(self) :
+        self.keys = sorted(self.found.keys())
+        self.owners = [tuple(sorted(self.found[k])) for k in self.keys]
+        self.tree = eventrange.IntervalTree(self.ranges)
+        return
+
+    def aliases(self, event) :
+        result = set()
+        i = bisect.bisect_left(self.keys, event)
+        if i < len(self.keys) and self.keys[i] == event : result.update(self.owners[i])
+        result.update(self.tree.stab(event))
+        return sorted(result)
+
+    def has(self, event) :
+        i = bisect.bisect_left(self.keys, event)
+        if i < len(self.keys) and self.keys[i] == event : return True
+        return self.tree.covers(event)
+
+class EventIndex :
+    def __init__(self) :
+        self.kinds = [Events(), Events()]
+        self.nodes = set()
+        return
+
+    def add(self, alias, kind, event) :
+        self.kinds[kind].found.setdefault(event, set()).add(alias)
+        self.nodes.add(alias)
+        return
+
+    def addrange(self, alias, kind, first, last) :
+        self.kinds[kind].ranges.append((first, last, alias))
+        self.nodes.add(alias)
+        return
+
+    '''
+    Add one Identified reply frame
+    @param frame GridConnect frame string
+    @return True if it was one
+    '''
+    def addframe(self, frame) :
+        if not frame.startswith(":X19") : return False
+        reply = replies.get(int(frame[4:7],16))
+        if reply == None : return False
+        data = bytearray(canolcbutils.bodyArray(frame))
+        if len(data) != 8 : return False
+        kind, isrange = reply
+        alias = int(frame[7:10],16)
+        event = eventid(data)
+        if isrange :
+            first, last = eventrange.decode(event)
+            self.addrange(alias, kind, first, last)
+        else :
+            self.add(alias, kind, event)
+        return True
+
+    '''
+    Sort what has been added, ready for lookups
+    '''
+    def build(self) :
+        for events in self.kinds : events.build()
+        self.orphans = [e for e in self.kinds[PRODUCER].keys if not self.kinds[CONSUMER].has(e)]
+        return
+
+    def producers(self, event) :
+        return self.kinds[PRODUCER].aliases(event)
+
+    def consumers(self, event) :
+        return self.kinds[CONSUMER].aliases(event)
+
+    # events produced, not in a range, that nothing consumes
+    def unconsumed(self) :
+        return self.orphans
+
+    def isconsumed(self, event) :
+        return self.kinds[CONSUMER].has(event)
+
+    def report(self) :
+        producers, consumers = self.kinds
+        print len(self.nodes), "nodes,", len(producers.keys), "produced and", len(consumers.keys), \
+            "consumed events,", len(producers.ranges), "producer and", len(consumers.ranges), "consumer ranges"
+        print len(self.orphans), "events produced but not consumed"
+        return
+
+'''
+Build an index from one global Identify Events
+@param alias alias of self
+@param network link to use
+@param quiet seconds without a reply that end the sweep
+@return EventIndex
+'''
+def sweep(alias, network, verbose=False, quiet=0.5) :
+    saved = linkreader.hold(network, quiet)
+    index = EventIndex()
+    try :
+        network.send(identifyEventsGlobal.makeframe(alias))
+        while (True) :
+            reply = network.receive()
+            if reply == None : break
+            if index.addframe(reply) and verbose : print "  ", canolcbutils.decode(reply)
+    finally :
+        linkreader.release(network, saved)
+    index.build()
+    return index
+
+'''
+Time building an index of events from nodes, each producing and
+consuming some, and looking each of them up
+@return (build seconds, seconds per lookup)
+'''
+def benchmark(events=100000, nodes=1000) :
+    import random, time
+    found = [(random.randint(1, nodes), random.randint(0, 1), 0x0501010100000000+random.randint(0, 4*events))
+                for i in range(events)]
+    ranges = []
+    for i in range(nodes/10) :
+        first = 0x0501010100000000+(random.randint(0, 4*events) & ~0xFF)
+        ranges.append((random.randint(1, nodes), CONSUMER, first, first+0xFF))
+    index = EventIndex()
+    start = time.time()
+    for alias, kind, event in found : index.add(alias, kind, event)
+    for alias, kind, first, last in ranges : index.addrange(alias, kind, first, last)
+    index.build()
+    built = time.time()-start
+    probes = index.kinds[PRODUCER].keys
+    start = time.time()
+    for event in probes :
+        index.producers(event)
+        index.consumers(event)
+    return built, (time.time()-start)/(2*max(len(probes), 1))
+
+def usage() :
+    print ""
+    print "Called standalone, sends one CAN IdentifyEvents (global) message,"
+    print "indexes the replies and lists the events nothing consumes"
+    print ""
+    print "Default connection detail taken from connection.py"
+    print ""
+    print "-a --alias source alias (default 0x%03X)" % connection.thisNodeAlias
+    print "-q --quiet seconds without a reply that end the sweep (default 0.5)"
+    print "-b --benchmark time building and searching an index of this many events"
+    print "-v verbose"
+
+import getopt, sys
+
+def main():
+    alias = connection.thisNodeAlias
+    quiet = 0.5
+    verbose = False
+    bench = None
+    try:
+        opts, remainder = getopt.getopt(sys.argv[1:], "a:q:b:vV", ["alias=", "quiet=", "benchmark="])
+    except getopt.GetoptError, err:
+        # print help information and exit:
+        print str(err) # will print something like "option -a not recognized"
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == "-v":
+            verbose = True
+        elif opt == "-V":
+            connection.network.verbose = True
+            verbose = True
+        elif opt in ("-a", "--alias"):
+            alias = int(arg, 0)
+        elif opt in ("-q", "--quiet"):
+            quiet = float(arg)
+        elif opt in ("-b", "--benchmark"):
+            bench = int(arg)
+        else:
+            assert False, "unhandled option"
+
+    if bench != None :
+        built, lookup = benchmark(bench)
+        print "%d events indexed in %.3f sec, %.1f usec per lookup" % (bench, built, 1e6*lookup)
+        return
+    index = sweep(alias, connection.network, verbose, quiet)
+    index.report()
+    for event in index.unconsumed() :
+        print "  %016X produced by" % event, ", ".join(["%03X" % a for a in index.producers(event)])
+    connection.network.close()
+
+if __name__ == '__main__':
+    main()
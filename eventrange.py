@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+'''
+Event ID ranges, as in the Producer/Consumer Range Identified messages
+
+A range is sent as one event ID whose low bits, all ones or all
+zeros, are the mask: 05.01.01.01.00.00.03.3F stands for the 64
+events from 05.01.01.01.00.00.03.00 through 05.01.01.01.00.00.03.3F.
+decode() turns that into a (first, last) interval, merge() combines
+overlapping intervals, and an IntervalTree finds every interval
+containing an event ID without looking at the others:
+
+    tree = eventrange.IntervalTree([(first, last, alias), ...])
+    tree.stab(event)      aliases with a range containing the event
+    tree.covers(event)    True if any range contains it
+
+'''
+
+'''
+@param event range event ID as an int, or a list of 8 bytes
+@return (first, last) event IDs of the range
+'''
+def decode(event) :
+    if isinstance(event, list) : event = eventint(event)
+    low = event & 1
+    n = 0
+    while n < 64 and (event >> n) & 1 == low :
+        n = n+1
+    mask = (1 << n)-1
+    return (event & ~mask, event | mask)
+
+def eventint(data) :
+    value = 0
+    for b in data : value = (value << 8) | b
+    return value
+
+'''
+Combine overlapping and adjacent intervals
+@param intervals (first, last) pairs, in any order
+@return sorted list of (first, last) that don't overlap
+'''
+def merge(intervals) :
+    result = []
+    for first, last in sorted(intervals) :
+        if len(result) > 0 and first <= result[-1][1]+1 :
+            if last > result[-1][1] : result[-1] = (result[-1][0], last)
+        else :
+            result.append((first, last))
+    return result
+
+'''
+A static centered interval tree.  Each node holds the intervals
+containing its center, sorted by first and by last, and subtrees of
+the intervals wholly below and above it, so a lookup visits one node
+per level and only the intervals that match.
+'''
+class IntervalTree :
+    '''
+    @param intervals (first, last, value) triples
+    '''
+    def __init__(self, intervals) :
+        self.count = len(intervals)
+        self.root = self.build(list(intervals))
+        return
+
+    def build(self, intervals) :
+        if len(intervals) == 0 : return None
+        ends = sorted([first for first, last, value in intervals]+[last for first, last, value in intervals])
+        center = ends[len(ends)/2]
+        below = []
+        above = []
+        here = []
+        for interval in intervals :
+            if interval[1] < center :
+                below.append(interval)
+            elif interval[0] > center :
+                above.append(interval)
+            else :
+                here.append(interval)
+        byfirst = sorted(here)
+        bylast = sorted(here, key=lambda interval : -interval[1])
+        return (center, byfirst, bylast, self.build(below), self.build(above))
+
+    def __len__(self) :
+        return self.count
+
+    '''
+    @return values of the intervals containing point
+    '''
+    def stab(self, point) :
+        result = []
+        node = self.root
+        while node != None :
+            center, byfirst, bylast, below, above = node
+            if point < center :
+                for first, last, value in byfirst :
+                    if first > point : break
+                    result.append(value)
+                node = below
+            else :
+                for first, last, value in bylast :
+                    if last < point : break
+                    result.append(value)
+                node = above if point > center else None
+        return result
+
+    '''
+    @return True if any interval contains point
+    '''
+    def covers(self, point) :
+        node = self.root
+        while node != None :
+            center, byfirst, bylast, below, above = node
+            if point < center :
+                if len(byfirst) > 0 and byfirst[0][0] <= point : return True
+                node = below
+            else :
+                if len(bylast) > 0 and bylast[0][1] >= point : return True
+                node = above if point > center else None
+        return False
+
+def main():
+    first, last = decode([5,1,1,1,0,0,3,0x3F])
+    print "%016X - %016X" % (first, last)
+    print ["%X-%X" % i for i in merge([(0x10, 0x1F), (0x18, 0x2F), (0x30, 0x3F), (0x50, 0x5F)])]
+    tree = IntervalTree([(0x10, 0x1F, "a"), (0x18, 0x2F, "b"), (0x50, 0x5F, "c")])
+    print tree.stab(0x1A), tree.stab(0x40), tree.covers(0x55)
+
+if __name__ == '__main__':
+    main()
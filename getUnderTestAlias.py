@@ -1,13 +1,16 @@
 #!/usr/bin/env python
 '''
 Assuming one under-test node present, get its alias
+(see census.py to find every node on the network)
 
 @author: Bob Jacobsen
 '''
 
 import connection as connection
 import verifyNodeGlobal
+import verifyNodeAddressed
 import canolcbutils
+import aliascache
 
 '''
 Returns list of alias, nodeID
@@ -15,8 +18,18 @@ Returns list of alias, nodeID
 It obtains these by sending a globally-visible "verify nodes" message,
 so it expects to have only one node on the network so that replies are unique.
 
+If the caller gives the nodeID and its alias has been seen in the
+traffic, see aliascache.py, that alias is checked with one addressed
+"verify node" message instead.
 '''
 def get(alias, nodeID, verbose) :
+    if nodeID != None :
+        cached = aliascache.cache.alias(nodeID)
+        if cached != None and verify(alias, cached, nodeID) :
+            if verbose : print "Cached alias "+str(cached)+" ("+hex(cached)+") for node ID ",list(nodeID)
+            return cached,list(nodeID)
+        if cached != None :
+            aliascache.cache.forget(cached)
     connection.network.send(verifyNodeGlobal.makeframe(alias, nodeID))
     while (True) :
         reply = connection.network.receive()
@@ -25,7 +38,18 @@ def get(alias, nodeID, verbose) :
             alias,nodeID = int(reply[7:10],16),canolcbutils.bodyArray(reply)
             if verbose : print "Found alias "+str(alias)+" ("+hex(alias)+") for node ID ",nodeID
             return alias,nodeID
-            
+
+'''
+@return True if the node at an alias answers an addressed "verify node" with nodeID
+'''
+def verify(alias, dest, nodeID) :
+    connection.network.send(verifyNodeAddressed.makeframe(alias, dest, None))
+    while (True) :
+        reply = connection.network.receive()
+        if (reply == None ) : return False
+        if (reply.startswith(":X19170%03X" % dest)) :
+            return canolcbutils.bodyArray(reply) == list(nodeID)
+
 def usage() :
     print ""
     print " Assumoing one under-test node present, uses "
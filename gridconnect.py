@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+'''
+Buffered parser for GridConnect-format CAN frames
+
+Takes whole chunks of received characters (e.g. the result of
+one socket.recv() call), scans them for complete :...; frames
+in a single pass, and queues the complete frames for later
+retrieval.  Any partial frame at the end of a chunk is kept
+in a reusable bytearray until the rest of it arrives.
+
+Characters outside of a :...; frame (line ends, noise) are dropped.
+As in the original character-by-character parser, a ':' inside a
+frame restarts the frame.
+
+'''
+
+import collections
+
+class GridConnectParser :
+    def __init__(self) :
+        self.partial = bytearray()          # start of a frame not yet complete
+        self.frames = collections.deque()   # complete frames, oldest first
+        return
+
+    '''
+    Scan a chunk of received characters, queuing any complete frames.
+    @param data string of characters as received from the link
+    @return number of frames now waiting
+    '''
+    def feed(self, data) :
+        if len(self.partial) > 0 :
+            # continue the frame we were in the middle of
+            self.partial.extend(data)
+            data = str(self.partial)
+            del self.partial[:]
+        frames = self.frames
+        start = data.find(':')
+        while start >= 0 :
+            end = data.find(';', start)
+            if end < 0 :
+                # incomplete, keep for next time
+                self.partial.extend(buffer(data, start))
+                break
+            # a later ':' restarts the frame
+            restart = data.rfind(':', start, end)
+            frames.append(data[restart:end+1])
+            start = data.find(':', end+1)
+        return len(frames)
+
+    '''
+    @return the oldest complete frame, or None if there are none waiting
+    '''
+    def next(self) :
+        if len(self.frames) == 0 :
+            return None
+        return self.frames.popleft()
+
+    '''
+    @return number of complete frames waiting
+    '''
+    def available(self) :
+        return len(self.frames)
+
+    '''
+    Drop any queued and partial frames
+    '''
+    def reset(self) :
+        del self.partial[:]
+        self.frames.clear()
+        return
+
+'''
+Pull the GridConnect frames out of a text log, such as allTest.log,
+for use as recorded traffic.
+'''
+def framesFromLog(filename) :
+    result = []
+    for line in open(filename) :
+        start = line.find(':X')
+        end = line.find(';', start)
+        if start >= 0 and end > start :
+            result.append(line[start:end+1])
+    return result
+
+'''
+Feed recorded traffic through the parser in recv()-sized chunks.
+Returns (frames, seconds, allocations, bytes) where allocations and
+bytes are per parsed frame.  The parsed frames are kept during a second
+pass so the allocations can be counted by tracemalloc; when that's
+not available, allocations is None and bytes is from sys.getsizeof.
+'''
+def benchmark(frames, count, chunksize) :
+    import time
+    traffic = (frames*(count/len(frames)+1))[:count]
+    text = "\n".join(traffic)+"\n"
+    chunks = [text[i:i+chunksize] for i in range(0, len(text), chunksize)]
+
+    # timing pass
+    parser = GridConnectParser()
+    n = 0
+    start = time.time()
+    for chunk in chunks :
+        parser.feed(chunk)
+        while parser.next() != None :
+            n = n + 1
+    seconds = time.time()-start
+
+    # allocation pass, keeping what's allocated
+    try :
+        import tracemalloc
+    except ImportError :
+        tracemalloc = None
+    parser = GridConnectParser()
+    kept = []
+    if tracemalloc != None :
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+    for chunk in chunks :
+        parser.feed(chunk)
+        frame = parser.next()
+        while frame != None :
+            kept.append(frame)
+            frame = parser.next()
+    if tracemalloc != None :
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        stats = after.compare_to(before, "filename")
+        allocations = float(sum([s.count_diff for s in stats]))/n
+        size = float(sum([s.size_diff for s in stats]))/n
+    else :
+        allocations = None
+        size = float(sum([sys.getsizeof(f) for f in kept]))/n
+    return (n, seconds, allocations, size)
+
+def usage() :
+    print ""
+    print "Called standalone, benchmarks the GridConnect parser"
+    print "by feeding it recorded traffic."
+    print ""
+    print "-f --file log of recorded traffic (default allTest.log)"
+    print "-n --num number of frames to parse (default 100000)"
+    print "-c --chunk size of each received chunk (default 1024)"
+
+import getopt, sys
+
+def main():
+    filename = "allTest.log"
+    count = 100000
+    chunksize = 1024
+
+    try:
+        opts, remainder = getopt.getopt(sys.argv[1:], "f:n:c:", ["file=", "num=", "chunk="])
+    except getopt.GetoptError, err:
+        # print help information and exit:
+        print str(err) # will print something like "option -a not recognized"
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-f", "--file"):
+            filename = arg
+        elif opt in ("-n", "--num"):
+            count = int(arg)
+        elif opt in ("-c", "--chunk"):
+            chunksize = int(arg)
+        else:
+            assert False, "unhandled option"
+
+    frames = framesFromLog(filename)
+    if len(frames) == 0 :
+        print "No frames found in", filename
+        exit(1)
+    n, seconds, allocations, size = benchmark(frames, count, chunksize)
+    print "parsed", n, "frames in", "%.3f" % seconds, "seconds"
+    print "   ", int(n/seconds), "frames per second"
+    if allocations != None :
+        print "   ", "%.2f" % allocations, "allocations per frame"
+        print "   ", "%.1f" % size, "bytes allocated per frame"
+    else :
+        print "    allocations not measured (tracemalloc not available)"
+        print "   ", "%.1f" % size, "bytes per frame string"
+
+if __name__ == '__main__':
+    main()
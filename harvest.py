@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+'''
+Collect the Simple Node Information and supported protocols of many nodes
+
+A Harvester keeps up to window SNIP and PIP requests outstanding at
+once, instead of asking one node at a time and waiting for each reply.
+The frames of the multi-frame SNIP replies are put back together per
+source alias, so replies from several nodes can interleave on the bus.
+A request that gets no reply within the timeout is retried, then
+given up on; a node that rejects a request (Optional Interaction
+Rejected) just doesn't have that information.
+
+    found = census.take(connection.thisNodeAlias, None, connection.network)
+    h = harvest.Harvester(connection.thisNodeAlias, connection.network)
+    h.run([alias for alias, nodeID in found.nodes()])
+    h.report()
+
+'''
+
+import connection as connection
+import canolcbutils
+import linkreader
+import protocolIdentProtocol
+import simpleNodeIdentificationInformation as snip
+
+PIP = "pip"
+SNIP = "snip"
+
+class Harvester :
+    '''
+    @param alias alias of self
+    @param network link to use
+    @param window most requests outstanding at once
+    @param timeout seconds to wait for a reply before retrying
+    @param retries how many times to retry a request
+    '''
+    def __init__(self, alias, network, window=16, timeout=2.0, retries=1) :
+        self.alias = alias
+        self.network = network
+        self.window = window
+        self.timeout = timeout
+        self.retries = retries
+        self.nodes = {}        # alias -> dictionary of what was found
+        self.queue = []        # (dest, kind) not sent yet
+        self.inflight = {}     # (dest, kind) -> [time sent, tries]
+        self.content = {}      # dest -> SNIP reply content so far
+        self.sent = 0
+        self.elapsed = 0.0
+        return
+
+    def send(self, dest, kind) :
+        if kind == PIP :
+            self.network.send(protocolIdentProtocol.makeframe(self.alias, dest))
+        else :
+            self.content[dest] = ""
+            self.network.send(snip.makeframe(self.alias, dest))
+        self.sent = self.sent+1
+        return
+
+    def done(self, dest, kind, status) :
+        del self.inflight[(dest, kind)]
+        self.nodes[dest][kind] = status
+        if kind == SNIP :
+            strings, complete = snip.strings(self.content.pop(dest, ""))
+            self.nodes[dest].update(strings)
+        return
+
+    '''
+    Handle one received frame
+    '''
+    def receive(self, reply) :
+        if not reply.startswith(":X19") : return
+        data = bytearray(canolcbutils.bodyArray(reply))
+        if len(data) < 2 or (((data[0] & 0x0F) << 8) | data[1]) != self.alias : return
+        source = int(reply[7:10],16)
+        mti = int(reply[4:7],16)
+        if mti == 0x668 and (source, PIP) in self.inflight :
+            self.nodes[source]["protocols"] = protocolIdentProtocol.names(data[2:])
+            self.done(source, PIP, "ok")
+        elif mti == 0xA08 and (source, SNIP) in self.inflight :
+            self.content[source] = self.content[source]+str(data[2:])
+            strings, complete = snip.strings(self.content[source])
+            if complete : self.done(source, SNIP, "ok")
+        elif mti == 0x068 and len(data) >= 6 :
+            # Optional Interaction Rejected, with the rejected MTI
+            rejected = ((data[4] << 8) | data[5]) & 0xFFF
+            if rejected == 0x828 and (source, PIP) in self.inflight :
+                self.done(source, PIP, "rejected")
+            elif rejected == 0xDE8 and (source, SNIP) in self.inflight :
+                self.done(source, SNIP, "rejected")
+        return
+
+    '''
+    Ask every node for its protocols and Simple Node Information
+    @param aliases nodes to ask
+    @param kinds what to ask them for, PIP and/or SNIP
+    @return dictionary by alias of dictionaries of what was found
+    '''
+    def run(self, aliases, kinds=(PIP, SNIP)) :
+        for dest in aliases :
+            self.nodes.setdefault(dest, {"protocols" : []})
+            for kind in kinds :
+                self.queue.append((dest, kind))
+        clock = self.network.clock
+        saved = linkreader.hold(self.network, min(self.network.timeout, self.timeout/10))
+        start = clock.time()
+        try :
+            while len(self.queue) > 0 or len(self.inflight) > 0 :
+                while len(self.queue) > 0 and len(self.inflight) < self.window :
+                    dest, kind = self.queue.pop(0)
+                    self.inflight[(dest, kind)] = [clock.time(), 0]
+                    self.send(dest, kind)
+                reply = self.network.receive()
+                if reply != None : self.receive(reply)
+                now = clock.time()
+                for (dest, kind), waiting in self.inflight.items() :
+                    if now-waiting[0] < self.timeout : continue
+                    if kind == SNIP and self.content.get(dest, "").count("\0") >= 4 :
+                        # only the first part, from a node without user strings
+                        self.done(dest, kind, "ok")
+                    elif waiting[1] < self.retries :
+                        waiting[0] = now
+                        waiting[1] = waiting[1]+1
+                        self.send(dest, kind)
+                    else :
+                        self.done(dest, kind, "timeout")
+        finally :
+            linkreader.release(self.network, saved)
+        self.elapsed = clock.time()-start
+        return self.nodes
+
+    def report(self) :
+        print "%-5s %-20s %-20s %-8s %-8s %-20s" % ("alias", "manufacturer", "model", "hardware", "software", "user name")
+        for alias in sorted(self.nodes.keys()) :
+            node = self.nodes[alias]
+            print "%03X   %-20s %-20s %-8s %-8s %-20s" % (alias, node.get("manufacturer", "-"), node.get("model", "-"),
+                node.get("hardwareVersion", "-"), node.get("softwareVersion", "-"), node.get("userName", "-"))
+            if node.get(SNIP) != "ok" or node.get(PIP) != "ok" :
+                print "      SNIP %s, PIP %s" % (node.get(SNIP), node.get(PIP))
+            if len(node["protocols"]) > 0 :
+                print "      "+", ".join(node["protocols"])
+        print len(self.nodes), "nodes,", self.sent, "requests in %.3f sec" % self.elapsed
+        return
+
+def usage() :
+    print ""
+    print "Called standalone, finds every node with one CAN VerifyNode (Global)"
+    print "message, then collects their Simple Node Information and protocols"
+    print ""
+    print "Default connection detail taken from connection.py"
+    print ""
+    print "-a --alias source alias (default 0x%03X)" % connection.thisNodeAlias
+    print "-d --dest only this dest alias; may be repeated"
+    print "-w --window most requests outstanding at once (default 16)"
+    print "-v verbose"
+    print "-V Very verbose"
+
+import getopt, sys
+
+def main():
+    # argument processing
+    alias = connection.thisNodeAlias
+    dests = []
+    window = 16
+    verbose = False
+    try:
+        opts, remainder = getopt.getopt(sys.argv[1:], "a:d:w:vV", ["alias=", "dest=", "window="])
+    except getopt.GetoptError, err:
+        # print help information and exit:
+        print str(err) # will print something like "option -a not recognized"
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == "-v":
+            verbose = True
+        elif opt == "-V":
+            connection.network.verbose = True
+            verbose = True
+        elif opt in ("-a", "--alias"):
+            alias = int(arg, 0)
+        elif opt in ("-d", "--dest"):
+            dests.append(int(arg, 0))
+        elif opt in ("-w", "--window"):
+            window = int(arg)
+        else:
+            assert False, "unhandled option"
+
+    if len(dests) == 0 :
+        import census
+        found = census.take(alias, None, connection.network, verbose)
+        if verbose : found.report()
+        dests = sorted(found.byalias.keys())
+    harvester = Harvester(alias, connection.network, window)
+    harvester.run(dests)
+    harvester.report()
+    connection.network.close()
+
+if __name__ == '__main__':
+    main()
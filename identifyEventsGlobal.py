@@ -8,6 +8,7 @@ Send identifyEvents message
 
 import connection as connection
 import canolcbutils
+import eventrange
 
 def makeframe(alias) :
     return canolcbutils.makeframestring(0x19970000+alias, None)
@@ -85,39 +86,15 @@ def test(alias, dest, connection, verbose) :
         print "  Found", consumerCount,"consumer events"
         print "  Found", producerCount,"producer events"
         for a in consumerRange :
-            i = 4
-            if ((a % 2) == 0) :
-                while (True) :
-                    if ((a % i) != 0) :
-                        break;
-                    i = i * 2
-            else :
-                while (True) :
-                    if ((a % i) == 0) :
-                        break;
-                    i = i * 2
-            mask = (i / 2) - 1
-            base = a & ~mask
+            first, last = eventrange.decode(a)
             print "  Found consumer range", \
-                  '{0:8x}'.format(base), "-", \
-                  '{0:8x}'.format(base + mask)
+                  '{0:8x}'.format(first), "-", \
+                  '{0:8x}'.format(last)
         for a in producerRange :
-            i = 4
-            if ((a % 2) == 0) :
-                while (True) :
-                    if ((a % i) != 0) :
-                        break;
-                    i = i * 2
-            else :
-                while (True) :
-                    if ((a % i) == 0) :
-                        break;
-                    i = i * 2
-            mask = (i / 2) - 1
-            base = a & ~mask
+            first, last = eventrange.decode(a)
             print "  Found producer range", \
-                  '{0:8x}'.format(base), "-", \
-                  '{0:8x}'.format(base + mask)
+                  '{0:8x}'.format(first), "-", \
+                  '{0:8x}'.format(last)
 
     return 0
 
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+'''
+Share one OpenLCB link among many scripts
+
+The broker opens the link configured in defaults.py once (paying
+any adapter startdelay once) and keeps it open, while any number of
+scripts connect to it over a Unix socket with a BrokerOlcbLink
+(see brokerolcblink.py, selected by "broker = True" in defaults.py).
+
+Frames received from the link go to every client; frames sent by a
+client go to the link and, as they would on a CAN bus, to the other
+clients.  Each client can ask for only the frames that start with
+given prefixes.
+
+The client protocol is newline-terminated lines:
+    :X19490AAAN;     a GridConnect frame to send
+    F:X19170         also deliver frames starting with :X19170
+    F                deliver all frames again (clear the filters)
+Frames are sent to the clients the same way, one per line.  Each
+client's frames are queued and written as its socket takes them, so
+a slow client doesn't hold up the link or the others; one that falls
+more than limit bytes behind is disconnected.
+
+'''
+
+import errno
+import os
+import socket
+import select
+
+import linkclock
+
+path = "/tmp/olcblink.sock"
+
+class BrokerClient :
+    def __init__(self, sock) :
+        self.socket = sock
+        self.data = ""
+        self.output = ""    # frames waiting to be written to it
+        self.filters = []   # frame prefixes; empty means all frames
+        return
+
+    def wants(self, frame) :
+        if len(self.filters) == 0 : return True
+        for prefix in self.filters :
+            if frame.startswith(prefix) : return True
+        return False
+
+class LinkBroker :
+    def __init__(self, network, path=path) :
+        self.network = network
+        self.path = path
+        self.poll = 0.005      # seconds to wait on the link each pass
+        self.limit = 1<<20     # most bytes queued for a client
+        self.verbose = False
+        self.listener = None
+        self.clients = {}      # socket -> BrokerClient
+        self.count = 0         # frames carried
+        self.running = False
+        return
+
+    def start(self) :
+        if os.path.exists(self.path) : os.remove(self.path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.listener.listen(5)
+        # keep reading the link while serving clients
+        if hasattr(self.network, "threaded") : self.network.threaded = True
+        self.network.timeout = self.poll
+        self.running = True
+        if self.verbose : print "   broker listening on", self.path
+        return
+
+    def run(self) :
+        if self.listener == None : self.start()
+        while self.running :
+            self.service(0)
+            frame = self.network.receive()
+            if frame != None : self.broadcast(frame.strip(), None)
+        return
+
+    '''
+    Handle any waiting connections and client input.
+    @param timeout seconds to wait for something to arrive
+    '''
+    def service(self, timeout) :
+        sockets = [self.listener]+self.clients.keys()
+        waiting = [s for s, client in self.clients.items() if len(client.output) > 0]
+        readable, writable = select.select(sockets, waiting, [], timeout)[0:2]
+        for s in writable :
+            if s in self.clients : self.write(self.clients[s])
+        for s in readable :
+            if s is self.listener :
+                sock, address = self.listener.accept()
+                sock.setblocking(0)
+                self.clients[sock] = BrokerClient(sock)
+                if self.verbose : print "   client connected,", len(self.clients), "now"
+                continue
+            client = self.clients.get(s)
+            if client == None : continue   # dropped meanwhile
+            try :
+                data = s.recv(4096)
+            except socket.error, err :
+                if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK) : continue
+                data = ""
+            if len(data) == 0 :
+                self.drop(client)
+                continue
+            client.data = client.data+data
+            while client.data.find('\n') >= 0 :
+                line, client.data = client.data.split('\n', 1)
+                self.command(client, line.strip())
+        return
+
+    def command(self, client, line) :
+        if line.startswith(':') :
+            self.network.send(line)
+            self.broadcast(line, client)
+        elif line.startswith('F') :
+            if len(line) == 1 :
+                client.filters = []
+            else :
+                client.filters.append(line[1:])
+        return
+
+    '''
+    Pass a frame to every client that wants it, except the sender
+    '''
+    def broadcast(self, frame, sender) :
+        self.count = self.count + 1
+        for client in self.clients.values() :
+            if client is sender or not client.wants(frame) : continue
+            client.output = client.output+frame+'\n'
+            self.write(client)
+        return
+
+    # write what the client's socket will take now
+    def write(self, client) :
+        try :
+            sent = client.socket.send(client.output)
+            client.output = client.output[sent:]
+        except socket.error, err :
+            if err.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK) :
+                self.drop(client)
+                return
+        if len(client.output) > self.limit :
+            if self.verbose : print "   client", client.socket.fileno(), "fell behind"
+            self.drop(client)
+        return
+
+    def drop(self, client) :
+        if client.socket in self.clients :
+            del self.clients[client.socket]
+            client.socket.close()
+            if self.verbose : print "   client disconnected,", len(self.clients), "left"
+        return
+
+    def close(self) :
+        self.running = False
+        for client in self.clients.values() :
+            self.drop(client)
+        if self.listener != None :
+            self.listener.close()
+            self.listener = None
+            if os.path.exists(self.path) : os.remove(self.path)
+        self.network.close()
+        return
+
+def usage() :
+    print ""
+    print "Opens the link configured in defaults.py and shares it with"
+    print "scripts using a BrokerOlcbLink, until interrupted."
+    print ""
+    print "valid usages (default values):"
+    print "  python linkbroker.py"
+    print "  python linkbroker.py -p /tmp/olcblink.sock"
+    print ""
+    print "-p --path Unix socket to listen on"
+    print "-v verbose"
+
+import getopt, sys
+
+def main():
+    global path
+    verbose = False
+    try:
+        opts, remainder = getopt.getopt(sys.argv[1:], "p:v", ["path="])
+    except getopt.GetoptError, err:
+        # print help information and exit:
+        print str(err) # will print something like "option -a not recognized"
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == "-v":
+            verbose = True
+        elif opt in ("-p", "--path"):
+            path = arg
+        else:
+            assert False, "unhandled option"
+
+    import defaults
+    # with "broker = True", defaults.network is a client, holding the real link
+    network = getattr(defaults.network, "link", defaults.network)
+    network.verbose = False
+
+    broker = LinkBroker(network, path)
+    broker.verbose = verbose
+    try :
+        broker.run()
+    except KeyboardInterrupt :
+        pass
+    broker.close()
+    if verbose : print "   carried", broker.count, "frames"
+
+if __name__ == '__main__':
+    main()
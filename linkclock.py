@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+'''
+Clocks for the links and tests
+
+Every link has a clock attribute, and timing in the tests
+(waiting for the bus to settle, measuring alias reservation
+delays) goes through it:
+
+    connection.network.clock.sleep(3)
+    start = connection.network.clock.time()
+
+Real links use the shared RealClock.  The virtual bus uses a
+VirtualClock, which just moves its time forward when asked to
+sleep, so timing-based tests against simulated nodes run as fast
+as the frames can be processed.
+
+'''
+
+import time
+
+class RealClock :
+    def time(self) :
+        return time.time()
+
+    def sleep(self, seconds) :
+        if seconds > 0 : time.sleep(seconds)
+        return
+
+class VirtualClock :
+    def __init__(self, start=0.0) :
+        self.now = start
+        return
+
+    def time(self) :
+        return self.now
+
+    # sleeping just advances the time
+    def sleep(self, seconds) :
+        if seconds > 0 : self.now = self.now+seconds
+        return
+
+    def advance(self, seconds) :
+        self.sleep(seconds)
+        return
+
+realclock = RealClock()
+
+def main():
+    clock = VirtualClock()
+    start = time.time()
+    for i in range(1000) :
+        clock.sleep(3600)
+    print "slept", clock.time()/3600, "virtual hours in", time.time()-start, "seconds"
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+'''
+Background reader for the link classes
+
+When a link is put in threaded mode, a LinkReader thread
+continuously drains the link's transport into a bounded queue
+of (timestamp, frame) pairs, so frames don't sit in (and overflow)
+the kernel buffers between calls to receive().  The link's
+receive() then just dequeues with a timeout.  When the link leaves
+threaded mode, it goes on dequeuing until follow() says the thread
+has ended and the queue is empty, then reads its transport again.
+
+If the queue fills, newly arrived frames are dropped and counted.
+
+'''
+
+import threading
+import Queue
+import time
+
+class LinkReader :
+    '''
+    @param read function that returns one frame, or None on timeout
+    @param size maximum number of frames held in the queue
+    '''
+    def __init__(self, read, size) :
+        self.read = read
+        self.queue = Queue.Queue(size)
+        self.size = size
+        self.received = 0     # frames read from the link
+        self.dropped = 0      # frames dropped because the queue was full
+        self.highwater = 0    # most frames ever waiting in the queue
+        self.lasttime = None  # when the last dequeued frame arrived
+        self.error = None     # exception that stopped the reader, if any
+        self.running = False
+        self.thread = None
+        return
+
+    def start(self) :
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="LinkReader")
+        self.thread.daemon = True
+        self.thread.start()
+        return
+
+    def stop(self) :
+        self.running = False
+        if self.thread != None and self.thread != threading.currentThread() :
+            self.thread.join(1.0)
+        self.thread = None
+        return
+
+    '''
+    Keep up with the link's threaded setting.  When the link leaves
+    threaded mode the thread ends after the read it's in, and the
+    frames already read are still dequeued by receive().
+    @return False once the link can read its transport itself again
+    '''
+    def follow(self, threaded) :
+        if threaded :
+            if not self.running and self.error == None :
+                if self.thread != None : self.thread.join()
+                self.start()
+            return True
+        self.running = False
+        if self.thread != None and not self.thread.isAlive() : self.thread = None
+        return self.thread != None or self.waiting() > 0
+
+    def run(self) :
+        while self.running :
+            try :
+                frame = self.read()
+            except Exception, err :
+                # link closed or failed; nothing more will arrive
+                if self.running : self.error = err
+                self.running = False
+                break
+            if frame == None : continue
+            self.received = self.received + 1
+            try :
+                self.queue.put_nowait((time.time(), frame))
+            except Queue.Full :
+                self.dropped = self.dropped + 1
+                continue
+            waiting = self.queue.qsize()
+            if waiting > self.highwater : self.highwater = waiting
+        return
+
+    '''
+    Dequeue the next frame.
+    @param timeout seconds to wait for a frame
+    @return (timestamp, frame), or None on timeout
+    '''
+    def get(self, timeout) :
+        try :
+            return self.queue.get(True, timeout)
+        except Queue.Empty :
+            return None
+
+    '''
+    Dequeue the next frame, in the same form as a link's receive()
+    @param timeout seconds to wait for a frame
+    @param verbose if True, print the frame as the links do
+    @return frame, or None on timeout
+    '''
+    def receive(self, timeout, verbose) :
+        if verbose : print "   receive ",
+        entry = self.get(timeout)
+        if entry == None :
+            if verbose : print "<none>" # blank line to show delay?
+            return None
+        self.lasttime, frame = entry
+        if verbose : print frame.rstrip()
+        return frame
+
+    '''
+    @return number of frames waiting
+    '''
+    def waiting(self) :
+        return self.queue.qsize()
+
+    '''
+    Drop all frames waiting in the queue.
+    '''
+    def clear(self) :
+        while self.get(0) != None :
+            continue
+        return
+
+    def stats(self) :
+        return "received "+str(self.received)+", dropped "+str(self.dropped) \
+            +", high-water "+str(self.highwater)+" of "+str(self.size)
+
+'''
+Put a link in threaded mode, where it has one, and shorten its
+receive() timeout, for a loop that receives a burst of frames.
+@return what release() needs to put the link back
+'''
+def hold(network, timeout) :
+    saved = (getattr(network, "threaded", None), network.timeout)
+    if saved[0] != None : network.threaded = True
+    network.timeout = timeout
+    return saved
+
+'''
+Put a link back as it was before hold()
+'''
+def release(network, saved) :
+    threaded, timeout = saved
+    network.timeout = timeout
+    if threaded != None : network.threaded = threaded
+    return
+
+def main():
+    # read from a fake link and report
+    frames = [":X19170AAAN0%d;" % i for i in range(10)]
+    def read() :
+        if len(frames) == 0 :
+            time.sleep(0.01)
+            return None
+        return frames.pop(0)
+    reader = LinkReader(read, 5)
+    reader.start()
+    time.sleep(0.1)
+    while reader.receive(0.1, True) != None :
+        continue
+    reader.stop()
+    print reader.stats()
+
+if __name__ == '__main__':
+    main()
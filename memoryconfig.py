@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+'''
+Read a whole memory configuration address space, or a large part of it
+
+readConfiguration.py does one read, waiting for its reply, and
+testCDI.py used to read the CDI 16 bytes at a time the same way.
+readSpace() asks for the most a read can return, 64 bytes, through
+a datagram Engine (see datagram.py), and streams what's read in
+address order to a bytearray or file:
+
+    data = bytearray()
+    reader = memoryconfig.readSpace(alias, dest, 0xFF, 0, None, connection.network, data)
+    if reader.error == 0 : print reader.rate(), "bytes/sec"
+
+'''
+
+import connection as connection
+import datagram
+
+# most bytes one read can return
+CHUNK = 64
+
+'''
+@return the read command for a space, and the space byte if it needs one
+'''
+def readcommand(space) :
+    if space >= 0xFD : return 0x40 | (space & 0x03), []
+    return 0x40, [space]
+
+class SpaceReader :
+    '''
+    @param alias alias of self
+    @param dest alias of the node to read
+    @param network link to use
+    @param space address space to read
+    @param start first address
+    @param length bytes to read, or None to read to the end of the space
+    @param out bytearray to extend, or file to write, with the data in order
+    @param stream function(data) called with the data in order as it arrives,
+    which can return False to stop reading, or None
+    @param depth most reads outstanding at once; the Engine sends the next
+    as soon as the node acknowledges one saying a reply is coming, so a
+    node with several datagram buffers works on several reads at once;
+    a node with one rejects the reads it has no room for, and they're
+    resent after a backoff, so keep 1 for those
+    '''
+    def __init__(self, alias, dest, network, space, start, length, out=None, stream=None, depth=1) :
+        self.dest = dest
+        self.network = network
+        self.space = space
+        self.start = start
+        self.end = None if length == None else start+length
+        self.out = out
+        self.stream = stream
+        self.depth = depth
+        self.engine = datagram.Engine(alias, network, received=self.received)
+        self.next = start       # address of the next read to queue
+        self.written = start    # address up to which data has been passed on
+        self.outstanding = {}   # address -> [count, Transfer] of the reads queued
+        self.chunks = {}        # address -> data read ahead of what's passed on
+        self.count = 0          # bytes passed on
+        self.reads = 0
+        self.error = 0          # error code once a read has failed
+        self.stopped = False
+        self.elapsed = 0.0
+        return
+
+    def queue(self) :
+        while not self.stopped and len(self.outstanding) < self.depth and (self.end == None or self.next < self.end) :
+            count = CHUNK if self.end == None else min(CHUNK, self.end-self.next)
+            command, spacebyte = readcommand(self.space)
+            a = self.next
+            transfer = self.engine.send(self.dest, [0x20, command, (a>>24)&0xFF, (a>>16)&0xFF, (a>>8)&0xFF, a&0xFF]+spacebyte+[count],
+                                self.sent)
+            self.outstanding[a] = [count, transfer]
+            self.next = a+count
+            self.reads = self.reads+1
+        return
+
+    def fail(self, error) :
+        if self.error == 0 : self.error = error
+        self.stop()
+        return
+
+    # the space ends at end; reads of what's past it that haven't gone out aren't sent
+    def ended(self, end) :
+        if self.end != None and self.end <= end : return
+        self.end = end
+        for a, (count, transfer) in self.outstanding.items() :
+            if a >= end and transfer in self.engine.queue :
+                self.engine.queue.remove(transfer)
+                del self.outstanding[a]
+        return
+
+    def stop(self) :
+        self.stopped = True
+        # only reads the node has accepted can still be answered
+        self.engine.queue = []
+        for a, (count, transfer) in self.outstanding.items() :
+            if transfer.status != "ok" : del self.outstanding[a]
+        return
+
+    # a read datagram was acknowledged or given up on
+    def sent(self, transfer) :
+        if transfer.status != "ok" :
+            if self.error == 0 : print "Read from %03X" % self.dest, transfer.status, "error 0x%04X" % (transfer.code or 0)
+            self.fail(transfer.code or 1)
+        return
+
+    def received(self, source, dest, content) :
+        if source != self.dest or len(content) < 6 or content[0] != 0x20 or (content[1] & 0xF0) != 0x50 : return
+        address = (content[2]<<24)+(content[3]<<16)+(content[4]<<8)+content[5]
+        if address not in self.outstanding : return   # not one of ours, or a repeat
+        count, transfer = self.outstanding.pop(address)
+        if self.stopped : return
+        data = content[7:] if (content[1] & 0x03) == 0 else content[6:]
+        if (content[1] & 0x08) != 0 :
+            # read failed; past the end of the space if reading to its end
+            if self.end == None :
+                self.ended(address)
+            elif address < self.end :
+                code = (data[0]<<8)+data[1] if len(data) >= 2 else 0
+                print "Read from %03X at 0x%X failed, error 0x%04X" % (self.dest, address, code)
+                self.fail(code or 3)
+            data = []
+        elif len(data) < count :
+            # a short read ends the space
+            self.ended(address+len(data))
+        self.chunks[address] = data
+        self.flush()
+        self.queue()
+        return
+
+    # pass on data that's now in order
+    def flush(self) :
+        while not self.stopped and self.written in self.chunks :
+            data = self.chunks.pop(self.written)
+            if len(data) == 0 : break
+            self.written = self.written+len(data)
+            self.count = self.count+len(data)
+            if self.out != None :
+                if hasattr(self.out, "write") :
+                    self.out.write(str(bytearray(data)))
+                else :
+                    self.out.extend(data)
+            if self.stream != None and self.stream(data) == False :
+                self.stop()
+                return
+        return
+
+    def finished(self) :
+        return len(self.outstanding) == 0 and (self.stopped or (self.end != None and self.next >= self.end))
+
+    '''
+    @return the reader, with error 0 if everything was read
+    '''
+    def run(self) :
+        start = self.network.clock.time()
+        self.queue()
+        self.engine.run(None, self.finished)
+        self.elapsed = self.network.clock.time()-start
+        if not self.finished() and self.error == 0 :
+            print "No reply to read from %03X at 0x%X" % (self.dest, min(self.outstanding.keys()))
+            self.fail(4)
+        return self
+
+    # bytes per second
+    def rate(self) :
+        if self.elapsed <= 0 : return 0.0
+        return self.count/self.elapsed
+
+'''
+Read part or all of an address space
+@param length bytes to read, or None to read to the end of the space
+@return the SpaceReader, which has error 0 if everything was read
+'''
+def readSpace(alias, dest, space, start, length, network, out=None, stream=None, depth=1) :
+    return SpaceReader(alias, dest, network, space, start, length, out, stream, depth).run()
+
+def usage() :
+    print ""
+    print "Called standalone, reads an address space with 64-byte reads"
+    print "and writes it to a file or shows its size"
+    print ""
+    print "Default connection detail taken from connection.py"
+    print ""
+    print "-a --alias source alias (default 0x%03X)" % connection.thisNodeAlias
+    print "-d --dest dest alias (default 0x%03X)" % connection.testNodeAlias
+    print "-s --space address space (default 255, CDI; all-mem is 254, configuration is 253)"
+    print "-A address, decimal, defaults to zero"
+    print "-c --count number of bytes to read (default to the end of the space)"
+    print "-o --output file to write what's read to"
+    print "-q --queue most reads outstanding at once, for nodes with several datagram buffers (default 1)"
+    print "-t find destination alias automatically"
+    print "-v verbose"
+    print "-V Very verbose"
+
+import getopt, sys
+
+def main():
+    # argument processing
+    alias = connection.thisNodeAlias
+    dest = connection.testNodeAlias
+    identifynode = False
+    verbose = False
+    space = 0xFF
+    address = 0
+    count = None
+    output = None
+    depth = 1
+    try:
+        opts, remainder = getopt.getopt(sys.argv[1:], "A:s:d:a:c:o:q:vVt", ["space=", "dest=", "count=", "alias=", "output=", "queue="])
+    except getopt.GetoptError, err:
+        # print help information and exit:
+        print str(err) # will print something like "option -a not recognized"
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == "-v":
+            verbose = True
+        elif opt == "-V":
+            connection.network.verbose = True
+            verbose = True
+        elif opt in ("-s", "--space"):
+            space = int(arg, 0)
+        elif opt in ("-c", "--count"):
+            count = int(arg, 0)
+        elif opt == "-A":
+            address = int(arg, 0)
+        elif opt in ("-o", "--output"):
+            output = arg
+        elif opt in ("-q", "--queue"):
+            depth = int(arg)
+        elif opt in ("-a", "--alias"):
+            alias = int(arg, 0)
+        elif opt in ("-d", "--dest"):
+            dest = int(arg, 0)
+        elif opt == "-t":
+            identifynode = True
+        else:
+            assert False, "unhandled option"
+
+    if identifynode :
+        import getUnderTestAlias
+        dest, nodeID = getUnderTestAlias.get(alias, None, verbose)
+
+    out = bytearray() if output == None else open(output, "wb")
+    reader = readSpace(alias, dest, space, address, count, connection.network, out, None, depth)
+    if output != None : out.close()
+    print "read %d bytes of space 0x%02X in %d reads, %.3f sec, %.0f bytes/sec" % (reader.count, space,
+        reader.reads, reader.elapsed, reader.rate())
+    connection.network.close()
+    exit(reader.error)
+
+if __name__ == '__main__':
+    main()
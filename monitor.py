@@ -3,15 +3,259 @@
 Simple monitor of CAN traffic on default connection
 Kill to end
 
+With -c, also captures the traffic to a trace file,
+see tracefile.py, and with -s then reports its statistics,
+see busstats.py
+
+With -d, prints each frame decoded: source alias, message type,
+destination and node or event ID.  With -f and -m, only frames
+matching the given prefixes or header mask:value pairs are shown;
+they're checked before any formatting.  With -S, a summary of the
+rates per message type and per node is redrawn every second
+instead of printing the frames.
+
+The link is read in a background thread where it can be, so
+frames are queued, not lost, while the terminal catches up.
+
 @author: Bob Jacobsen
 '''
 
-import connection as connection
+import sys
+import time
+
+import canolcbutils
+
+MINBITS = 67   # shortest frame on the wire: extended header, no data, no stuff bits
+BITRATE = 125000
+
+class Monitor :
+    '''
+    @param prefixes frame prefixes to show, e.g. ":X19170"
+    @param masks (mask, value) header pairs to show
+    Shows all frames if neither is given.
+    '''
+    def __init__(self, prefixes=[], masks=[]) :
+        self.prefixes = tuple(prefixes)
+        self.masks = [(mask, value & mask) for mask, value in masks]
+        self.clear()
+        return
+
+    def clear(self) :
+        self.types = {}     # key from the header -> frames
+        self.nodes = {}     # source alias -> frames
+        self.seen = 0       # frames received
+        self.shown = 0      # frames passing the filters
+        self.start = time.time()
+        self.last = {}      # counts at the last summary, for rates
+        self.lasttime = self.start
+        return
+
+    '''
+    Parse, filter and count one frame
+    @return the frame string, or None if it isn't a frame or is filtered out
+    '''
+    def process(self, string) :
+        self.seen = self.seen+1
+        if not string.startswith(":") : return None
+        try :
+            header = canolcbutils.headerValue(string)
+        except ValueError :
+            return None
+        extended = string[1] != 'S'
+        if (len(self.prefixes) > 0 or len(self.masks) > 0) and not string.startswith(self.prefixes) :
+            for mask, value in self.masks :
+                if extended and (header & mask) == value : break
+            else :
+                return None
+        self.shown = self.shown+1
+        if not extended :
+            key = -1
+        elif (header >> 24) == 0x19 :
+            key = header >> 12          # message: frame type and MTI
+        else :
+            key = header >> 24          # control or datagram frame
+        self.types[key] = self.types.get(key, 0)+1
+        if extended :
+            alias = header & 0xFFF
+            self.nodes[alias] = self.nodes.get(alias, 0)+1
+        return string
+
+    def typename(self, key) :
+        if key < 0 : return "Standard"
+        if key > 0xFF : return canolcbutils.describe(key << 12)
+        return canolcbutils.describe(key << 24)
+
+    '''
+    @return lines of the summary: totals, then per message type
+    and per node, each with its rate since the last summary
+    '''
+    def summary(self, top=15) :
+        now = time.time()
+        interval = max(now-self.lasttime, 1e-6)
+        elapsed = max(now-self.start, 1e-6)
+        lines = []
+        lines.append("%d frames in %.0f sec, %d shown, %.1f/sec now, %.1f/sec average" % (
+            self.seen, elapsed, self.shown,
+            (self.shown-self.last.get("shown", 0))/interval, self.shown/elapsed))
+        lines.append("")
+        lines.append("  %10s %9s  %s" % ("frames", "per sec", "message type"))
+        merged = {}
+        for key, count in self.types.items() :
+            name = self.typename(key)
+            total, recent = merged.get(name, (0, 0))
+            merged[name] = (total+count, recent+count-self.last.get(("type", key), 0))
+        for name, (total, recent) in sorted(merged.items(), key=lambda (n, c) : -c[0])[:top] :
+            lines.append("  %10d %9.1f  %s" % (total, recent/interval, name))
+        lines.append("")
+        lines.append("  %10s %9s  %s" % ("frames", "per sec", "node alias"))
+        for alias, count in sorted(self.nodes.items(), key=lambda (a, c) : -c)[:top] :
+            lines.append("  %10d %9.1f  %03X" % (count, (count-self.last.get(("node", alias), 0))/interval, alias))
+        self.last = {"shown" : self.shown}
+        for key, count in self.types.items() : self.last[("type", key)] = count
+        for alias, count in self.nodes.items() : self.last[("node", alias)] = count
+        self.lasttime = now
+        return lines
+
+'''
+A mix of busy-bus traffic: event reports, node verifications,
+datagrams, identify events and alias checks
+'''
+def sampleframes(count) :
+    import random
+    import canolcbutils
+    frames = []
+    for i in range(count) :
+        alias = random.randint(0x001, 0xFFF)
+        kind = random.randint(0, 4)
+        if kind == 0 :
+            frames.append(canolcbutils.makeframestring(0x195B4000+alias, [random.randint(0, 255) for j in range(8)]))
+        elif kind == 1 :
+            frames.append(canolcbutils.makeframestring(0x19170000+alias, [2, 3, 4, 5, 6, random.randint(0, 255)]))
+        elif kind == 2 :
+            frames.append(canolcbutils.makeframestring(0x1A000000+(random.randint(0, 0xFFF) << 12)+alias,
+                                                        [random.randint(0, 255) for j in range(8)]))
+        elif kind == 3 :
+            frames.append(canolcbutils.makeframestring(0x19914000+alias, [1, 2, 3, 4, 5, 6, 0, random.randint(0, 255)]))
+        else :
+            frames.append(canolcbutils.makeframestring(0x17000000+alias, None))
+    return frames
+
+'''
+Time processing frames as the monitor does, for each mode
+@return list of (name, frames per second)
+'''
+def benchmark(count, prefixes=[], masks=[]) :
+    frames = sampleframes(count)
+    result = []
+    for name in ("count", "decode", "summary") :
+        monitor = Monitor(prefixes, masks)
+        start = time.time()
+        for string in frames :
+            frame = monitor.process(string)
+            if frame != None and name == "decode" : text = canolcbutils.decode(frame)
+        if name == "summary" : monitor.summary()
+        result.append((name, count/(time.time()-start)))
+    return result
+
+def usage() :
+    print ""
+    print "Prints the CAN traffic on the default connection; kill to end."
+    print ""
+    print "valid usages (default values):"
+    print "  python monitor.py"
+    print "  python monitor.py -c bus.trc"
+    print "  python monitor.py -d -f :X195B4 -f :X19170"
+    print "  python monitor.py -S -m 0x0FFFF000:0x095B4000"
+    print "  python monitor.py -b 100000"
+    print ""
+    print "-c --capture also write the frames to this trace file"
+    print "-q --quiet don't print the frames"
+    print "-s --statistics with -c, print bus statistics at the end (needs NumPy)"
+    print "-d --decode print the frames decoded"
+    print "-f --filter only frames starting with this prefix; may be repeated"
+    print "-m --mask only frames whose header, masked, is the value; may be repeated"
+    print "-S --summary redraw a summary of rates per message type and node"
+    print "-b --benchmark time processing this many frames, then exit"
+
+import getopt
 
 def main():
-    while (True) :
-        frame = connection.network.receive()
-        if (frame != None ) : print frame,
+    capture = None
+    quiet = False
+    statistics = False
+    decode = False
+    summary = False
+    bench = None
+    prefixes = []
+    masks = []
+    try:
+        opts, remainder = getopt.getopt(sys.argv[1:], "c:qsdf:m:Sb:",
+            ["capture=", "quiet", "statistics", "decode", "filter=", "mask=", "summary", "benchmark="])
+    except getopt.GetoptError, err:
+        # print help information and exit:
+        print str(err) # will print something like "option -a not recognized"
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-c", "--capture"):
+            capture = arg
+        elif opt in ("-q", "--quiet"):
+            quiet = True
+        elif opt in ("-s", "--statistics"):
+            statistics = True
+        elif opt in ("-d", "--decode"):
+            decode = True
+        elif opt in ("-f", "--filter"):
+            prefixes.append(arg)
+        elif opt in ("-m", "--mask"):
+            mask, value = arg.split(':')
+            masks.append((int(mask, 0), int(value, 0)))
+        elif opt in ("-S", "--summary"):
+            summary = True
+        elif opt in ("-b", "--benchmark"):
+            bench = int(arg)
+        else:
+            assert False, "unhandled option"
+
+    if bench != None :
+        print "a saturated %d bit/sec bus carries at most %d frames/sec" % (BITRATE, BITRATE/MINBITS)
+        for name, rate in benchmark(bench, prefixes, masks) :
+            print "  %-10s %10.0f frames/sec  (%.0fx)" % (name, rate, rate/(BITRATE/MINBITS))
+        return
+
+    import connection as connection
+    network = connection.network
+    if hasattr(network, "threaded") : network.threaded = True
+
+    monitor = Monitor(prefixes, masks)
+    writer = None
+    if capture != None :
+        import tracefile
+        writer = tracefile.TraceWriter(capture, network.clock)
+    shown = time.time()
+    try :
+        while (True) :
+            string = network.receive()
+            if summary and time.time()-shown >= 1.0 :
+                shown = time.time()
+                sys.stdout.write("\x1b[H\x1b[2J"+"\n".join(monitor.summary())+"\n")
+                sys.stdout.flush()
+            if (string == None ) : continue
+            if writer != None : writer.write(string)
+            frame = monitor.process(string)
+            if frame == None or quiet or summary : continue
+            if decode :
+                print canolcbutils.decode(frame)
+            else :
+                print string,
+    except KeyboardInterrupt :
+        pass
+    if writer != None :
+        writer.close()
+        print writer.count, "frames captured to", capture
+        if statistics :
+            import busstats
+            busstats.report(busstats.statistics(busstats.load(capture)))
     return
 
 if __name__ == '__main__':
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+'''
+Drive many GridConnect TCP links from a single thread
+
+A LinkMultiplexer owns any number of MultiplexedLink connections
+and services all of them from one select() loop, so a single
+controller process doesn't need a thread per link.  (asyncio isn't
+available in the Python 2 / Jython versions these scripts support.)
+
+Each MultiplexedLink has the usual send/receive/expect contract,
+so it can be used wherever a TcpToOlcbLink is; while one link
+blocks in receive() the others keep reading into their own buffers.
+LinkConnection wraps a link so it can be passed as the "connection"
+argument of the existing test(...) functions.
+
+For concurrent work across links, tasks are written as generators
+that yield link.wait(...) requests and are resumed with the matching
+frame (or None on timeout) by LinkMultiplexer.run().  Every task
+waiting on a link sees each frame that arrives on it, so tasks
+sharing a link don't take each other's frames.  receive() and
+frames() see the same frames, less those a task has taken, without
+taking them from the tasks.  For example:
+
+    def verify(link) :
+        link.send(":X19490AAAN;")
+        reply = yield link.wait(startswith=":X19170")
+        print link.host, reply
+
+    for link in links : mux.spawn(verify(link))
+    mux.run()
+
+'''
+
+import socket
+import select
+import time
+
+import gridconnect
+import linkclock
+
+'''
+Check a frame against the expect() criteria.
+@param exact if != None, frame must be exactly this string
+@param startswith if != None, frame must start with this string
+@param data if != None, sequence of data bytes the frame body must match
+'''
+def matches(frame, exact, startswith, data) :
+    if frame == None :
+        return False
+    if exact != None and frame != exact :
+        return False
+    if startswith != None and not frame.startswith(startswith) :
+        return False
+    if data != None :
+        body = frame[frame.find('N')+1:frame.find(';')]
+        if len(body) != 2*len(data) :
+            return False
+        if bytearray(body.decode('hex')) != bytearray(data) :
+            return False
+    return True
+
+class LinkMultiplexer :
+    def __init__(self) :
+        self.links = {}        # socket -> link
+        self.tasks = []        # [task generator, pending Wait or None]
+        self.chunksize = 4096
+        return
+
+    '''
+    Create a link to a GridConnect TCP host; it connects on first use.
+    '''
+    def add(self, host, port) :
+        link = MultiplexedLink(self)
+        link.host = host
+        link.port = port
+        return link
+
+    '''
+    Wait up to timeout seconds for data on any link, and pass
+    whatever arrives to the links' parsers.
+    @return True if any data arrived
+    '''
+    def poll(self, timeout) :
+        if len(self.links) == 0 :
+            if timeout > 0 : time.sleep(timeout)
+            return False
+        readable = select.select(self.links.keys(), [], [], max(timeout, 0))[0]
+        for s in readable :
+            link = self.links[s]
+            try :
+                data = s.recv(self.chunksize)
+            except socket.error, err :
+                data = ""
+            if len(data) == 0 :
+                # connection closed
+                del self.links[s]
+                link.closed = True
+                continue
+            link.parser.feed(data)
+        return len(readable) > 0
+
+    '''
+    Iterate over (link, frame) pairs from all the links as they arrive,
+    ending after timeout seconds with nothing received.
+    '''
+    def frames(self, timeout) :
+        while True :
+            for link in self.links.values() :
+                frame = link.unread()
+                while frame != None :
+                    yield link, frame
+                    frame = link.unread()
+            if not self.poll(timeout) :
+                return
+
+    '''
+    Add a generator task, running it up to its first wait.
+    '''
+    def spawn(self, task) :
+        entry = [task, None]
+        self.tasks.append(entry)
+        self.resume(entry, None)
+        return
+
+    def resume(self, entry, value) :
+        try :
+            entry[1] = entry[0].send(value)
+        except StopIteration :
+            self.tasks.remove(entry)
+        return
+
+    '''
+    Run the spawned tasks until they've all finished, or until
+    timeout seconds have passed if timeout is not None.
+    '''
+    def run(self, timeout=None) :
+        end = None
+        if timeout != None : end = time.time()+timeout
+        while len(self.tasks) > 0 :
+            now = time.time()
+            if end != None and now > end : break
+            progress = False
+            for entry in self.tasks[:] :
+                result = entry[1].check(now)
+                if result != False :
+                    self.resume(entry, result)
+                    progress = True
+            for link in self.links.values() :
+                link.prune()
+            if progress : continue
+            # nothing ready, wait for data or the next deadline
+            deadline = min([entry[1].deadline for entry in self.tasks])
+            if end != None : deadline = min(deadline, end)
+            self.poll(deadline-now)
+        return len(self.tasks)
+
+    def close(self) :
+        for link in self.links.values() :
+            link.close()
+        return
+
+'''
+A pending wait for a frame on one link, yielded by a task.
+'''
+class Wait :
+    def __init__(self, link, exact, startswith, data, timeout) :
+        self.link = link
+        self.exact = exact
+        self.startswith = startswith
+        self.data = data
+        self.deadline = time.time()+timeout
+        self.seen = link.base   # number of the next of the link's frames to look at
+        link.waits.append(self)
+        return
+
+    '''
+    @return the matching frame, None if timed out, or False if still waiting
+    '''
+    def check(self, now) :
+        link = self.link
+        link.fill()
+        self.seen = max(self.seen, link.base)   # taken frames before it may have been dropped
+        while self.seen < link.base+len(link.backlog) :
+            i = self.seen-link.base
+            frame = link.backlog[i]
+            self.seen = self.seen+1
+            if matches(frame, self.exact, self.startswith, self.data) :
+                link.backlog[i] = None   # taken
+                link.waits.remove(self)
+                return frame
+        if now >= self.deadline or link.closed :
+            link.waits.remove(self)
+            return None
+        return False
+
+class MultiplexedLink :
+    def __init__(self, multiplexer) :
+        self.multiplexer = multiplexer
+        self.host = "localhost"
+        self.port = 12021
+        self.timeout = 1.0
+        self.verbose = False
+        self.startdelay = 0
+        self.socket = None
+        self.closed = False
+        self.parser = gridconnect.GridConnectParser()
+        self.waits = []       # Waits pending on this link
+        self.backlog = []     # frames not yet seen by all of them, None once taken
+        self.base = 0         # number of the first frame in the backlog
+        self.read = None      # number of the next frame for receive(), once it's been used
+        self.clock = linkclock.realclock
+        return
+
+    def connect(self) :
+        # if verbose, print
+        if (self.verbose) : print "   connect to ",self.host,":",self.port
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.connect((self.host, self.port))
+        self.multiplexer.links[self.socket] = self
+        self.closed = False
+        if self.startdelay > 0 :
+            if self.verbose : print "   waiting", self.startdelay, "seconds for adapter restart"
+            self.clock.sleep(self.startdelay)
+        return
+
+    def send(self, frame) :
+        if (self.socket == None) : self.connect()
+
+        # if verbose, print
+        if (self.verbose) : print "   send   ",frame
+        self.socket.sendall(frame)
+        return
+
+    # next already-received frame, or None
+    def next(self) :
+        frame = self.parser.next()
+        if (frame != None and self.verbose) : print "   receive",frame
+        return frame
+
+    # move frames that have arrived to the backlog, for the Waits
+    def fill(self) :
+        while self.parser.available() > 0 :
+            self.backlog.append(self.next())
+        return
+
+    # next frame for receive() from the backlog, leaving it there for the Waits; None if none yet
+    def unread(self) :
+        self.fill()
+        if self.read == None : self.read = self.base
+        self.read = max(self.read, self.base)
+        frame = None
+        while frame == None and self.read < self.base+len(self.backlog) :
+            frame = self.backlog[self.read-self.base]
+            self.read = self.read+1
+        self.prune()
+        return frame
+
+    # drop the frames that every pending Wait, and receive(), has looked at
+    def prune(self) :
+        cursors = [w.seen for w in self.waits]
+        if self.read != None : cursors.append(self.read)
+        seen = min(cursors or [self.base+len(self.backlog)])
+        n = 0
+        while n < len(self.backlog) and (self.base+n < seen or self.backlog[n] == None) :
+            n = n+1
+        del self.backlog[:n]
+        self.base = self.base+n
+        return
+
+    def receive(self) : # returns frame or None on timeout
+        if (self.socket == None) : self.connect()
+        end = time.time()+self.timeout
+        frame = self.unread()
+        while frame == None and not self.closed :
+            remaining = end-time.time()
+            if remaining <= 0 : break
+            self.multiplexer.poll(remaining)
+            frame = self.unread()
+        if frame == None :
+            if (self.verbose) : print "<none>" # blank line to show delay?
+        return frame
+
+    '''
+    Continue receiving data until the we get the expected result or timeout.
+    @param exact if != None, look for result with exact string
+    @param startswith if != None, look for result starting with string
+    @param data if != None, tuple of data bytes to match
+    @param timeout timeout in seconds, if timeout != 0, return None on timeout
+    @return resulting message on success, None on timeout
+    '''
+    def expect(self, exact=None, startswith=None, data=None, timeout=1) :
+        start = time.time()
+        while (True) :
+            result = self.receive()
+            if matches(result, exact, startswith, data) :
+                return result
+            if (timeout != 0) :
+                if (time.time() > (start + timeout)) :
+                    if (self.verbose) :
+                        print "Timeout"
+                    return None
+
+    '''
+    Make a request for a task to yield, as the multiplexed form of expect()
+    '''
+    def wait(self, exact=None, startswith=None, data=None, timeout=None) :
+        if (self.socket == None) : self.connect()
+        if timeout == None : timeout = self.timeout
+        return Wait(self, exact, startswith, data, timeout)
+
+    # iterate over frames from this link until timeout with nothing received
+    def __iter__(self) :
+        while True :
+            frame = self.receive()
+            if frame == None : return
+            yield frame
+
+    def close(self) :
+        if self.socket != None :
+            if self.socket in self.multiplexer.links :
+                del self.multiplexer.links[self.socket]
+            self.socket.close()
+            self.socket = None
+        self.closed = True
+        return
+
+'''
+Stands in for the connection module, so that existing
+test(..., connection, ...) functions can run over a MultiplexedLink;
+the node IDs and aliases default to those in defaults.py
+'''
+class LinkConnection :
+    def __init__(self, link, thisNodeID=[1,2,3,4,5,6], thisNodeAlias=0xAAA,
+                 testNodeID=[2,3,4,5,6,1], testNodeAlias=0xDDD) :
+        self.network = link
+        self.thisNodeID = thisNodeID
+        self.thisNodeAlias = thisNodeAlias
+        self.testNodeID = testNodeID
+        self.testNodeAlias = testNodeAlias
+        return
+
+def usage() :
+    print ""
+    print "Called standalone, sends a VerifyNode (Global) message on"
+    print "each of several GridConnect TCP links at once, then prints"
+    print "the replies from all of them as they arrive."
+    print ""
+    print "valid usages:"
+    print "  python multiolcblink.py host1:12021 host2:12021 host3:12021"
+    print ""
+    print "-a --alias source alias (default 0xAAA)"
+    print "-v verbose"
+
+import getopt, sys
+
+def main():
+    alias = 0xAAA
+    verbose = False
+    try:
+        opts, remainder = getopt.getopt(sys.argv[1:], "a:v", ["alias="])
+    except getopt.GetoptError, err:
+        # print help information and exit:
+        print str(err) # will print something like "option -a not recognized"
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == "-v":
+            verbose = True
+        elif opt in ("-a", "--alias"):
+            alias = int(arg, 0)
+        else:
+            assert False, "unhandled option"
+    if len(remainder) == 0 :
+        usage()
+        sys.exit(2)
+
+    mux = LinkMultiplexer()
+
+    def verify(link) :
+        link.send(":X19490%03XN;" % alias)
+        while True :
+            reply = yield link.wait(startswith=":X19170")
+            if reply == None : break
+            print link.host+":"+str(link.port), "node", reply[7:10], "is", reply[11:-1]
+
+    for hostport in remainder :
+        host, port = hostport.split(':')
+        link = mux.add(host, int(port))
+        link.verbose = verbose
+        mux.spawn(verify(link))
+    mux.run()
+    mux.close()
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,10 @@ argparse is new in Jython 2.7, so dont use here
 '''
 
 import subprocess
+import threading
+
+import linkreader
+import linkclock
 
 # stdout,stderr = p.communicate("send stuff input\n more studd")
 # print "O",stdout
@@ -23,9 +27,15 @@ class PipeOlcbLink :
         self.location = "../C/libraries/OlcbTestCAN/obj/test/" # where to find file
         self.name = "pyOlcbBasicNode"                          # executable name
         self.timeout = 0.010
+        self.tick = 0.040      # seconds each 'T' timer tick stands for
         self.startdelay = 0;
         self.verbose = False
         self.process = None
+        self.threaded = False  # if True, read in a background thread
+        self.queuesize = 10000 # frames held when threaded
+        self.reader = None
+        self.lock = threading.Lock()   # one line at a time to the process
+        self.clock = linkclock.realclock
         return
     
     def connect(self) :
@@ -55,7 +65,7 @@ class PipeOlcbLink :
     def send(self, frame) :
         if self.process == None : 
             self.connect()
-        elif not self.seenEnd :
+        elif not self.seenEnd and not self.threaded :
             self.flush()
             
         # if verbose, print
@@ -63,12 +73,25 @@ class PipeOlcbLink :
 
         # send
         self.seenEnd = False
-        self.process.stdin.write(frame+'\n')
-        self.process.stdin.flush()
+        self.write(frame+'\n')
+
+        return
 
+    def write(self, line) :
+        self.lock.acquire()
+        try :
+            self.process.stdin.write(line)
+            self.process.stdin.flush()
+        finally :
+            self.lock.release()
         return
         
     def receive(self) : # returns frame
+        if (self.reader != None and not self.reader.follow(self.threaded)) : self.reader = None
+        if (self.threaded or self.reader != None) :
+            if (self.reader == None) : self.startreader()
+            return self.reader.receive(self.timeout, self.verbose)
+
         if (self.process == None) : self.connect()
         
         # if verbose, print
@@ -78,11 +101,10 @@ class PipeOlcbLink :
 
         # timeout returns empty line
         count = 0
-        while not r.startswith(":") and self.timeout >= count*0.040 :
+        while not r.startswith(":") and self.timeout >= count*self.tick :
             count = count + 1
             # try again a time or two
-            self.process.stdin.write('T\n')
-            self.process.stdin.flush()
+            self.write('T\n')
             r = self.process.stdout.readline()
             
         if not r.startswith(":") :
@@ -95,7 +117,32 @@ class PipeOlcbLink :
         
         return r       
 
+    # Reads the next frame without printing, or None once the process
+    # has nothing more to say.  Used by the reader thread, which keeps
+    # the node's timers going by sending a tick each self.tick then;
+    # the queue timeout provides the receive timeout instead.
+    def readframe(self) :
+        while True :
+            r = self.process.stdout.readline()
+            if r == "" :
+                raise EOFError("process ended")
+            if r.startswith(":") :
+                return r
+            # end of its output for now
+            self.clock.sleep(self.tick)
+            self.write('T\n')
+            return None
+
+    def startreader(self) : # start a thread to continuously read into a queue
+        if (self.process == None) : self.connect()
+        self.reader = linkreader.LinkReader(self.readframe, self.queuesize)
+        self.reader.start()
+        return
+
     def close(self) :
+        if (self.reader != None) :
+            self.reader.stop()
+            self.reader = None
         self.process.kill()
         self.process.wait()
         return
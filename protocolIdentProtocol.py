@@ -8,10 +8,42 @@ OpenLCB ProtocolIdentificationProtocol message
 
 import connection as connection
 import canolcbutils
+import quiescence
 
 def makeframe(alias, dest) :
     body = [(dest>>8)&0xFF, dest&0xFF]
     return canolcbutils.makeframestring(0x19828000+alias,body)
+
+# (byte, bit, name) of each protocol in the reply, bytes counted after the address
+protocols = [
+    (0, 0x80, "Protocol Identification"),
+    (0, 0x40, "Datagram Protocol"),
+    (0, 0x20, "Stream Protocol"),
+    (0, 0x10, "Memory Configuration Protocol"),
+    (0, 0x08, "Reservation Protocol"),
+    (0, 0x04, "Event Exchange (P/C) Protocol"),
+    (0, 0x02, "Identification Protocol"),
+    (0, 0x01, "Teaching/Learning Protocol"),
+    (1, 0x80, "Remote Button Protocol"),
+    (1, 0x40, "Abbreviated Default CDI Protocol"),
+    (1, 0x20, "Display Protocol"),
+    (1, 0x10, "Simple Node Information Protocol"),
+    (1, 0x08, "Configuration Description Information"),
+    (1, 0x04, "Traction Control Protocol"),
+    (1, 0x02, "Function Description Information"),
+    (1, 0x01, "DCC Command Station Protocol"),
+    (2, 0x80, "SimpleTrain Node Information"),
+    (2, 0x40, "Function Configuration"),
+    (2, 0x20, "Firmware Upgrade Protocol"),
+    (2, 0x10, "Firmware Upgrade Active"),
+]
+
+'''
+@param value protocol bytes of a Protocol Support Reply, without the address
+@return names of the protocols the node supports
+'''
+def names(value) :
+    return [name for byte, bit, name in protocols if byte < len(value) and (value[byte] & bit) != 0]
     
 from optparse import OptionParser
 
@@ -75,26 +107,7 @@ def test(alias, dest, connection, verbose) :
     if (verbose) : 
         print "  Node supports:"
         value = canolcbutils.bodyArray(reply)
-        if (value[2] & 0x80) != 0 : print "      Protocol Identification"
-        if (value[2] & 0x40) != 0 : print "      Datagram Protocol"
-        if (value[2] & 0x20) != 0 : print "      Stream Protocol"
-        if (value[2] & 0x10) != 0 : print "      Memory Configuration Protocol"
-        if (value[2] & 0x08) != 0 : print "      Reservation Protocol"
-        if (value[2] & 0x04) != 0 : print "      Event Exchange (P/C) Protocol"
-        if (value[2] & 0x02) != 0 : print "      Identification Protocol"
-        if (value[2] & 0x01) != 0 : print "      Teaching/Learning Protocol"
-        if (value[3] & 0x80) != 0 : print "      Remote Button Protocol"
-        if (value[3] & 0x40) != 0 : print "      Abbreviated Default CDI Protocol"
-        if (value[3] & 0x20) != 0 : print "      Display Protocol"
-        if (value[3] & 0x10) != 0 : print "      Simple Node Information Protocol"
-        if (value[3] & 0x08) != 0 : print "      Configuration Description Information"
-        if (value[3] & 0x04) != 0 : print "      Traction Control Protocol"
-        if (value[3] & 0x02) != 0 : print "      Function Description Information"
-        if (value[3] & 0x01) != 0 : print "      DCC Command Station Protocol"
-        if (value[4] & 0x80) != 0 : print "      SimpleTrain Node Information"
-        if (value[4] & 0x40) != 0 : print "      Function Configuration"
-        if (value[4] & 0x20) != 0 : print "      Firmware Upgrade Protocol"
-        if (value[4] & 0x10) != 0 : print "      Firmware Upgrade Active"
+        for name in names(value[2:]) : print "     ", name
 
     if (verbose) :
         print "  not addressed, expect no reply"
@@ -102,7 +115,7 @@ def test(alias, dest, connection, verbose) :
     body = [(alias>>8)&0xFF, alias&0xFF]
     expect = canolcbutils.makeframestring(0x19668000 + dest, body)
     expect = expect[:-1]
-    reply = connection.network.expect(startswith=expect)
+    reply = quiescence.expect(connection.network, startswith=expect)
     if (reply != None ) : 
         print "Unexpected reply received to request to different node ", reply
         return 1
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+'''
+Adaptive quiescence detection
+
+Many checks end by waiting to confirm that nothing (more) arrives.
+Rather than always waiting the link's full timeout for that, each
+link measures the round-trip time from a send to the first frame that
+comes back from the node it was sent to (from any node, for a global
+send), and the checks wait a silence window derived from those
+measurements:
+
+    window = max(floor, margin * longest round trip,
+                 mean + factor * standard deviation)
+
+capped at the link's timeout.  Until enough round trips have been
+seen, the window is the full timeout.
+
+Tests use receive() and expect() here in place of the link's own
+methods when they are waiting for silence:
+
+    reply = quiescence.expect(connection.network, startswith=":X19170")
+    if reply != None : (error, got a reply that shouldn't have come)
+
+'''
+
+import math
+
+class Quiescence :
+    def __init__(self) :
+        self.enabled = True
+        self.floor = 0.010      # shortest window, seconds
+        self.margin = 3.0       # times the longest round trip seen
+        self.factor = 6.0       # standard deviations above the mean
+        self.minimum = 5        # round trips needed before adapting
+        self.pending = {}       # dest alias, or None for global -> time of the earliest unanswered send
+        self.reset()
+        self.clear()
+        return
+
+    # forget the round-trip measurements
+    def reset(self) :
+        self.samples = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.longest = 0.0
+        return
+
+    # clear the silence accounting used for reports
+    def clear(self) :
+        self.checks = 0
+        self.waited = 0.0
+        self.fixed = 0.0
+        return
+
+    # the link sent a frame
+    def sent(self, time, frame=None) :
+        source, dest = aliases(frame)
+        if dest not in self.pending : self.pending[dest] = time
+        return
+
+    '''
+    The link received a frame
+    @param time when it arrived; a frame that arrived before the
+    send it would answer was already on its way, and isn't a reply
+    '''
+    def received(self, time, frame=None) :
+        source, dest = aliases(frame)
+        if source in self.pending and source != None :
+            key = source
+        elif None in self.pending :
+            key = None
+        else :
+            return
+        if time < self.pending[key] : return
+        rtt = time-self.pending.pop(key)
+        # running mean and variance
+        self.samples = self.samples + 1
+        delta = rtt-self.mean
+        self.mean = self.mean+delta/self.samples
+        self.m2 = self.m2+delta*(rtt-self.mean)
+        if rtt > self.longest : self.longest = rtt
+        return
+
+    # the link timed out, so the sends so far aren't getting a reply
+    def expired(self) :
+        self.pending = {}
+        return
+
+    def deviation(self) :
+        if self.samples < 2 : return 0.0
+        return math.sqrt(self.m2/(self.samples-1))
+
+    '''
+    @param timeout the link's timeout, the longest window allowed
+    @return how long to wait to be sure nothing is coming
+    '''
+    def window(self, timeout) :
+        if not self.enabled or self.samples < self.minimum :
+            return timeout
+        w = max(self.floor, self.margin*self.longest, self.mean+self.factor*self.deviation())
+        return min(w, timeout)
+
+    '''
+    @return a one-line description of the silence checks since the last
+    report, and of the round-trip measurements; clears the former.
+    '''
+    def report(self) :
+        result = "  "+str(self.checks)+" silence checks waited "+("%.3f" % self.waited) \
+            +" sec instead of "+("%.3f" % self.fixed)+" sec; round trip " \
+            +("%.1f" % (self.mean*1000))+" +/- "+("%.1f" % (self.deviation()*1000)) \
+            +" msec, longest "+("%.1f" % (self.longest*1000))+" msec, over " \
+            +str(self.samples)+" samples"
+        self.clear()
+        return result
+
+'''
+@param frame GridConnect frame string, or None
+@return (source alias, dest alias) of an OpenLCB frame, with dest
+None if it's not addressed; (None, None) if it's not one
+'''
+def aliases(frame) :
+    if frame == None or not frame.startswith(":X") : return None, None
+    try :
+        header = int(frame[2:10], 16)
+        kind = (header >> 24) & 0x7
+        if kind == 1 :
+            if (header >> 12) & 0x008 == 0 : return header & 0xFFF, None
+            return header & 0xFFF, int(frame[11:15], 16) & 0xFFF
+        if 2 <= kind <= 5 : return header & 0xFFF, (header >> 12) & 0xFFF
+    except ValueError :
+        pass
+    return None, None
+
+'''
+Receive, waiting no longer than the silence window.
+@param network the link
+@return frame, or None if the bus stayed quiet
+'''
+def receive(network) :
+    return quietly(network, None)
+
+'''
+Expect a frame, waiting no longer than the silence window.
+Takes the same criteria as the links' expect().
+@param network the link
+@return matching frame, or None if none arrived
+'''
+def expect(network, exact=None, startswith=None, data=None) :
+    return quietly(network, (exact, startswith, data))
+
+def quietly(network, criteria) :
+    q = getattr(network, "quiescence", None)
+    timeout = network.timeout
+    if q != None :
+        window = q.window(timeout)
+    else :
+        window = timeout
+    start = network.clock.time()
+    network.timeout = window
+    try :
+        if criteria == None :
+            reply = network.receive()
+        else :
+            exact, startswith, data = criteria
+            reply = network.expect(exact=exact, startswith=startswith, data=data, timeout=window)
+    finally :
+        network.timeout = timeout
+    if q != None :
+        q.checks = q.checks + 1
+        q.waited = q.waited+network.clock.time()-start
+        q.fixed = q.fixed+timeout
+    return reply
+
+def main():
+    import random
+    q = Quiescence()
+    now = 0.0
+    for i in range(100) :
+        q.sent(now, ":X19488123N0456;")
+        now = now + random.gauss(0.005, 0.001)
+        q.received(now, ":X19668456N0123;")
+        now = now + 0.1
+    print "window", q.window(1.0), "sec instead of 1.0"
+    print q.report()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+'''
+Play a captured trace back as if it were a link
+
+Frames from a trace file (see tracefile.py) are returned by receive()
+at their captured times, scaled by speed: 1 for real time, 10 for ten
+times as fast, 0 for as fast as they can be read.  Frames sent to the
+link are dropped (printed if verbose).  The trace is read one block at
+a time, so captures of any length can be played.
+
+    network = replayolcblink.ReplayOlcbLink("bus.trc")
+    network.speed = 0
+
+'''
+
+import canolcbutils
+import tracefile
+import linkclock
+
+class ReplayOlcbLink :
+    def __init__(self, filename=None) :
+        # defaults (generally overridden by system-wide defaults elsewhere)
+        self.filename = filename
+        self.speed = 1.0       # 1 for captured timing, 0 for no waiting
+        self.start = None      # only frames from this many seconds in
+        self.end = None        # and up to this many
+        self.timeout = 1.0
+        self.verbose = False
+        self.startdelay = 0
+        self.reader = None
+        self.frames = None
+        self.pending = None    # next (time, frame) from the trace
+        self.clock = linkclock.realclock
+        return
+
+    def connect(self) :
+        # if verbose, print
+        if (self.verbose) : print "   replay ",self.filename
+        self.reader = tracefile.TraceReader(self.filename)
+        self.frames = self.reader.frames(self.start, self.end)
+        self.pending = next(self.frames, None)
+        self.began = self.clock.time()
+        if self.pending != None :
+            self.first = self.pending[0]
+        return
+
+    def send(self, frame) :
+        if (self.reader == None) : self.connect()
+
+        # if verbose, print
+        if (self.verbose) : print "   send    ",frame
+        return
+
+    def receive(self) : # returns frame or None on timeout
+        if (self.reader == None) : self.connect()
+
+        # if verbose, print
+        if (self.verbose) : print "   receive ",
+
+        if self.pending == None :
+            # end of the trace
+            self.clock.sleep(self.timeout)
+            if (self.verbose) : print "<none>" # blank line to show delay?
+            return None
+        when, frame = self.pending
+        if self.speed > 0 :
+            wait = self.began+(when-self.first)/self.speed-self.clock.time()
+            if wait > self.timeout :
+                self.clock.sleep(self.timeout)
+                if (self.verbose) : print "<none>" # blank line to show delay?
+                return None
+            self.clock.sleep(wait)
+        self.pending = next(self.frames, None)
+        if (self.verbose) : print frame
+        return frame
+
+    '''
+    Continue receiving data until the we get the expected result or timeout.
+    @param exact if != None, look for result with exact string
+    @param startswith if != None, look for result starting with string
+    @param data if != None, tuple of data bytes to match
+    @param timeout timeout in seconds, if timeout != 0, return None on timeout
+    @return resulting message on success, None on timeout
+    '''
+    def expect(self, exact=None, startswith=None, data=None, timeout=1) :
+        start = self.clock.time()
+        while (True) :
+            result = self.receive()
+            if (result == None) :
+                if (self.verbose) :
+                    print "Timeout"
+                return None
+            if (data != None) :
+                if canolcbutils.bodyArray(result) == list(data) :
+                    return result
+            elif (exact != None) :
+                if (result == exact) :
+                    return result
+            elif (startswith != None) :
+                if (result.startswith(startswith)) :
+                    return result
+            else :
+                return result
+
+            if (timeout != 0) :
+                if (self.clock.time() > (start + timeout)) :
+                    if (self.verbose) :
+                        print "Timeout"
+                    return None
+
+    def close(self) :
+        if (self.reader != None) :
+            self.reader.close()
+            self.reader = None
+        return
+
+def usage() :
+    print ""
+    print "Called standalone, plays back a trace file, printing the frames."
+    print ""
+    print "valid usages (default values):"
+    print "  python replayolcblink.py bus.trc"
+    print "  python replayolcblink.py -s 10 bus.trc"
+    print ""
+    print "-s --speed 1 for captured timing, 10 for ten times faster, 0 for no waiting"
+
+import getopt, sys
+
+def main():
+    speed = 1.0
+    try:
+        opts, remainder = getopt.getopt(sys.argv[1:], "s:", ["speed="])
+    except getopt.GetoptError, err:
+        # print help information and exit:
+        print str(err) # will print something like "option -a not recognized"
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-s", "--speed"):
+            speed = float(arg)
+        else:
+            assert False, "unhandled option"
+    if len(remainder) != 1 :
+        usage()
+        sys.exit(2)
+
+    network = ReplayOlcbLink(remainder[0])
+    network.speed = speed
+    while network.pending != None or network.reader == None :
+        frame = network.receive()
+        if frame != None : print frame
+    network.close()
+
+if __name__ == '__main__':
+    main()
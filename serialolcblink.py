@@ -9,6 +9,10 @@ Note: At 230400, requires CAN2USBino version 2 or later.
 import serial
 import time
 
+import linkreader
+import linkclock
+import quiescence
+
 class SerialOlcbLink :
     def __init__(self) :
         
@@ -20,6 +24,11 @@ class SerialOlcbLink :
         self.parallel = False
         self.startdelay = 0    # set to 12 if your hardware resets on connection
         self.ser = None
+        self.threaded = False  # if True, read in a background thread
+        self.queuesize = 10000 # frames held when threaded
+        self.reader = None
+        self.clock = linkclock.realclock
+        self.quiescence = quiescence.Quiescence() # round trips to the node
         return
     
     def connect(self) :
@@ -35,6 +44,8 @@ class SerialOlcbLink :
         self.ser.dsrdtr = False
         self.ser.setDTR(True)
         self.ser.setRTS(True)
+        # not set by the reader thread; receive() updates it when unthreaded
+        self.ser.timeout = self.timeout
         
         # from http://bytes.com/topic/python/answers/170478-uart-parity-setting-mark-space-using-pyserial
         if self.speed == 230400 and not self.parallel :
@@ -50,7 +61,7 @@ class SerialOlcbLink :
         # after (possible) reset due to serial startup
         if self.startdelay > 0 :
             if self.verbose : print "   waiting", self.startdelay, "seconds for adapter restart"
-            time.sleep(self.startdelay)
+            self.clock.sleep(self.startdelay)
             # dump all messages
             while self.ser.inWaiting() > 0 :
                 self.ser.readline()
@@ -71,30 +82,58 @@ class SerialOlcbLink :
             tframe = tframe+";;"
         # send
         self.ser.write(tframe)
+        self.quiescence.sent(self.clock.time(), frame)
         
         return
         
     def receive(self) : # returns frame
+        if (self.reader != None and not self.reader.follow(self.threaded)) : self.reader = None
+        if (self.threaded or self.reader != None) :
+            if (self.reader == None) : self.startreader()
+            r = self.reader.receive(self.timeout, self.verbose)
+            if (r == None) :
+                self.quiescence.expired()
+            else :
+                self.quiescence.received(self.reader.lasttime, r)
+            return r
+
         if (self.ser == None) : self.connect()
         
         # if verbose, print
         if (self.verbose) : print "   receive ",
             
         self.ser.timeout = self.timeout
-        line = "";
+        r = self.readframe()
+        # timeout returns None
+        if r == None : 
+            self.quiescence.expired()
+            if (self.verbose) : print "<none>" # blank line to show delay?
+            return None
+        self.quiescence.received(self.clock.time(), r)
+        # if verbose, display what's received 
+        if (self.verbose) : print r.replace("\x0A", "").replace("\x0D", "")
+        return r       
+
+    def readframe(self) : # returns frame without printing, None on timeout
         r = self.ser.readline()
         # remove Xoff/Xon characters if present
         r = r.replace("\x11", "")
         r = r.replace("\x13", "")
         # timeout returns ""
         if r == "" : 
-            if (self.verbose) : print "<none>" # blank line to show delay?
             return None
-        # if verbose, display what's received 
-        if (self.verbose) : print r.replace("\x0A", "").replace("\x0D", "")
-        return r       
+        return r
+
+    def startreader(self) : # start a thread to continuously read into a queue
+        if (self.ser == None) : self.connect()
+        self.reader = linkreader.LinkReader(self.readframe, self.queuesize)
+        self.reader.start()
+        return
 
     def close(self) :
+        if (self.reader != None) :
+            self.reader.stop()
+            self.reader = None
         return
 
 import getopt, sys
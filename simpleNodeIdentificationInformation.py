@@ -7,11 +7,35 @@ OpenLCB SimpleNodeIdentificantInformation message
 
 import connection as connection
 import canolcbutils
+import quiescence
 
 def makeframe(alias, dest) :
     body = [(dest>>8)&0xFF, dest&0xFF]
     return canolcbutils.makeframestring(0x19DE8000+alias,body)
-    
+
+# names of the strings in a reply, in order
+fields = ["manufacturer", "model", "hardwareVersion", "softwareVersion", "userName", "userComment"]
+
+'''
+Split reply content (the data of the reply frames, without
+the addresses, run together) into its strings.
+@return (dictionary of the strings received, True if the content is complete)
+'''
+def strings(content) :
+    result = {}
+    i = 0
+    for part, count in ((0, 4), (4, 2)) :
+        if i >= len(content) : return result, False
+        i = i+1   # version byte
+        for k in range(part, part+count) :
+            end = content.find("\0", i)
+            if end < 0 :
+                result[fields[k]] = content[i:]
+                return result, False
+            result[fields[k]] = content[i:end]
+            i = end+1
+    return result, True
+
 def usage() :
     print ""
     print "Called standalone, will send one CAN Simple Node Identificant Information (addressed) message"
@@ -131,7 +155,7 @@ def test(alias, dest, connection, verbose) :
 
     if verbose : print "  address other node, expect no reply"
     connection.network.send(makeframe(alias, (~dest)&0xFFF))
-    reply = connection.network.receive()
+    reply = quiescence.receive(connection.network)
     if reply != None : 
         print "Unexpected reply received ", reply
         
@@ -0,0 +1,499 @@
+#!/usr/bin/env python
+'''
+A simulated OpenLCB node for the virtual CAN bus
+
+Implements enough of the standards to run the test suite against:
+ * Alias allocation (CID/RID/AMD), AME and alias conflict handling
+ * Verify Node ID, global and addressed
+ * Protocol Identification and Simple Node Information
+ * Event identification, including ranges
+ * Datagrams, with a configurable number of receive buffers, and
+   a latency before answering them that holds the buffer
+ * Memory configuration: options, address space info, read and write
+   of the CDI (0xFF), all-memory (0xFE) and configuration (0xFD) spaces
+ * Optional Interaction Rejected for unknown addressed MTIs
+
+Everything is configured through attributes, set before attaching
+the node to a bus:
+
+    node = simulatednode.SimulatedNode([2,3,4,5,6,1], 0xDDD)
+    node.produced = [[2,3,4,5,6,1,0,1]]
+    node.userName = "Test node"
+    network.bus.attach(node)
+
+By default the node is already initialized when attached, as if it
+had started up before the test program connected; call restart()
+to run the startup sequence.
+
+@see virtualolcblink.py
+'''
+
+import canolcbutils
+
+# Datagram error codes
+TEMPORARY_BUFFER_UNAVAILABLE = 0x2020
+TEMPORARY_OUT_OF_ORDER = 0x2040
+PERMANENT_NOT_IMPLEMENTED = 0x1040
+PERMANENT_UNKNOWN_COMMAND = 0x1041
+PERMANENT_UNKNOWN_MTI = 0x1043
+
+# Addressed MTIs that are replies, and so never get rejected
+replyMti = [0x068, 0x0A8, 0x668, 0xA08, 0xA28, 0xA48]
+
+CDI = '''<?xml version="1.0"?>
+<cdi xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:noNamespaceSchemaLocation="http://openlcb.org/schema/cdi/1/1/cdi.xsd">
+<identification>
+<manufacturer>OpenLCB</manufacturer>
+<model>Simulated Node</model>
+<hardwareVersion>1.0</hardwareVersion>
+<softwareVersion>1.0</softwareVersion>
+</identification>
+<acdi/>
+<segment space="253" origin="0">
+<name>Settings</name>
+<group>
+<name>Identification</name>
+<string size="32"><name>User Name</name></string>
+<string size="32"><name>User Description</name></string>
+</group>
+<group replication="2">
+<name>Inputs</name>
+<repname>Input</repname>
+<eventid><name>Activated</name></eventid>
+<eventid><name>Deactivated</name></eventid>
+</group>
+</segment>
+</cdi>
+'''
+
+'''
+Compute the next alias candidate using the standard
+pseudo-random generator, seeded with the node ID.
+@param seed [lfsr1, lfsr2] generator state, updated in place
+'''
+def nextalias(seed) :
+    lfsr1, lfsr2 = seed
+    temp1 = ((lfsr1<<9) | ((lfsr2>>15)&0x1FF)) & 0xFFFFFF
+    temp2 = (lfsr2<<9) & 0xFFFFFF
+    lfsr2 = lfsr2 + temp2 + 0x7A4BA9
+    lfsr1 = lfsr1 + temp1 + 0x1B0CA3
+    lfsr1 = (lfsr1 & 0xFFFFFF) + ((lfsr2 & 0xFF000000) >> 24)
+    lfsr2 = lfsr2 & 0xFFFFFF
+    seed[0] = lfsr1
+    seed[1] = lfsr2
+    return (lfsr1 ^ lfsr2 ^ (lfsr1>>12) ^ (lfsr2>>12)) & 0xFFF
+
+class SimulatedNode :
+    def __init__(self, nodeID, alias=None) :
+        self.nodeID = list(nodeID)
+        self.alias = alias              # preferred, then current, alias
+        self.bus = None
+        self.permitted = True           # False while reserving an alias
+        self.generation = 0             # counts alias allocations
+        value = 0
+        for b in self.nodeID : value = (value<<8)+b
+        self.seed = [value>>24, value&0xFFFFFF]
+        if self.alias == None : self.alias = self.newalias()
+
+        # Protocol Identification: PIP, Datagram, Memory Config, Event Exchange;
+        # SNIP, CDI
+        self.protocols = [0xD4, 0x18, 0x00, 0x00, 0x00, 0x00]
+
+        # Simple Node Information
+        self.manufacturer = "OpenLCB"
+        self.model = "Simulated Node"
+        self.hardwareVersion = "1.0"
+        self.softwareVersion = "1.0"
+        self.userName = "Simulated"
+        self.userComment = "Virtual bus node"
+
+        # Events, as lists of 8 bytes; ranges as (base, mask) 8-byte lists
+        self.produced = [self.nodeID+[0,1], self.nodeID+[0,2]]
+        self.consumed = [self.nodeID+[0,3], self.nodeID+[0,4]]
+        self.producerRanges = []
+        self.consumerRanges = []
+
+        # Datagrams
+        self.buffers = 1        # datagram receive buffers
+        self.latency = 0.0      # seconds to answer a datagram, holding its buffer
+        self.partial = {}       # source alias -> datagram content so far
+        self.pending = {}       # (source alias, count) -> frames of an answer waiting out the latency
+        self.answers = 0        # counts answers delayed by the latency
+        self.held = None        # list collecting the frames sent, while an answer is worked out
+        self.rejected = set()   # sources whose datagram didn't get a buffer
+        self.replies = {}       # dest alias -> last datagram sent, until acknowledged
+
+        # Memory configuration spaces
+        self.spaces = {
+            0xFF : bytearray(CDI+"\0")+bytearray([0xFF]*100),   # padded past the null, as many nodes are
+            0xFE : bytearray(range(256)),
+            0xFD : bytearray(128),
+        }
+        self.readonly = [0xFF, 0xFE]
+        return
+
+    def newalias(self) :
+        alias = 0
+        while alias == 0 :
+            alias = nextalias(self.seed)
+        return alias
+
+    def send(self, header, body) :
+        if self.held != None :
+            self.held.append((header, body))
+            return
+        self.bus.send(canolcbutils.makeframestring(header, body), self)
+        return
+
+    def sendaddressed(self, mti, dest, body) :
+        self.send(0x19000000+(mti<<12)+self.alias, [(dest>>8)&0xFF, dest&0xFF]+body)
+        return
+
+    '''
+    Go through the full startup sequence: reserve an alias,
+    announce it, and identify events.
+    '''
+    def restart(self) :
+        self.partial = {}
+        self.pending = {}
+        self.rejected = set()
+        self.replies = {}
+        self.reserve(self.alias, self.initialized)
+        return
+
+    '''
+    Send CIDs for an alias, and after 200 msec reserve it.
+    @param then function to call once the alias is in use
+    '''
+    def reserve(self, alias, then) :
+        self.alias = alias
+        self.permitted = False
+        self.generation = self.generation + 1
+        generation = self.generation
+        n = self.nodeID
+        self.send(0x17000000+(((n[0]<<4)+(n[1]>>4))<<12)+alias, None)
+        self.send(0x16000000+((((n[1]&0xF)<<8)+n[2])<<12)+alias, None)
+        self.send(0x15000000+(((n[3]<<4)+(n[4]>>4))<<12)+alias, None)
+        self.send(0x14000000+((((n[4]&0xF)<<8)+n[5])<<12)+alias, None)
+        def done() :
+            if generation != self.generation : return  # superseded
+            self.send(0x10700000+self.alias, None)
+            self.send(0x10701000+self.alias, self.nodeID)
+            self.permitted = True
+            if then != None : then()
+        self.bus.schedule(0.200, done)
+        return
+
+    def initialized(self) :
+        self.send(0x19100000+self.alias, self.nodeID)
+        self.identifyevents()
+        return
+
+    def identifyevents(self) :
+        for e in self.consumed :
+            self.send(0x194C7000+self.alias, e)
+        for e in self.consumerRanges :
+            self.send(0x194A4000+self.alias, rangeevent(e))
+        for e in self.produced :
+            self.send(0x19547000+self.alias, e)
+        for e in self.producerRanges :
+            self.send(0x19524000+self.alias, rangeevent(e))
+        return
+
+    '''
+    Process one frame seen on the bus
+    '''
+    def receive(self, frame) :
+        frame = frame.strip()
+        if not frame.startswith(":X") : return  # e.g. standard frames
+        n = frame.find('N')
+        header = int(frame[2:n], 16)
+        body = list(bytearray(frame[n+1:frame.find(';')].decode('hex')))
+        source = header & 0xFFF
+
+        if source == self.alias :
+            if not self.permitted :
+                # lost this one while checking it, try another
+                self.reserve(self.newalias(), None)
+                return
+            if (header & 0x0F000000) >= 0x04000000 and (header & 0x08000000) == 0 :
+                # CID: defend the alias
+                self.send(0x10700000+self.alias, None)
+                return
+            # anything else is a conflict: drop the alias and get a new one
+            self.send(0x10703000+self.alias, self.nodeID)
+            self.partial = {}
+            self.pending = {}
+            self.rejected = set()
+            self.reserve(self.newalias(), None)
+            return
+        if not self.permitted : return
+
+        if (header & 0x08000000) == 0 :
+            self.control(header, source, body)
+        elif (header & 0x07000000) == 0x01000000 :
+            self.message((header >> 12) & 0xFFF, source, body)
+        elif (header & 0x07000000) <= 0x05000000 :
+            if ((header >> 12) & 0xFFF) == self.alias :
+                self.datagram((header >> 24) & 0x7, source, body)
+        return
+
+    def control(self, header, source, body) :
+        field = (header >> 12) & 0xFFF
+        if (header & 0x07000000) != 0 :
+            return  # CID from another node
+        if field == 0x702 :
+            # AME
+            if len(body) == 0 or body == self.nodeID :
+                self.send(0x10701000+self.alias, self.nodeID)
+        elif field == 0x701 or field == 0x703 :
+            # AMD, AMR: that alias is starting over, drop what it was sending us
+            if source in self.partial : del self.partial[source]
+            for key in self.pending.keys() :
+                if key[0] == source : del self.pending[key]
+            self.rejected.discard(source)
+        return
+
+    def message(self, mti, source, body) :
+        if (mti & 0x008) != 0 :
+            # addressed
+            if len(body) < 2 : return
+            if ((body[0]&0x0F)<<8)+body[1] != self.alias : return
+            body = body[2:]
+            if mti == 0x488 :
+                # Verify Node ID addressed, answered whatever the ID in it
+                self.send(0x19170000+self.alias, self.nodeID)
+            elif mti == 0x828 :
+                self.sendaddressed(0x668, source, self.protocols)
+            elif mti == 0xDE8 :
+                self.snip(source)
+            elif mti == 0x968 :
+                self.identifyevents()
+            elif mti == 0xA28 :
+                # Datagram Received OK
+                if source in self.replies : del self.replies[source]
+            elif mti == 0xA48 :
+                # Datagram Rejected, resend if temporary
+                if source in self.replies :
+                    if len(body) >= 2 and (body[0] & 0x20) != 0 :
+                        self.senddatagram(source, self.replies[source])
+                    else :
+                        del self.replies[source]
+            elif mti in replyMti :
+                pass
+            else :
+                self.sendaddressed(0x068, source,
+                    [(PERMANENT_UNKNOWN_MTI>>8)&0xFF, PERMANENT_UNKNOWN_MTI&0xFF, (mti>>8)&0xFF, mti&0xFF])
+        elif mti == 0x490 :
+            # Verify Node ID global
+            if len(body) == 0 or body == self.nodeID :
+                self.send(0x19170000+self.alias, self.nodeID)
+        elif mti == 0x970 :
+            self.identifyevents()
+        elif mti == 0x8F4 :
+            # Identify Consumer
+            if body in self.consumed :
+                self.send(0x194C7000+self.alias, body)
+            for r in self.consumerRanges :
+                if inrange(body, r) : self.send(0x194A4000+self.alias, rangeevent(r))
+        elif mti == 0x914 :
+            # Identify Producer
+            if body in self.produced :
+                self.send(0x19547000+self.alias, body)
+            for r in self.producerRanges :
+                if inrange(body, r) : self.send(0x19524000+self.alias, rangeevent(r))
+        return
+
+    def snip(self, dest) :
+        content = [1]
+        for s in [self.manufacturer, self.model, self.hardwareVersion, self.softwareVersion] :
+            content = content+[ord(c) for c in s]+[0]
+        content = content+[1]
+        for s in [self.userName, self.userComment] :
+            content = content+[ord(c) for c in s]+[0]
+        while len(content) > 0 :
+            self.sendaddressed(0xA08, dest, content[0:6])
+            content = content[6:]
+        return
+
+    '''
+    Handle one datagram frame addressed to this node
+    @param kind 2 only, 3 first, 4 middle, 5 final frame
+    '''
+    def datagram(self, kind, source, body) :
+        if kind == 2 or kind == 3 :
+            if source in self.partial :
+                del self.partial[source]
+            self.rejected.discard(source)
+            if len(self.partial)+len(self.pending) >= self.buffers :
+                if kind == 2 :
+                    self.reject(source, TEMPORARY_BUFFER_UNAVAILABLE)
+                else :
+                    # tell them when they finish
+                    self.rejected.add(source)
+                return
+            if kind == 2 :
+                self.complete(source, body)
+            else :
+                self.partial[source] = body
+        elif kind == 4 :
+            if source in self.partial :
+                self.partial[source] = self.partial[source]+body
+        else :
+            if source in self.partial :
+                content = self.partial[source]+body
+                del self.partial[source]
+                self.complete(source, content)
+            elif source in self.rejected :
+                self.rejected.discard(source)
+                self.reject(source, TEMPORARY_BUFFER_UNAVAILABLE)
+            else :
+                self.reject(source, TEMPORARY_OUT_OF_ORDER)
+        return
+
+    def complete(self, source, content) :
+        if self.latency <= 0 :
+            self.process(source, content)
+            return
+        # work out the answer now, but send it when the latency is up;
+        # an acknowledgement saying a reply is coming goes at once
+        self.held = []
+        try :
+            self.process(source, content)
+        finally :
+            frames, self.held = self.held, None
+        if len(frames) > 0 and frames[0] == (0x19A28000+self.alias, [(source>>8)&0xFF, source&0xFF, 0x80]) :
+            self.send(*frames.pop(0))
+        self.answers = self.answers+1
+        key = (source, self.answers)
+        self.pending[key] = frames
+        def done() :
+            if self.pending.pop(key, None) is not frames : return  # dropped meanwhile
+            for header, body in frames : self.send(header, body)
+        self.bus.schedule(self.latency, done)
+        return
+
+    def reject(self, dest, code) :
+        self.sendaddressed(0xA48, dest, [(code>>8)&0xFF, code&0xFF])
+        return
+
+    def accept(self, dest, replypending) :
+        if replypending :
+            self.sendaddressed(0xA28, dest, [0x80])
+        else :
+            self.sendaddressed(0xA28, dest, [])
+        return
+
+    def senddatagram(self, dest, content) :
+        self.replies[dest] = content
+        base = self.alias+(dest<<12)
+        if len(content) <= 8 :
+            self.send(0x1A000000+base, content)
+            return
+        self.send(0x1B000000+base, content[0:8])
+        content = content[8:]
+        while len(content) > 8 :
+            self.send(0x1C000000+base, content[0:8])
+            content = content[8:]
+        self.send(0x1D000000+base, content)
+        return
+
+    '''
+    Act on a complete datagram
+    '''
+    def process(self, source, content) :
+        if len(content) < 2 or content[0] != 0x20 :
+            self.reject(source, PERMANENT_NOT_IMPLEMENTED)
+            return
+        command = content[1]
+        if command == 0x80 :
+            # Get Configuration Options
+            self.accept(source, True)
+            self.senddatagram(source, [0x20, 0x82, 0x40, 0x00, 0xE2, 0xFF, 0xFD])
+        elif command == 0x84 and len(content) >= 3 :
+            # Get Address Space Information
+            self.accept(source, True)
+            space = content[2]
+            if space in self.spaces :
+                top = len(self.spaces[space])-1
+                flags = 0
+                if space in self.readonly : flags = 0x01
+                self.senddatagram(source, [0x20, 0x87, space,
+                    (top>>24)&0xFF, (top>>16)&0xFF, (top>>8)&0xFF, top&0xFF, flags])
+            else :
+                self.senddatagram(source, [0x20, 0x86, space, 0, 0, 0, 0, 0x01])
+        elif (command & 0xF0) == 0x40 or (command & 0xF0) == 0x00 :
+            self.memory(source, content)
+        else :
+            self.reject(source, PERMANENT_UNKNOWN_COMMAND)
+        return
+
+    def memory(self, source, content) :
+        command = content[1]
+        if len(content) < 7 :
+            self.reject(source, PERMANENT_UNKNOWN_COMMAND)
+            return
+        address = (content[2]<<24)+(content[3]<<16)+(content[4]<<8)+content[5]
+        if (command & 0x03) == 0 :
+            space = content[6]
+            header = content[1:7]
+            rest = content[7:]
+        else :
+            space = 0xFC+(command & 0x03)
+            header = content[1:6]
+            rest = content[6:]
+        if not space in self.spaces :
+            self.reject(source, PERMANENT_UNKNOWN_COMMAND)
+            return
+        memory = self.spaces[space]
+        if (command & 0xF0) == 0x40 :
+            # read
+            if len(rest) < 1 :
+                self.reject(source, PERMANENT_UNKNOWN_COMMAND)
+                return
+            self.accept(source, True)
+            reply = [0x20, command | 0x10]+header[1:]
+            if address >= len(memory) :
+                # address out of bounds
+                reply[1] = command | 0x18
+                self.senddatagram(source, reply+[0x10, 0x80])
+                return
+            count = min(rest[0], 64)
+            self.senddatagram(source, reply+list(memory[address:address+count]))
+        else :
+            # write
+            if space in self.readonly or address+len(rest) > len(memory) :
+                self.reject(source, PERMANENT_UNKNOWN_COMMAND)
+                return
+            memory[address:address+len(rest)] = bytearray(rest)
+            self.accept(source, False)
+        return
+
+'''
+Make the event ID carried by a range-identified message
+@param r (base, mask) of the range, each as 8 bytes
+'''
+def rangeevent(r) :
+    base, mask = r
+    return [(b & ~m) | m for b, m in zip(base, mask)]
+
+def inrange(event, r) :
+    base, mask = r
+    for e, b, m in zip(event, base, mask) :
+        if (e & ~m) != (b & ~m) : return False
+    return True
+
+def main():
+    import virtualolcblink
+
+    # create a bus with one simulated node, and watch it start
+    network = virtualolcblink.VirtualOlcbLink()
+    node = network.bus.attach(SimulatedNode([2,3,4,5,6,1], 0xDDD))
+    network.verbose = True
+    network.connect()
+    node.restart()
+    while network.receive() != None :
+        continue
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+'''
+A snapshot of the network, kept in a file and refreshed incrementally
+
+For each node, by Node ID, a Snapshot keeps its alias, the protocols
+it supports, its Simple Node Information, the events it produces
+and consumes, and a hash of its CDI.  Taking all of that from every
+node means many requests and datagrams per node; refresh() instead
+starts from the snapshot saved by the last run and only asks again
+the nodes that are new, or that may have changed:
+
+ * the node now has a different alias, or
+ * its Initialization Complete, or an Alias Map Reset or Definition
+   with a different alias, was seen while the snapshot was watching
+   the link (see watch()), or
+ * its SNIP manufacturer, model or versions differ from the snapshot.
+
+So on a stable layout a refresh costs one census (see census.py) and
+one windowed round of SNIP requests (see harvest.py).  Nodes that no
+longer answer are dropped.
+
+    snap = snapshot.Snapshot()
+    snap.load("network.snapshot")
+    snap.refresh(connection.thisNodeAlias, connection)
+    snap.save("network.snapshot")
+
+'''
+
+import hashlib
+import json
+
+import connection as connection
+import canolcbutils
+import cdicache
+import census
+import eventindex
+import eventrange
+import harvest
+import identifyEventsAddressed
+import simpleNodeIdentificationInformation as snip
+
+# SNIP strings that identify what a node is running
+versions = ["manufacturer", "model", "hardwareVersion", "softwareVersion"]
+
+# event lists of a node, by (kind, is a range) as in eventindex.replies
+eventlists = {
+    (eventindex.PRODUCER, False) : "produced",
+    (eventindex.PRODUCER, True) : "producerRanges",
+    (eventindex.CONSUMER, False) : "consumed",
+    (eventindex.CONSUMER, True) : "consumerRanges",
+}
+
+def record(alias) :
+    return {"alias" : alias, "protocols" : [], "snip" : {}, "produced" : [], "consumed" : [],
+            "producerRanges" : [], "consumerRanges" : [], "cdi" : None, "stale" : True}
+
+class Snapshot :
+    def __init__(self) :
+        self.nodes = {}      # dotted node ID -> record
+        self.rescanned = []  # dotted node IDs asked again by the last refresh
+        self.elapsed = 0.0
+        return
+
+    def byalias(self) :
+        return dict([(node["alias"], nodeID) for nodeID, node in self.nodes.items()])
+
+    '''
+    Mark a node to be asked again at the next refresh
+    '''
+    def stale(self, nodeID) :
+        node = self.nodes.get(nodeID)
+        if node != None : node["stale"] = True
+        return
+
+    '''
+    Note one GridConnect frame string that may mean a node changed
+    '''
+    def observe(self, string) :
+        # Initialization Complete, AMD, AMR; the rest aren't parsed
+        if not (string.startswith(":X1910") or string.startswith(":X1070")) : return
+        try :
+            header = canolcbutils.headerValue(string)
+            data = canolcbutils.bodyArray(string)
+        except (ValueError, TypeError) :
+            return
+        prefix = header >> 12
+        alias = header & 0xFFF
+        if prefix in (0x19100, 0x19101, 0x10701) and len(data) == 6 :
+            nodeID = canolcbutils.dotted(data)
+            node = self.nodes.get(nodeID)
+            if node != None and (prefix != 0x10701 or node["alias"] != alias) : node["stale"] = True
+        elif prefix == 0x10703 :
+            self.stale(self.byalias().get(alias))
+        return
+
+    '''
+    Have every frame a link receives go through observe()
+    '''
+    def watch(self, network) :
+        receive = network.receive
+        def observed() :
+            frame = receive()
+            if frame != None : self.observe(frame)
+            return frame
+        network.receive = observed
+        return
+
+    '''
+    Bring the snapshot up to date with the network
+    @param alias alias of self
+    @param connection with the link to use
+    @param cdi False to not read the CDI of the nodes asked again
+    @return dotted node IDs of the nodes asked again
+    '''
+    def refresh(self, alias, connection, verbose=False, quiet=0.5, cdi=True) :
+        network = connection.network
+        receive = network.receive
+        self.watch(network)
+        start = network.clock.time()
+        try :
+            found = census.take(alias, None, network, verbose, quiet)
+            current = {}
+            for nodeID, aliases in found.bynode.items() :
+                current[canolcbutils.dotted(nodeID)] = aliases[0]
+            for nodeID in self.nodes.keys() :
+                if nodeID not in current :
+                    if verbose : print "  node", nodeID, "is gone"
+                    del self.nodes[nodeID]
+            for nodeID, a in current.items() :
+                node = self.nodes.get(nodeID)
+                if node == None :
+                    self.nodes[nodeID] = record(a)
+                elif node["alias"] != a :
+                    node["alias"] = a
+                    node["stale"] = True
+
+            # which of the others identify differently now
+            check = [node["alias"] for node in self.nodes.values() if not node["stale"]]
+            replies = harvest.Harvester(alias, network).run(check, (harvest.SNIP,))
+            names = self.byalias()
+            for a in check :
+                node = self.nodes[names[a]]
+                strings = replies[a]
+                if strings.get(harvest.SNIP) != "ok" and len(node["snip"]) == 0 : continue
+                if [strings.get(k) for k in versions] != [node["snip"].get(k) for k in versions] :
+                    node["stale"] = True
+
+            self.rescanned = sorted([nodeID for nodeID, node in self.nodes.items() if node["stale"]])
+            if verbose : print "  asking again", len(self.rescanned), "of", len(self.nodes), "nodes"
+            self.rescan(alias, connection, self.rescanned, verbose, quiet, cdi)
+        finally :
+            network.receive = receive
+        self.elapsed = network.clock.time()-start
+        return self.rescanned
+
+    '''
+    Ask nodes for everything in their records
+    @param nodeIDs dotted node IDs of the nodes to ask
+    '''
+    def rescan(self, alias, connection, nodeIDs, verbose=False, quiet=0.5, cdi=True) :
+        network = connection.network
+        dests = dict([(self.nodes[nodeID]["alias"], self.nodes[nodeID]) for nodeID in nodeIDs])
+        found = harvest.Harvester(alias, network).run(dests.keys())
+        for dest, node in dests.items() :
+            node["protocols"] = found[dest]["protocols"]
+            node["snip"] = dict([(k, v) for k, v in found[dest].items() if k in snip.fields])
+            for name in eventlists.values() : node[name] = []
+
+        # identify the events of all of them at once
+        timeout = network.timeout
+        network.timeout = quiet
+        try :
+            for dest in dests.keys() :
+                network.send(identifyEventsAddressed.makeframe(alias, dest))
+            while (True) :
+                reply = network.receive()
+                if reply == None : break
+                if not reply.startswith(":X19") : continue
+                node = dests.get(int(reply[7:10],16))
+                kind = eventindex.replies.get(int(reply[4:7],16))
+                data = bytearray(canolcbutils.bodyArray(reply))
+                if node == None or kind == None or len(data) != 8 : continue
+                node[eventlists[kind]].append("%016X" % eventindex.eventid(data))
+        finally :
+            network.timeout = timeout
+
+        for dest, node in dests.items() :
+            node["cdi"] = None
+            if cdi and "Configuration Description Information" in node["protocols"] :
+                content = cdicache.cache.read(alias, dest, connection, False, node["snip"])
+                if type(content) is int :
+                    if verbose : print "  CDI of %03X not read, error" % dest, content
+                else :
+                    node["cdi"] = hashlib.sha1(content).hexdigest()
+            node["stale"] = False
+        return
+
+    '''
+    @return an EventIndex of the events in the snapshot
+    '''
+    def index(self) :
+        result = eventindex.EventIndex()
+        for node in self.nodes.values() :
+            for (kind, isrange), name in eventlists.items() :
+                for event in node[name] :
+                    if isrange :
+                        first, last = eventrange.decode(int(event, 16))
+                        result.addrange(node["alias"], kind, first, last)
+                    else :
+                        result.add(node["alias"], kind, int(event, 16))
+        result.build()
+        return result
+
+    '''
+    Read a snapshot written by save(); a missing file is just an empty snapshot
+    '''
+    def load(self, filename) :
+        try :
+            self.nodes = json.load(open(filename))["nodes"]
+        except IOError :
+            return
+        return
+
+    def save(self, filename) :
+        out = open(filename, "w")
+        json.dump({"nodes" : self.nodes}, out, indent=1, sort_keys=True)
+        out.close()
+        return
+
+    def report(self) :
+        print "%-17s %-5s %-20s %-20s %-8s %-8s %s" % ("node ID", "alias", "manufacturer", "model",
+            "hardware", "software", "events")
+        for nodeID in sorted(self.nodes.keys()) :
+            node = self.nodes[nodeID]
+            strings = node["snip"]
+            print "%-17s %03X   %-20s %-20s %-8s %-8s %d" % (nodeID, node["alias"], strings.get("manufacturer", "-"),
+                strings.get("model", "-"), strings.get("hardwareVersion", "-"), strings.get("softwareVersion", "-"),
+                sum([len(node[name]) for name in eventlists.values()]))
+        print len(self.nodes), "nodes,", len(self.rescanned), "asked again, in %.3f sec" % self.elapsed
+        return
+
+def usage() :
+    print ""
+    print "Called standalone, brings a snapshot of the network up to date,"
+    print "asking again only the nodes that are new or may have changed"
+    print ""
+    print "Default connection detail taken from connection.py"
+    print ""
+    print "-a --alias source alias (default 0x%03X)" % connection.thisNodeAlias
+    print "-f --file snapshot file (default network.snapshot)"
+    print "-q --quiet seconds without a reply that end a sweep (default 0.5)"
+    print "-n --nocdi don't read the CDI of the nodes asked again"
+    print "-r --rescan ask every node again"
+    print "-l --list list every node"
+    print "-v verbose"
+    print "-V Very verbose"
+
+import getopt, sys
+
+def main():
+    # argument processing
+    alias = connection.thisNodeAlias
+    filename = "network.snapshot"
+    quiet = 0.5
+    cdi = True
+    rescan = False
+    listall = False
+    verbose = False
+    try:
+        opts, remainder = getopt.getopt(sys.argv[1:], "a:f:q:nrlvV", ["alias=", "file=", "quiet=", "nocdi", "rescan", "list"])
+    except getopt.GetoptError, err:
+        # print help information and exit:
+        print str(err) # will print something like "option -a not recognized"
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == "-v":
+            verbose = True
+        elif opt == "-V":
+            connection.network.verbose = True
+            verbose = True
+        elif opt in ("-a", "--alias"):
+            alias = int(arg, 0)
+        elif opt in ("-f", "--file"):
+            filename = arg
+        elif opt in ("-q", "--quiet"):
+            quiet = float(arg)
+        elif opt in ("-n", "--nocdi"):
+            cdi = False
+        elif opt in ("-r", "--rescan"):
+            rescan = True
+        elif opt in ("-l", "--list"):
+            listall = True
+        else:
+            assert False, "unhandled option"
+
+    snap = Snapshot()
+    if not rescan : snap.load(filename)
+    snap.refresh(alias, connection, verbose, quiet, cdi)
+    snap.save(filename)
+    if listall :
+        snap.report()
+    else :
+        print len(snap.nodes), "nodes,", len(snap.rescanned), "asked again, in %.3f sec" % snap.elapsed
+    connection.network.close()
+
+if __name__ == '__main__':
+    main()
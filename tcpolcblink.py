@@ -11,6 +11,10 @@ import socket
 import time
 
 import tcpolcbutils
+import gridconnect
+import linkreader
+import linkclock
+import quiescence
 
 class TcpToOlcbLink :
     def __init__(self) :
@@ -25,8 +29,12 @@ class TcpToOlcbLink :
         self.verbose = True
         self.startdelay = 0
         self.socket = None
-        self.rcvData = ""
-        self.rcvIndex = 0
+        self.parser = gridconnect.GridConnectParser()
+        self.threaded = False  # if True, read in a background thread
+        self.queuesize = 10000 # frames held when threaded
+        self.reader = None
+        self.clock = linkclock.realclock
+        self.quiescence = quiescence.Quiescence() # round trips to the node
         return
     
     def connect(self) :
@@ -35,12 +43,14 @@ class TcpToOlcbLink :
         
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.connect((self.host, self.port))
+        # not set by the reader thread; receive() updates it when unthreaded
+        self.socket.settimeout(self.timeout)
         
         # wait for link startup
         # after (possible) reset due to serial startup
         if self.startdelay > 0 :
             if self.verbose : print "   waiting", self.startdelay, "seconds for adapter restart"
-            time.sleep(self.startdelay)
+            self.clock.sleep(self.startdelay)
 
         return
         
@@ -53,53 +63,60 @@ class TcpToOlcbLink :
     
         # send
         self.socket.send(string)
+        self.quiescence.sent(self.clock.time(), string)
         
         return
         
-    # returns multiplet or None on error
-    #    transmitter
-    #    message (includes MTI)   
+    # returns frame or None on timeout
     def receive(self) : # returns frame
+        if (self.reader != None and not self.reader.follow(self.threaded)) : self.reader = None
+        if (self.threaded or self.reader != None) :
+            if (self.reader == None) : self.startreader()
+            result = self.reader.receive(self.timeout, self.verbose)
+            if (result == None) :
+                self.quiescence.expired()
+            else :
+                self.quiescence.received(self.reader.lasttime, result)
+            return result
+
         if (self.socket == None) : self.connect()
         
         self.socket.settimeout(self.timeout)
+        try:
+            result = self.readframe()
+        except EOFError, err:
+            result = None
+        if (result == None) :
+            self.quiescence.expired()
+            if (self.verbose) :
+                print "<none>" # blank line to show delay?
+            return None
+        self.quiescence.received(self.clock.time(), result)
 
-        if (self.rcvIndex >= len(self.rcvData)) :
-            self.rcvIndex = 0
-            self.rcvData = ""
-
-        result = ""
-        i = 0
-        while (True) :
-            if (len(self.rcvData) == 0) :
-                # get more data
-                try:
-                    self.rcvData = self.socket.recv(1024)
-                    self.rcvIndex = 0
-                except socket.timeout, err:
-                    if (self.verbose) :
-                        print "<none>" # blank line to show delay?
-                    return None
-            else :
-                # parse our data
-                while (True) :
-                    if (self.rcvData[self.rcvIndex] == ':') :
-                        result = ""
-                        i = 0
-                    result = result + self.rcvData[self.rcvIndex]
-                    if (self.rcvData[self.rcvIndex] == ';') :
-                        self.rcvIndex = self.rcvIndex + 1
-                        # if verbose, print
-                        if (self.verbose) :
-                            print "   receive",result
-                        return result
-                    i = i + 1
-                    self.rcvIndex = self.rcvIndex + 1
-                    if (self.rcvIndex >= len(self.rcvData)) :
-                        self.rcvIndex = 0
-                        self.rcvData = ""
-                        break
-        # shouldn't reach here
+        # if verbose, print
+        if (self.verbose) :
+            print "   receive",result
+        return result
+
+    # reads one frame without printing, returns None on timeout
+    def readframe(self) :
+        while (self.parser.available() == 0) :
+            # get more data
+            try:
+                data = self.socket.recv(4096)
+            except socket.timeout, err:
+                return None
+            if (len(data) == 0) :
+                raise EOFError("connection closed")
+            self.parser.feed(data)
+        return self.parser.next()
+
+    # start a thread to continuously read into a queue
+    def startreader(self) :
+        if (self.socket == None) : self.connect()
+        self.reader = linkreader.LinkReader(self.readframe, self.queuesize)
+        self.reader.start()
+        return
 
     '''
     Continue receiving data until the we get the expected result or timeout.
@@ -110,7 +127,7 @@ class TcpToOlcbLink :
     @return resulting message on success, None on timeout
     '''
     def expect(self, exact=None, startswith=None, data=None, timeout=1) :
-        start = time.time()
+        start = self.clock.time()
         while (True) :
             result = self.receive()
             if (data != None and result != None) :
@@ -132,12 +149,15 @@ class TcpToOlcbLink :
                 return result
 
             if (timeout != 0) :
-                if (time.time() > (start + timeout)) :
+                if (self.clock.time() > (start + timeout)) :
                     if (self.verbose) :
                         print "Timeout"
                     return None
 
     def close(self) :
+        if (self.reader != None) :
+            self.reader.stop()
+            self.reader = None
         return
 
 import sys
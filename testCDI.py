@@ -7,7 +7,9 @@ Read and check the Configuration Definition Information
 
 import connection as connection
 import canolcbutils
-import datagram
+import cdicache
+import cdischema
+import memoryconfig
     
 def usage() :
     print ""
@@ -18,6 +20,7 @@ def usage() :
     print "-a --alias source alias (default 0x"+hex(connection.thisNodeAlias).upper()+")"
     print "-d --dest dest alias (default 0x"+hex(connection.testNodeAlias).upper()+")"
     print "-t find destination alias automatically"
+    print "-x --xsd also check with xmllint against this CDI schema file, e.g. ../../specs/schema/cdi.xsd"
     print "-v verbose"
     print "-V Very verbose"
 
@@ -29,9 +32,10 @@ def main():
     dest = connection.testNodeAlias
     identifynode = False
     verbose = False
+    schema = None
     
     try:
-        opts, remainder = getopt.getopt(sys.argv[1:], "d:a:vVt", ["dest=", "alias="])
+        opts, remainder = getopt.getopt(sys.argv[1:], "d:a:x:vVt", ["dest=", "alias=", "xsd="])
     except getopt.GetoptError, err:
         # print help information and exit:
         print str(err) # will print something like "option -a not recognized"
@@ -49,6 +53,8 @@ def main():
             dest = int(arg)
         elif opt == "-t":
             identifynode = True
+        elif opt in ("-x", "--xsd"):
+            schema = arg
         else:
             assert False, "unhandled option"
 
@@ -56,50 +62,69 @@ def main():
         import getUnderTestAlias
         dest, nodeID = getUnderTestAlias.get(alias, None, verbose)
 
-    retval = test(alias, dest, connection, verbose)
+    retval = test(alias, dest, connection, verbose, schema)
     connection.network.close()
     exit(retval)
     
-def test(alias, dest, connection, verbose) :
+'''
+Read the CDI of a node
+@param check function(data) given each piece as it arrives, which
+returns False to stop reading, or None
+@return the CDI as a string, or an error code if it couldn't be read
+'''
+def read(alias, dest, connection, verbose, check=None) :
 
     # instead of checking the length of the address space (not cleanly required anyway)
     # this assumes a null-terminated string and reads until it gets the null
 
-    address = 0
-    result = ""
-    chunk = 16
-    done = False
-    
-    while True :    
-        # Read from CDI space
-        retval = datagram.sendOneDatagram(alias, dest, [0x20,0x43,(address>>24)&0xFF,(address>>16)&0xFF,(address>>8)&0xFF,address&0xFF,chunk], connection, verbose)
-        if retval != 0 :
-            return retval
-        # read data response
-        retval = datagram.receiveOneDatagram(alias, dest, connection, verbose)
-        if (type(retval) is int) : 
-            # pass error code up
-            return retval
-        if retval[0:2] != [0x20,0x53] :
-            print "Unexpected message instead of read reply datagram ", retval
-            return 3
-        for c in retval[6:] :
-            result = result+chr(c)
-            if c == 0 :
-                done = True
-                break;
-        if done : break
-        address = address + chunk
+    result = bytearray()
+    stopped = []
+    def stream(data) :
+        if check != None and not check(data) :
+            stopped.append(len(result))
+            return False
+        if 0 in data :
+            del result[len(result)-len(data)+data.index(0)+1:]
+            return False
+        return True
+    reader = memoryconfig.readSpace(alias, dest, 0xFF, 0, None, connection.network, result, stream)
+    if reader.error != 0 :
+        return reader.error
+    if len(stopped) > 0 :
+        if verbose : print "   Stopped reading CDI after", stopped[0], "bytes"
+        return 6
+    if verbose and reader.elapsed > 0 : print "   Read CDI at %.0f bytes/sec" % reader.rate()
+    return str(result)
+
+'''
+@param schema CDI schema file to also check the CDI against with xmllint, or None
+'''
+def test(alias, dest, connection, verbose, schema=None) :
+    # checked as it's read; a CDI from the cache is checked all at once
+    validator = cdischema.Validator()
+    result = cdicache.cache.read(alias, dest, connection, verbose, None, validator)
+    if type(result) is int and validator.error == None :
+        return result
+    if validator.count == 0 :
+        validator.feed(result)
+    if validator.close() != None :
+        print "   CDI data did not validate:  ", validator.error
+        return 6
+    if result.find("\0") not in (-1, len(result)-1) :
+        print "   CDI read went on past its terminating null"
+        return 7
         
     if verbose : print "   Read CDI result was ", len(result), " bytes"
     if connection.network.verbose : print "  Read CDI result ++++++++++\n", result,"\n++++++++++++++++"
+    if schema == None :
+        return 0
         
-    executable = "xmllint --noout --schema ../../specs/schema/cdi.xsd - "
+    executable = "xmllint --noout --schema "+schema+" - "
 
     import subprocess
     process = subprocess.Popen(executable,1,None,subprocess.PIPE,subprocess.PIPE, 
                     subprocess.STDOUT, None, False, True)
-    [stdout, stderr] = process.communicate(result) 
+    [stdout, stderr] = process.communicate(result.rstrip("\0")) 
     
     if process.returncode != 0 :
         print "   CDI data did not validate:  ", stdout
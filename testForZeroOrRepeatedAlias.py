@@ -8,8 +8,6 @@ Forces repeated reallocation of alias to check for zero or repeated aliases
 import connection as connection
 import canolcbutils
 import verifyNodeGlobal
-
-import time
     
 def usage() :
     print ""
@@ -96,7 +94,7 @@ def once(dest, connection, identifynode, verbose, marks) :
     reply = connection.network.receive()  # CID 2
     reply = connection.network.receive()  # CID 3
     reply = connection.network.receive()  # CID 4
-    time.sleep(0.65)
+    connection.network.clock.sleep(0.65)
     reply = connection.network.receive()  # RID
     reply = connection.network.receive()  # AMD
     reply = connection.network.receive()  # VerifiedNID
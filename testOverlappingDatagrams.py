@@ -8,6 +8,7 @@ created as part of the study of the missing start bit.
 
 import connection as connection
 import canolcbutils
+import quiescence
 
 
 # the following are cut&pasted from testDatagram, and should be properly imported instead
@@ -230,7 +231,7 @@ def test(alias, dest, num, connection, verbose) :
             tempalias = (tempalias + 1 ) & 0xFFF
         connection.network.send(makemiddleframe(tempalias, dest, [0x41,0,0]))
     # do not expect reply at this point
-    frame = connection.network.receive()
+    frame = quiescence.receive(connection.network)
     if frame != None :
         print "unexpected reply to middle segments", frame
         return 82
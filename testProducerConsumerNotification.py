@@ -15,6 +15,8 @@ happen as part of reset.
 
 import connection as connection
 import canolcbutils
+import quiescence
+import eventrange
 import identifyEventsAddressed
 import identifyConsumers
 import identifyProducers
@@ -81,6 +83,8 @@ def test(alias, dest, connection, verbose) :
     connection.network.send(identifyEventsAddressed.makeframe(alias, dest))
     consumed = []
     produced = []
+    consumerRanges = []
+    producerRanges = []
     while (True) :
         reply = connection.network.receive()
         if (reply == None ) : break
@@ -92,13 +96,27 @@ def test(alias, dest, connection, verbose) :
             event = canolcbutils.bodyArray(reply)
             if verbose : print "  produces ", event
             produced = produced+[event]
+        elif ( reply.startswith(":X194A4") or reply.startswith(":X19524") ):
+            first, last = eventrange.decode(canolcbutils.bodyArray(reply))
+            if reply.startswith(":X194A4") :
+                if verbose : print "  consumes range %016X - %016X" % (first, last)
+                consumerRanges.append((first, last, dest))
+            else :
+                if verbose : print "  produces range %016X - %016X" % (first, last)
+                producerRanges.append((first, last, dest))
+    # a node also answers for an event with any of its ranges that contain it
+    consumerRanges = eventrange.IntervalTree(consumerRanges)
+    producerRanges = eventrange.IntervalTree(producerRanges)
     # now check consumers and producers individually
     timeout = connection.network.timeout
     connection.network.timeout = 0.25
     if connection.network.verbose : print "Start individual checks"
     for c in consumed :
         connection.network.send(identifyConsumers.makeframe(alias, c))
+        inranges = consumerRanges.covers(eventrange.eventint(c))
         reply = connection.network.receive()
+        while inranges and reply != None and reply.startswith(":X194A4") :
+            reply = connection.network.receive()
         if (reply == None ) : 
             print "no reply for consumer ", c
             return 20
@@ -107,14 +125,18 @@ def test(alias, dest, connection, verbose) :
             return 21
         # here is OK, go around to next
         while True :
-            reply = connection.network.receive()
+            reply = quiescence.receive(connection.network)
             if (reply == None ) : break
+            elif inranges and reply.startswith(":X194A4") : continue
             elif ( not reply.startswith(":X194C7") ) :
                 print "Unexpected reply "+reply
                 return 22
     for p in produced :
         connection.network.send(identifyProducers.makeframe(alias, p))
+        inranges = producerRanges.covers(eventrange.eventint(p))
         reply = connection.network.receive()
+        while inranges and reply != None and reply.startswith(":X19524") :
+            reply = connection.network.receive()
         if (reply == None ) :
             print "no reply for producer ", p
             return 30
@@ -123,8 +145,9 @@ def test(alias, dest, connection, verbose) :
             return 31
         # here is OK, go around to next
         while True :
-            reply = connection.network.receive()
+            reply = quiescence.receive(connection.network)
             if (reply == None ) : break
+            elif inranges and reply.startswith(":X19524") : continue
             elif ( not reply.startswith(":X19547") ) :
                 print "Unexpected reply "+reply
                 return 32
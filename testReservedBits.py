@@ -9,6 +9,7 @@ Relies on the node properly handling verifyNodeAddressed and verifyNodeGlobal
 
 import connection as connection
 import canolcbutils
+import quiescence
 
     
 def usage() :
@@ -98,7 +99,7 @@ def test(alias, nodeID, dest, connection, verbose):
 
     # send with wrong node ID
     connection.network.send(canolcbutils.makeframestring(0x09490000+alias, [0,0,0,0,0,1]))
-    reply = connection.network.receive()
+    reply = quiescence.receive(connection.network)
     if reply != None : 
         print "Global verify with wrong node ID should not receive reply but did: ", reply
         return 24
@@ -115,7 +116,7 @@ def test(alias, nodeID, dest, connection, verbose):
 
     # try with invalid alias
     connection.network.send(makeAddressedFrame(alias, ~dest, nodeID))
-    reply = connection.network.receive()
+    reply = quiescence.receive(connection.network)
     if reply != None : 
         print "Unexpected reply received ", reply
         return 1
@@ -7,6 +7,7 @@ Check that standard CAN frames don't cause problems
 
 import connection as connection
 import canolcbutils
+import quiescence
 
 def makeframe(header) :
     retval = ":S"
@@ -55,7 +56,7 @@ def test(connection, verbose) :
         connection.network.send(makeframe(header))
         
     # see if any replies
-    reply = connection.network.receive()
+    reply = quiescence.receive(connection.network)
     if reply == None : 
         return 0
     while reply != None :
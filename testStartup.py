@@ -24,8 +24,6 @@ after the script is started.
 
 import connection as connection
 import canolcbutils
-
-import time
     
 def usage() :
     print ""
@@ -78,7 +76,10 @@ def test(alias, dest, connection, verbose) :
     timeout = connection.network.timeout
     connection.network.timeout = 25
     connection.network.connect()
-    if verbose : print "Restart node now"
+    if hasattr(connection.network, "reset") :
+        # e.g. the virtual bus, which can restart its nodes itself
+        connection.network.reset()
+    elif verbose : print "Restart node now"
     reply = connection.network.receive()
     if verbose : print "Start checking node output"
     while (True) :
@@ -100,7 +101,7 @@ def test(alias, dest, connection, verbose) :
         return 331
         
     id = reply[4:7]
-    start = time.time()
+    start = connection.network.clock.time()
     
     reply = connection.network.receive()
     if reply == None :
@@ -141,7 +142,7 @@ def test(alias, dest, connection, verbose) :
     # expect CIF (check timing)
     connection.network.timeout = 1 
     reply = connection.network.receive()
-    end = time.time()
+    end = connection.network.clock.time()
     connection.network.timeout = timeout
     if reply == None :
         print "RIM reply not received"
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+'''
+Binary capture files of CAN traffic
+
+A trace file is a file header followed by blocks.  Each block is
+up to BLOCK fixed-size frame records followed by an index entry
+giving the number of records, the time of the first and last, and
+a bitmap of the aliases (source, or destination of datagrams and
+addressed messages) that appear in the block:
+
+    header  "OLCBTRC1", record size, records per block   (16 bytes)
+    block   BLOCK records of RECORD bytes, index of INDEX bytes
+    block   ...
+    last    fewer records, index (missing if the capture was killed)
+
+A record is the time in seconds since the start of the capture,
+the header int, flags (data length in the low 4 bits, 0x80 for
+standard frames) and 8 data bytes, little-endian:
+
+    <dIB3x8s    24 bytes
+
+Full blocks are all the same size, so the reader can find any of
+them without scanning, and skip those outside a time range or not
+involving an alias.  Nothing is held in memory but the block being
+written or read.
+
+    python monitor.py -c bus.trc        capture
+    python tracefile.py bus.trc         list
+    replayolcblink.py                   play back into the tests
+
+'''
+
+import struct
+import time
+
+import canolcbutils
+import linkclock
+
+MAGIC = "OLCBTRC1"
+FILEHEADER = struct.Struct("<8sII")
+RECORD = struct.Struct("<dIB3x8s")
+INDEX = struct.Struct("<4sIdd512s")
+INDEXMAGIC = "OIDX"
+BLOCK = 4096
+
+EXTENDED = 0x80   # flags bit for an extended (29-bit header) frame
+
+'''
+@return the GridConnect string of a frame
+'''
+def framestring(header, data, extended=True) :
+    if extended : return canolcbutils.makeframestring(header, bytearray(data))
+    return ":S%XN%s;" % (header, data.encode('hex').upper())
+
+'''
+@return the aliases a frame involves: its source, and the
+destination of a datagram or addressed message
+'''
+def aliases(header, data, extended=True) :
+    if not extended : return []
+    result = [header & 0xFFF]
+    if (header & 0x08000000) == 0 :
+        return result  # control frame
+    frametype = (header >> 24) & 0x7
+    if frametype >= 2 and frametype <= 5 :
+        result.append((header >> 12) & 0xFFF)
+    elif frametype == 1 and (header & 0x8000) != 0 and len(data) >= 2 :
+        # message with address present
+        result.append(((ord(data[0]) & 0x0F) << 8) | ord(data[1]))
+    return result
+
+class TraceWriter :
+    '''
+    @param filename file to create
+    @param clock source of the capture times
+    '''
+    def __init__(self, filename, clock=None) :
+        if clock == None : clock = linkclock.realclock
+        self.clock = clock
+        self.file = open(filename, "wb")
+        self.file.write(FILEHEADER.pack(MAGIC, RECORD.size, BLOCK))
+        self.start = None
+        self.last = 0.0
+        self.count = 0       # frames written
+        self.newblock()
+        return
+
+    def newblock(self) :
+        self.records = 0
+        self.first = None
+        self.bitmap = bytearray(512)
+        return
+
+    '''
+    Write a GridConnect frame string, timestamped now
+    (or at the given capture time)
+    '''
+    def write(self, string, when=None) :
+        if not string.startswith(":") : return
+        try :
+            header = canolcbutils.headerValue(string)
+            data = str(bytearray(canolcbutils.bodyArray(string)))
+        except (ValueError, TypeError) :
+            return
+        self.writeframe(header, data, string[1] != 'S', when)
+        return
+
+    def writeframe(self, header, data, extended=True, when=None) :
+        if when == None :
+            now = self.clock.time()
+            if self.start == None : self.start = now
+            when = now-self.start
+        if when < self.last : when = self.last  # keep time monotonic
+        self.last = when
+        flags = len(data)
+        if extended : flags = flags | EXTENDED
+        self.file.write(RECORD.pack(when, header, flags, data))
+        if self.first == None : self.first = when
+        for alias in aliases(header, data, extended) :
+            self.bitmap[alias >> 3] |= 1 << (alias & 7)
+        self.records = self.records + 1
+        self.count = self.count + 1
+        if self.records == BLOCK : self.endblock()
+        return
+
+    def endblock(self) :
+        if self.records == 0 : return
+        self.file.write(INDEX.pack(INDEXMAGIC, self.records, self.first, self.last, str(self.bitmap)))
+        self.file.flush()
+        self.newblock()
+        return
+
+    def close(self) :
+        self.endblock()
+        self.file.close()
+        return
+
+'''
+Index entry of one block of a trace file
+'''
+class Block :
+    def __init__(self, offset, count, first, last, bitmap) :
+        self.offset = offset   # file position of the first record
+        self.count = count
+        self.first = first
+        self.last = last
+        self.bitmap = bitmap   # None if not known, i.e. the block wasn't finished
+
+    def involves(self, alias) :
+        if self.bitmap == None : return True
+        return (ord(self.bitmap[alias >> 3]) >> (alias & 7)) & 1 != 0
+
+class TraceReader :
+    def __init__(self, filename) :
+        self.file = open(filename, "rb")
+        magic, recordsize, self.block = FILEHEADER.unpack(self.file.read(FILEHEADER.size))
+        if magic != MAGIC or recordsize != RECORD.size :
+            raise ValueError(filename+" is not a trace file")
+        self.file.seek(0, 2)
+        self.size = self.file.tell()
+        return
+
+    '''
+    Iterate over the index entries of the blocks
+    '''
+    def blocks(self) :
+        blocksize = self.block*RECORD.size+INDEX.size
+        offset = FILEHEADER.size
+        while offset < self.size :
+            remaining = self.size-offset
+            if remaining >= blocksize :
+                # full block, index at a known place
+                self.file.seek(offset+self.block*RECORD.size)
+                magic, count, first, last, bitmap = INDEX.unpack(self.file.read(INDEX.size))
+                yield Block(offset, count, first, last, bitmap)
+                offset = offset+blocksize
+                continue
+            # last block; indexed only if the capture was closed
+            count = (remaining-INDEX.size)/RECORD.size
+            if count > 0 and count*RECORD.size+INDEX.size == remaining :
+                self.file.seek(offset+count*RECORD.size)
+                magic, count, first, last, bitmap = INDEX.unpack(self.file.read(INDEX.size))
+                if magic == INDEXMAGIC :
+                    yield Block(offset, count, first, last, bitmap)
+                    return
+            count = remaining/RECORD.size
+            if count == 0 : return
+            self.file.seek(offset)
+            first = RECORD.unpack(self.file.read(RECORD.size))[0]
+            self.file.seek(offset+(count-1)*RECORD.size)
+            last = RECORD.unpack(self.file.read(RECORD.size))[0]
+            yield Block(offset, count, first, last, None)
+            return
+
+    '''
+    Iterate over records as (time, header, data, extended),
+    optionally only those from start to end seconds, or
+    involving a given alias
+    '''
+    def records(self, start=None, end=None, alias=None) :
+        for block in self.blocks() :
+            if start != None and block.last < start : continue
+            if end != None and block.first > end : return
+            if alias != None and not block.involves(alias) : continue
+            self.file.seek(block.offset)
+            data = self.file.read(block.count*RECORD.size)
+            for i in range(block.count) :
+                when, header, flags, body = RECORD.unpack_from(data, i*RECORD.size)
+                if start != None and when < start : continue
+                if end != None and when > end : return
+                body = body[:flags & 0x0F]
+                extended = (flags & EXTENDED) != 0
+                if alias != None and alias not in aliases(header, body, extended) : continue
+                yield (when, header, body, extended)
+        return
+
+    '''
+    Iterate over (time, GridConnect string) pairs; takes the same
+    selections as records()
+    '''
+    def frames(self, start=None, end=None, alias=None) :
+        for when, header, body, extended in self.records(start, end, alias) :
+            yield when, framestring(header, body, extended)
+        return
+
+    def close(self) :
+        self.file.close()
+        return
+
+def usage() :
+    print ""
+    print "Called standalone, lists the frames in a trace file."
+    print ""
+    print "valid usages (default values):"
+    print "  python tracefile.py bus.trc"
+    print "  python tracefile.py -a 0xDDD -s 10 -e 20 bus.trc"
+    print ""
+    print "-a --alias only frames involving this alias"
+    print "-s --start only frames from this many seconds into the capture"
+    print "-e --end only frames up to this many seconds into the capture"
+    print "-b --blocks list the block index instead"
+
+import getopt, sys
+
+def main():
+    alias = None
+    start = None
+    end = None
+    listblocks = False
+    try:
+        opts, remainder = getopt.getopt(sys.argv[1:], "a:s:e:b", ["alias=", "start=", "end=", "blocks"])
+    except getopt.GetoptError, err:
+        # print help information and exit:
+        print str(err) # will print something like "option -a not recognized"
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-a", "--alias"):
+            alias = int(arg, 0)
+        elif opt in ("-s", "--start"):
+            start = float(arg)
+        elif opt in ("-e", "--end"):
+            end = float(arg)
+        elif opt in ("-b", "--blocks"):
+            listblocks = True
+        else:
+            assert False, "unhandled option"
+    if len(remainder) != 1 :
+        usage()
+        sys.exit(2)
+
+    reader = TraceReader(remainder[0])
+    if listblocks :
+        for block in reader.blocks() :
+            print "%10d %6d frames %12.6f to %12.6f%s" % (block.offset, block.count,
+                block.first, block.last, "" if block.bitmap != None else " (not indexed)")
+    else :
+        for when, frame in reader.frames(start, end, alias) :
+            print "%12.6f %s" % (when, frame)
+    reader.close()
+
+if __name__ == '__main__':
+    main()
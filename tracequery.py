@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+'''
+Query captured traffic by alias and MTI
+
+A TraceQuery memory-maps a trace file (see tracefile.py) and views
+its records in place as NumPy arrays, without reading them in.  It
+indexes the records by source alias, destination alias (of datagram
+frames and addressed messages) and MTI (of message frames), and
+keeps that index in a cache file next to the trace, so it's only
+built the first time.
+
+Queries return sorted arrays of record numbers.  The lookup of
+one key is a view of the cached index, narrowed by time without
+copying; only those records are read to check any other keys.
+
+    q = tracequery.TraceQuery("bus.trc")
+    found = q.between(0xAAA, 0x81F, start=10, end=20, frametypes=[2,3,4,5])
+    for when, frame in q.frames(found) : print when, frame
+
+NumPy is required.
+
+'''
+
+import bisect
+import mmap
+import os
+
+try :
+    import numpy
+except ImportError :
+    numpy = None
+
+import tracefile
+
+NONE = 4096   # key for records without a source, destination or MTI
+
+def recordtype() :
+    return numpy.dtype([("time", "<f8"), ("header", "<u4"), ("flags", "u1"),
+                        ("pad", "V3"), ("data", "u1", (8,))])
+
+'''
+@return source, destination and MTI keys of a structured array of records
+'''
+def keys(records) :
+    header = records["header"].astype(numpy.int64)
+    flags = records["flags"]
+    data = records["data"]
+    extended = (flags & tracefile.EXTENDED) != 0
+    openlcb = extended & ((header & 0x08000000) != 0)
+    frametype = (header >> 24) & 0x7
+    field = (header >> 12) & 0xFFF
+    message = openlcb & (frametype == 1)
+    datagram = openlcb & (frametype >= 2) & (frametype <= 5)
+    addressed = message & ((header & 0x8000) != 0) & ((flags & 0x0F) >= 2)
+    source = numpy.where(extended, header & 0xFFF, NONE)
+    dest = numpy.where(datagram, field,
+                numpy.where(addressed, ((data[:, 0].astype(numpy.int64) & 0x0F) << 8) | data[:, 1], NONE))
+    mti = numpy.where(message, field, NONE)
+    return source, dest, mti
+
+class TraceQuery :
+    '''
+    @param filename trace file
+    @param cache if True, keep the index in a file next to the trace
+    @param index if False, don't index, just map the records
+    '''
+    def __init__(self, filename, cache=True, index=True) :
+        if numpy == None :
+            raise ImportError("NumPy is needed for tracequery")
+        self.filename = filename
+        reader = tracefile.TraceReader(filename)
+        self.blocks = list(reader.blocks())
+        reader.close()
+        self.file = open(filename, "rb")
+        self.size = os.path.getsize(filename)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.block = tracefile.BLOCK
+        dtype = recordtype()
+        # full blocks as one (blocks, records) view, then any partial block
+        full = len(self.blocks)
+        if full > 0 and self.blocks[-1].count < self.block : full = full-1
+        self.full = numpy.ndarray((full, self.block), dtype, self.map,
+                    tracefile.FILEHEADER.size, (self.block*tracefile.RECORD.size+tracefile.INDEX.size, dtype.itemsize))
+        self.tail = numpy.ndarray((0,), dtype)
+        if full < len(self.blocks) :
+            last = self.blocks[-1]
+            self.tail = numpy.ndarray((last.count,), dtype, self.map, last.offset)
+        self.count = full*self.block+len(self.tail)
+        self.firsts = [b.first for b in self.blocks]
+        self.index = None
+        if not index : return
+        if cache : self.load()
+        if self.index == None :
+            self.build()
+            if cache : self.save()
+        return
+
+    def cachename(self) :
+        return self.filename+".idx.npz"
+
+    def build(self) :
+        self.index = {}
+        columns = {"source" : [], "dest" : [], "mti" : []}
+        for b in range(self.full.shape[0]) :
+            self.addkeys(columns, self.full[b])
+        if len(self.tail) > 0 : self.addkeys(columns, self.tail)
+        for name, parts in columns.items() :
+            if len(parts) == 0 :
+                k = numpy.zeros(0, dtype=numpy.uint16)
+            else :
+                k = numpy.concatenate(parts)
+            positions = numpy.argsort(k, kind="mergesort").astype(numpy.uint32)
+            starts = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(k, minlength=NONE+1))))
+            self.index[name] = (starts.astype(numpy.int64), positions)
+        return
+
+    def addkeys(self, columns, records) :
+        source, dest, mti = keys(records)
+        columns["source"].append(source.astype(numpy.uint16))
+        columns["dest"].append(dest.astype(numpy.uint16))
+        columns["mti"].append(mti.astype(numpy.uint16))
+        return
+
+    def save(self) :
+        arrays = {"size" : numpy.array([self.size])}
+        for name, (starts, positions) in self.index.items() :
+            arrays[name+"starts"] = starts
+            arrays[name+"positions"] = positions
+        try :
+            numpy.savez(self.cachename(), **arrays)
+        except IOError, err :
+            pass  # e.g. read-only directory; just don't cache
+        return
+
+    def load(self) :
+        name = self.cachename()
+        if not os.path.exists(name) or os.path.getmtime(name) < os.path.getmtime(self.filename) :
+            return
+        saved = numpy.load(name)
+        if saved["size"][0] != self.size : return
+        self.index = {}
+        for key in ("source", "dest", "mti") :
+            self.index[key] = (saved[key+"starts"], saved[key+"positions"])
+        return
+
+    '''
+    Iterate over all the records, as structured arrays of up to
+    blocks*BLOCK records at a time
+    '''
+    def chunks(self, blocks=64) :
+        for b in range(0, self.full.shape[0], blocks) :
+            yield self.full[b:b+blocks].reshape(-1)
+        if len(self.tail) > 0 : yield self.tail
+        return
+
+    '''
+    @return record numbers with the given key, a view of the index
+    '''
+    def lookup(self, name, key) :
+        starts, positions = self.index[name]
+        return positions[starts[key]:starts[key+1]]
+
+    '''
+    @return number of the first record at or after a time
+    '''
+    def recordat(self, when) :
+        b = bisect.bisect_left(self.firsts, when)-1
+        if b < 0 : return 0
+        if self.blocks[b].last < when : return min((b+1)*self.block, self.count)
+        if b < self.full.shape[0] :
+            times = self.full[b]["time"]
+        else :
+            times = self.tail["time"]
+        return b*self.block+int(numpy.searchsorted(times, when))
+
+    '''
+    Get records by number
+    @param positions array of record numbers
+    @return structured array of the records (a copy)
+    '''
+    def records(self, positions) :
+        positions = numpy.asarray(positions, dtype=numpy.int64)
+        full = self.full.shape[0]*self.block
+        result = numpy.empty(len(positions), dtype=self.full.dtype)
+        inside = positions < full
+        result[inside] = self.full[positions[inside]//self.block, positions[inside]%self.block]
+        result[~inside] = self.tail[positions[~inside]-full]
+        return result
+
+    '''
+    Find records.
+    @param source, dest, mti if not None, only records with this key
+    @param start, end if not None, only records in this time range
+    @param frametypes if not None, only these frame types (0 control,
+        1 message, 2-5 datagram)
+    @return sorted array of record numbers
+    '''
+    def select(self, source=None, dest=None, mti=None, start=None, end=None, frametypes=None) :
+        lo = 0
+        hi = self.count
+        if start != None : lo = self.recordat(start)
+        if end != None : hi = self.recordat(numpy.nextafter(end, numpy.inf))
+        wanted = [(name, key) for name, key in (("source", source), ("dest", dest), ("mti", mti)) if key != None]
+        if len(wanted) == 0 :
+            found = numpy.arange(lo, hi, dtype=numpy.uint32)
+        else :
+            # start from the smallest index entry, then check the rest directly
+            wanted.sort(key=lambda (name, key) : len(self.lookup(name, key)))
+            found = self.lookup(wanted[0][0], wanted[0][1])
+            found = found[numpy.searchsorted(found, lo):numpy.searchsorted(found, hi)]
+            if len(wanted) > 1 and len(found) > 0 :
+                source, dest, mti = keys(self.records(found))
+                computed = {"source" : source, "dest" : dest, "mti" : mti}
+                keep = numpy.ones(len(found), dtype=bool)
+                for name, key in wanted[1:] :
+                    keep &= computed[name] == key
+                found = found[keep]
+        if frametypes != None and len(found) > 0 :
+            header = self.records(found)["header"].astype(numpy.int64)
+            frametype = numpy.where((header & 0x08000000) != 0, (header >> 24) & 0x7, 0)
+            found = found[numpy.in1d(frametype, frametypes)]
+        return found
+
+    '''
+    Records between two aliases, in either direction; takes the same
+    selections as select()
+    '''
+    def between(self, a, b, start=None, end=None, frametypes=None) :
+        return numpy.union1d(self.select(source=a, dest=b, start=start, end=end, frametypes=frametypes),
+                             self.select(source=b, dest=a, start=start, end=end, frametypes=frametypes))
+
+    '''
+    Iterate over (time, GridConnect string) for record numbers
+    '''
+    def frames(self, positions) :
+        for r in self.records(positions) :
+            length = r["flags"] & 0x0F
+            yield float(r["time"]), tracefile.framestring(int(r["header"]), r["data"][:length].tostring(),
+                                                          (r["flags"] & tracefile.EXTENDED) != 0)
+        return
+
+    def close(self) :
+        self.full = None
+        self.tail = None
+        self.map.close()
+        self.file.close()
+        return
+
+def usage() :
+    print ""
+    print "Called standalone, lists the frames in a trace file that"
+    print "match the given source, destination, MTI and time range."
+    print ""
+    print "valid usages (default values):"
+    print "  python tracequery.py -s 0xAAA bus.trc"
+    print "  python tracequery.py -b 0xAAA,0x81F --datagrams -t 10 -e 20 bus.trc"
+    print ""
+    print "-s --source source alias"
+    print "-d --dest destination alias"
+    print "-b --between two aliases, frames either way"
+    print "-m --mti message type, e.g. 0x490"
+    print "-t --start, -e --end seconds into the capture"
+    print "   --datagrams only datagram frames"
+    print "-c --count just print how many frames match"
+
+import getopt, sys, time
+
+def main():
+    source = None
+    dest = None
+    between = None
+    mti = None
+    start = None
+    end = None
+    frametypes = None
+    countonly = False
+    try:
+        opts, remainder = getopt.getopt(sys.argv[1:], "s:d:b:m:t:e:c",
+            ["source=", "dest=", "between=", "mti=", "start=", "end=", "datagrams", "count"])
+    except getopt.GetoptError, err:
+        # print help information and exit:
+        print str(err) # will print something like "option -a not recognized"
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-s", "--source"):
+            source = int(arg, 0)
+        elif opt in ("-d", "--dest"):
+            dest = int(arg, 0)
+        elif opt in ("-b", "--between"):
+            between = [int(a, 0) for a in arg.split(',')]
+        elif opt in ("-m", "--mti"):
+            mti = int(arg, 0)
+        elif opt in ("-t", "--start"):
+            start = float(arg)
+        elif opt in ("-e", "--end"):
+            end = float(arg)
+        elif opt == "--datagrams":
+            frametypes = [2, 3, 4, 5]
+        elif opt in ("-c", "--count"):
+            countonly = True
+        else:
+            assert False, "unhandled option"
+    if len(remainder) != 1 :
+        usage()
+        sys.exit(2)
+
+    began = time.time()
+    q = TraceQuery(remainder[0])
+    opened = time.time()
+    if between != None :
+        found = q.between(between[0], between[1], start, end, frametypes)
+    else :
+        found = q.select(source, dest, mti, start, end, frametypes)
+    done = time.time()
+    if not countonly :
+        for when, frame in q.frames(found) :
+            print "%12.6f %s" % (when, frame)
+    print len(found), "of", q.count, "frames; opened in %.3f sec, query %.3f sec" % (opened-began, done-opened)
+    q.close()
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,7 @@ OpenLCB VerifyNodeAddressed message
 
 import connection as connection
 import canolcbutils
+import quiescence
 import copy
 
 def makeframe(alias, dest, nodeID) :
@@ -99,19 +100,19 @@ def test(alias, dest, nodeID, connection, verbose) :
     # repeat all three with invalid alias
     connection.network.send(makeframe(alias, (~dest)&0xFFF, nodeID))
     expect = canolcbutils.makeframestring(0x19170000 + dest, nodeID)
-    reply = connection.network.expect(exact=expect)
+    reply = quiescence.expect(connection.network, exact=expect)
     if (reply != None) :
         print "Unexpected reply received on incorrect alias, OK nodeID", reply
         return 1
     
     connection.network.send(makeframe(alias, (~dest)&0xFFF, None))
-    reply = connection.network.expect(startswith=":X19170", data=nodeID)
+    reply = quiescence.expect(connection.network, startswith=":X19170", data=nodeID)
     if (reply != None) :
         print "Unexpected reply received on incorrect alias, no nodeID", reply
         return 1
     
     connection.network.send(makeframe(alias, (~dest)&0xFFF, tnodeID))
-    reply = connection.network.expect(startswith=":X19170", data=nodeID)
+    reply = quiescence.expect(connection.network, startswith=":X19170", data=nodeID)
     if (reply != None) :
         print "Unexpected reply received on incorrect alias, wrong nodeID", reply
         return 1
@@ -8,6 +8,7 @@ Handle OpenLCB verifyNodeGlobal
 
 import connection as connection
 import canolcbutils
+import quiescence
 
 '''
 Make a Verify Node ID Global frame.
@@ -19,7 +20,6 @@ Make a Verify Node ID Global frame.
 def makeframe(alias, nodeID) :
     return canolcbutils.makeframestring(0x19490000+alias,nodeID)
 
-import time
 from optparse import OptionParser
 
 def main():
@@ -88,13 +88,13 @@ def test(alias, nodeID, connection):
         return 12
 
     # allow time for the bus to settle
-    time.sleep(3)
-    while connection.network.receive() != None :
+    connection.network.clock.sleep(3)
+    while quiescence.receive(connection.network) != None :
         continue
 
     # send with wrong node ID
     connection.network.send(makeframe(alias, [0,0,0,0,0,1]))
-    reply = connection.network.expect(startswith=":X19170")
+    reply = quiescence.expect(connection.network, startswith=":X19170")
     if (reply == None) :
         return 0
     else :
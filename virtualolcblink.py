@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+'''
+Drive an in-process virtual CAN bus
+
+A VirtualBus passes GridConnect frames between any number of
+VirtualOlcbLink connections and simulated nodes (see simulatednode.py)
+without sockets, serial ports or subprocesses.  Nodes can schedule
+work for later (e.g. the 200 msec wait before an alias is reserved);
+a link waiting to receive runs whatever is due within its timeout.
+
+The bus keeps time with a VirtualClock (see linkclock.py), which
+the links share.  Waiting for scheduled work, waiting out a receive
+timeout, and sleeps in the tests through connection.network.clock
+all just advance that clock, so timing-based tests run instantly.
+Pass a RealClock to the VirtualBus to run in real time instead.
+
+@see simulatednode.py
+'''
+
+import heapq
+
+import canolcbutils
+import linkclock
+import quiescence
+
+class VirtualBus :
+    def __init__(self, clock=None) :
+        if clock == None : clock = linkclock.VirtualClock()
+        self.clock = clock
+        self.links = []
+        self.nodes = []
+        self.pending = []      # frames waiting to be delivered, with sender
+        self.delivering = False
+        self.scheduled = []    # heap of (time, sequence, function)
+        self.sequence = 0
+        self.count = 0         # frames carried
+        return
+
+    def attach(self, node) :
+        self.nodes.append(node)
+        node.bus = self
+        return node
+
+    def attachlink(self, link) :
+        if link not in self.links : self.links.append(link)
+        return
+
+    '''
+    Put a frame on the bus; everybody except the sender sees it.
+    Frames sent while delivering (i.e. replies) are delivered
+    in order after the current one.
+    '''
+    def send(self, frame, sender) :
+        self.pending.append((frame, sender))
+        if self.delivering : return
+        self.delivering = True
+        try :
+            while len(self.pending) > 0 :
+                frame, sender = self.pending.pop(0)
+                self.count = self.count + 1
+                for link in self.links :
+                    if link is not sender : link.deliver(frame)
+                for node in self.nodes :
+                    if node is not sender : node.receive(frame)
+        finally :
+            self.delivering = False
+        return
+
+    def now(self) :
+        return self.clock.time()
+
+    '''
+    Arrange for function() to be called delay seconds from now
+    '''
+    def schedule(self, delay, function) :
+        self.sequence = self.sequence + 1
+        heapq.heappush(self.scheduled, (self.now()+delay, self.sequence, function))
+        return
+
+    '''
+    @return time of the next scheduled function, or None
+    '''
+    def nextevent(self) :
+        if len(self.scheduled) == 0 : return None
+        return self.scheduled[0][0]
+
+    '''
+    Run everything scheduled up to the given time, waiting for it if need be.
+    '''
+    def rununtil(self, until) :
+        while len(self.scheduled) > 0 and self.scheduled[0][0] <= until :
+            when, sequence, function = heapq.heappop(self.scheduled)
+            self.clock.sleep(when-self.now())
+            function()
+        return
+
+class VirtualOlcbLink :
+    def __init__(self, bus=None) :
+        # defaults (generally overridden by system-wide defaults elsewhere)
+        if bus == None : bus = VirtualBus()
+        self.bus = bus
+        self.clock = bus.clock
+        self.quiescence = quiescence.Quiescence() # round trips to the nodes
+        self.timeout = 1.0
+        self.verbose = False
+        self.startdelay = 0
+        self.received = []
+        self.arrivals = []   # when each frame in received arrived
+        self.connected = False
+        return
+
+    def connect(self) :
+        # if verbose, print
+        if (self.verbose) : print "   connect to virtual bus with", len(self.bus.nodes), "node(s)"
+        self.bus.attachlink(self)
+        self.connected = True
+        return
+
+    '''
+    Restart every node on the bus, as pressing their reset buttons would
+    '''
+    def reset(self) :
+        if not self.connected : self.connect()
+        for node in self.bus.nodes :
+            node.restart()
+        return
+
+    # called by the bus with each frame from someone else
+    def deliver(self, frame) :
+        self.received.append(frame)
+        self.arrivals.append(self.clock.time())
+        return
+
+    def send(self, frame) :
+        if not self.connected : self.connect()
+
+        # if verbose, print
+        if (self.verbose) : print "   send    ",frame
+
+        self.quiescence.sent(self.clock.time(), frame)
+        self.bus.send(frame, self)
+        return
+
+    def receive(self) : # returns frame
+        if not self.connected : self.connect()
+
+        # if verbose, print
+        if (self.verbose) : print "   receive ",
+
+        if len(self.received) == 0 :
+            # run anything that might send a frame within the timeout
+            until = self.bus.now()+self.timeout
+            while len(self.received) == 0 :
+                next = self.bus.nextevent()
+                if next == None or next > until : break
+                self.bus.rununtil(next)
+        if len(self.received) == 0 :
+            # wait out the timeout
+            self.clock.sleep(until-self.bus.now())
+            self.quiescence.expired()
+            if (self.verbose) : print "<none>" # blank line to show delay?
+            return None
+        r = self.received.pop(0)
+        self.quiescence.received(self.arrivals.pop(0), r)
+        if (self.verbose) : print r
+        return r
+
+    '''
+    Continue receiving data until the we get the expected result or timeout.
+    @param exact if != None, look for result with exact string
+    @param startswith if != None, look for result starting with string
+    @param data if != None, tuple of data bytes to match
+    @param timeout timeout in seconds, if timeout != 0, return None on timeout;
+    if 0, return None once nothing arrives within the link timeout
+    @return resulting message on success, None on timeout
+    '''
+    def expect(self, exact=None, startswith=None, data=None, timeout=1) :
+        start = self.bus.now()
+        while (True) :
+            result = self.receive()
+            if (result == None) :
+                # nothing arrived within the link timeout
+                if (timeout == 0) :
+                    if (self.verbose) :
+                        print "Timeout"
+                    return None
+            elif (data != None) :
+                if canolcbutils.bodyArray(result) == list(data) :
+                    return result
+            elif (exact != None) :
+                if (result == exact) :
+                    return result
+            elif (startswith != None) :
+                if (result.startswith(startswith)) :
+                    return result
+            else :
+                return result
+
+            if (timeout != 0) :
+                if (self.bus.now() > (start + timeout)) :
+                    if (self.verbose) :
+                        print "Timeout"
+                    return None
+
+    def close(self) :
+        return
+
+import getopt, sys
+
+def main():
+    import simulatednode
+
+    # create a bus with one simulated node, and a link to it
+    network = VirtualOlcbLink()
+    network.bus.attach(simulatednode.SimulatedNode([2,3,4,5,6,1], 0xDDD))
+    network.verbose = True
+
+    frame = ':X19490AAAN;'
+    if (len(sys.argv) > 1) :
+        frame = sys.argv[1]
+
+    # send the frame and show the replies
+    network.send(frame)
+    while network.receive() != None :
+        continue
+
+    return  # done with example
+
+if __name__ == '__main__':
+    main()